@@ -1,33 +1,120 @@
 import csv
+import heapq
 import io
+import math
 from pathlib import Path
+from typing import Iterable
 
-def analyze_logs(csv_text: str) -> dict:
-    reader = csv.DictReader(io.StringIO(csv_text))
-    stats = {}
-    slow_requests = []
-    for row in reader:
+SLOW_THRESHOLD_MS = 1000
+# slow_requests に残す件数の上限（レスポンスタイムの大きい順）
+SLOW_TOP_K = 100
+# ヒストグラムの精度: 2^(HIST_SUB_BUCKET_BITS-1) 分割 / 2倍区間 → 相対誤差 約1.6%
+HIST_SUB_BUCKET_BITS = 7
+PERCENTILES = (50, 95, 99)
+
+
+def _bucket_index(value: int) -> int:
+    """値を HDR 形式の対数線形バケット番号に変換する（小さい値は値そのまま）"""
+    shift = value.bit_length() - HIST_SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return (shift << (HIST_SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+
+def _bucket_value(index: int) -> int:
+    """バケット番号から代表値（バケット範囲の中央値）を返す"""
+    half = 1 << (HIST_SUB_BUCKET_BITS - 1)
+    if index < 2 * half:
+        return index
+    shift = index // half - 1
+    sub = index % half + half
+    lower = sub << shift
+    upper = ((sub + 1) << shift) - 1
+    return (lower + upper) // 2
+
+
+def percentile(hist: dict, q: float) -> int:
+    """ヒストグラム {バケット番号: 件数} から q パーセンタイル（nearest-rank）を返す"""
+    total = sum(hist.values())
+    if total == 0:
+        return 0
+    rank = max(1, math.ceil(total * q / 100))
+    seen = 0
+    for index in sorted(hist):
+        seen += hist[index]
+        if seen >= rank:
+            return _bucket_value(index)
+    return _bucket_value(max(hist))
+
+
+def _new_endpoint() -> dict:
+    return {"count": 0, "total_time": 0, "error_count": 0, "hist": {}}
+
+
+def _push_slow(heap: list, item: tuple, top_k: int) -> None:
+    """(response_time_ms, timestamp, user_id, endpoint) を上位 top_k 件のヒープに入れる"""
+    if len(heap) < top_k:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def new_state(top_k: int = SLOW_TOP_K) -> dict:
+    """部分集計（シャード・ファイル単位）の空の状態を返す"""
+    return {"stats": {}, "slow_requests": [], "top_k": top_k}
+
+
+def accumulate(rows: Iterable[dict], state: dict) -> dict:
+    """csv.DictReader の行を部分集計の状態に累積する"""
+    stats = state["stats"]
+    slow_requests = state["slow_requests"]
+    top_k = state["top_k"]
+    for row in rows:
         ep = row["endpoint"]
         if ep not in stats:
-            stats[ep] = {"count": 0, "total_time": 0, "error_count": 0}
+            stats[ep] = _new_endpoint()
         # エンドポイント別の集計: 各endpointごとに、リクエスト数・平均レスポンスタイム(ms)・エラー率(status_code >= 400の割合)を算出
+        response_time = int(row["response_time_ms"])
         stats[ep]["count"] += 1
-        stats[ep]["total_time"] += int(row["response_time_ms"])
+        stats[ep]["total_time"] += response_time
         if int(row["status_code"]) >= 400:
             stats[ep]["error_count"] += 1
+        # レイテンシ分布: 固定サイズのヒストグラムに件数を加算
+        hist = stats[ep]["hist"]
+        index = _bucket_index(response_time)
+        hist[index] = hist.get(index, 0) + 1
 
-        if int(row["response_time_ms"]) > 1000:
-            slow_requests.append(
-                {
-                    "timestamp": row["timestamp"],
-                    "user_id": row["user_id"],
-                    "endpoint": row["endpoint"],
-                    "response_time_ms": int(row["response_time_ms"]),
-                }
+        if response_time > SLOW_THRESHOLD_MS:
+            _push_slow(
+                slow_requests,
+                (response_time, row["timestamp"], row["user_id"], ep),
+                top_k,
             )
+    return state
+
+
+def merge_states(*states: dict) -> dict:
+    """複数の部分集計を1つにまとめる（ヒストグラムは件数の加算、slow_requests は上位 top_k 件）"""
+    merged = new_state(max((state["top_k"] for state in states), default=SLOW_TOP_K))
+    for state in states:
+        for ep, data in state["stats"].items():
+            if ep not in merged["stats"]:
+                merged["stats"][ep] = _new_endpoint()
+            merged["stats"][ep]["count"] += data["count"]
+            merged["stats"][ep]["total_time"] += data["total_time"]
+            merged["stats"][ep]["error_count"] += data["error_count"]
+            hist = merged["stats"][ep]["hist"]
+            for index, count in data["hist"].items():
+                hist[index] = hist.get(index, 0) + count
+        for item in state["slow_requests"]:
+            _push_slow(merged["slow_requests"], item, merged["top_k"])
+    return merged
+
 
+def build_result(state: dict) -> dict:
+    """部分集計の状態から analyze_logs と同じ形式の結果を生成する"""
     endpoint_stats = {}
-    for ep, data in stats.items():
+    for ep, data in state["stats"].items():
         endpoint_stats[ep] = {
             "count": data["count"],
             "avg_response_time": round(data["total_time"] / data["count"], 2),
@@ -37,12 +124,51 @@ def analyze_logs(csv_text: str) -> dict:
                 else 0
             ),
         }
+        for q in PERCENTILES:
+            endpoint_stats[ep][f"p{q}_response_time"] = percentile(data["hist"], q)
 
+    slow_requests = [
+        {
+            "timestamp": timestamp,
+            "user_id": user_id,
+            "endpoint": ep,
+            "response_time_ms": response_time,
+        }
+        for response_time, timestamp, user_id, ep in sorted(
+            state["slow_requests"], reverse=True
+        )
+    ]
     return {"endpoint_stats": endpoint_stats, "slow_requests": slow_requests}
 
 
+def analyze_partial(
+    source: str | Path | Iterable[str], top_k: int = SLOW_TOP_K
+) -> dict:
+    """
+    ファイルパスまたは行のイテラブルを1行ずつ読み、部分集計の状態を返す
+
+    :param source: CSVファイルのパス、またはヘッダー行を含むCSV行のイテラブル
+    :param top_k: slow_requests に残す件数の上限
+    :return: merge_states / build_result に渡せる部分集計
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "r", newline="", encoding="utf-8") as f:
+            return accumulate(csv.DictReader(f), new_state(top_k))
+    return accumulate(csv.DictReader(source), new_state(top_k))
+
+
+def analyze_logs_stream(
+    source: str | Path | Iterable[str], top_k: int = SLOW_TOP_K
+) -> dict:
+    """ファイル全体を文字列に読み込まずに analyze_logs と同じ結果を返す"""
+    return build_result(analyze_partial(source, top_k))
+
+
+def analyze_logs(csv_text: str, top_k: int = SLOW_TOP_K) -> dict:
+    reader = csv.DictReader(io.StringIO(csv_text))
+    return build_result(accumulate(reader, new_state(top_k)))
+
+
 if __name__ == "__main__":
     csv_path = Path(__file__).parent / "data" / "sample.csv"
-    with open(csv_path, "r") as f:
-        csv_text = f.read()
-    print(analyze_logs(csv_text))
+    print(analyze_logs_stream(csv_path))
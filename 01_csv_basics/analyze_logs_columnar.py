@@ -0,0 +1,124 @@
+import heapq
+from pathlib import Path
+from typing import IO
+
+import numpy as np
+import pandas as pd
+
+from analyze_logs import (
+    HIST_SUB_BUCKET_BITS,
+    SLOW_THRESHOLD_MS,
+    SLOW_TOP_K,
+    build_result,
+    merge_states,
+    new_state,
+)
+
+CHUNK_SIZE = 1_000_000
+USECOLS = ["timestamp", "user_id", "endpoint", "status_code", "response_time_ms"]
+DTYPES = {
+    "timestamp": str,
+    "user_id": str,
+    "endpoint": str,
+    "status_code": "int32",
+    "response_time_ms": "int64",
+}
+
+
+def _bucket_index(values: np.ndarray) -> np.ndarray:
+    """analyze_logs._bucket_index のベクトル版（frexp の指数 = bit_length）"""
+    _, bit_length = np.frexp(values.astype("float64"))
+    shift = bit_length - HIST_SUB_BUCKET_BITS
+    large = shift > 0
+    index = values.copy()
+    index[large] = (shift[large].astype("int64") << (HIST_SUB_BUCKET_BITS - 1)) + (
+        values[large] >> shift[large]
+    )
+    return index
+
+
+def accumulate_frame(df: pd.DataFrame, state: dict) -> dict:
+    """DataFrame（1チャンク）を列単位で集計し、部分集計の状態にマージする"""
+    if df.empty:
+        return state
+    # endpoint を出現順のグループコードに変換し、bincount で件数・合計を求める
+    codes, endpoints = pd.factorize(df["endpoint"], sort=False)
+    n_groups = len(endpoints)
+    response_time = df["response_time_ms"].to_numpy()
+    counts = np.bincount(codes, minlength=n_groups)
+    totals = np.bincount(codes, weights=response_time, minlength=n_groups)
+    errors = np.bincount(
+        codes[df["status_code"].to_numpy() >= 400], minlength=n_groups
+    )
+
+    # ヒストグラム: (グループコード, バケット番号) の組ごとの件数
+    index = _bucket_index(response_time)
+    n_buckets = int(index.max()) + 1
+    keys, key_counts = np.unique(codes * n_buckets + index, return_counts=True)
+
+    chunk = new_state(state["top_k"])
+    for i, ep in enumerate(endpoints):
+        chunk["stats"][ep] = {
+            "count": int(counts[i]),
+            "total_time": int(totals[i]),
+            "error_count": int(errors[i]),
+            "hist": {},
+        }
+    for key, count in zip(keys.tolist(), key_counts.tolist()):
+        chunk["stats"][endpoints[key // n_buckets]]["hist"][key % n_buckets] = count
+
+    # スローリクエスト: top_k 番目の値以上の候補だけをタプル化する
+    slow = np.flatnonzero(response_time > SLOW_THRESHOLD_MS)
+    if len(slow) > chunk["top_k"]:
+        kth = np.partition(response_time[slow], -chunk["top_k"])[-chunk["top_k"]]
+        slow = slow[response_time[slow] >= kth]
+    candidates = zip(
+        response_time[slow].tolist(),
+        df["timestamp"].to_numpy()[slow].tolist(),
+        df["user_id"].to_numpy()[slow].tolist(),
+        df["endpoint"].to_numpy()[slow].tolist(),
+    )
+    chunk["slow_requests"] = heapq.nlargest(chunk["top_k"], candidates)
+    heapq.heapify(chunk["slow_requests"])
+
+    return merge_states(state, chunk)
+
+
+def analyze_partial_columnar(
+    source: str | Path | IO[str],
+    top_k: int = SLOW_TOP_K,
+    chunksize: int = CHUNK_SIZE,
+) -> dict:
+    """
+    CSVを pandas でチャンクごとに列単位で読み込み、部分集計の状態を返す
+
+    :param source: CSVファイルのパス、またはファイルオブジェクト
+    :param top_k: slow_requests に残す件数の上限
+    :param chunksize: 1回に読み込む行数（ピークメモリはこの値に比例する）
+    :return: analyze_logs.merge_states / build_result に渡せる部分集計
+    """
+    state = new_state(top_k)
+    reader = pd.read_csv(
+        source,
+        usecols=USECOLS,
+        dtype=DTYPES,
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        state = accumulate_frame(chunk, state)
+    return state
+
+
+def analyze_logs_columnar(
+    source: str | Path | IO[str],
+    top_k: int = SLOW_TOP_K,
+    chunksize: int = CHUNK_SIZE,
+) -> dict:
+    """analyze_logs と同じ構造の結果を列指向の集計で返す"""
+    return build_result(analyze_partial_columnar(source, top_k, chunksize))
+
+
+if __name__ == "__main__":
+    csv_path = Path(__file__).parent / "data" / "sample.csv"
+    print(analyze_logs_columnar(csv_path))
@@ -0,0 +1,101 @@
+import csv
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from analyze_logs import SLOW_TOP_K, accumulate, build_result, merge_states, new_state
+
+# リングバッファに保持する分数（これより古い分は上書きされる）
+WINDOW_MINUTES = 60
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _minute_index(timestamp: str) -> int:
+    """'YYYY-MM-DD HH:MM:SS' を1970-01-01からの経過分に変換する"""
+    minute = datetime.strptime(timestamp[:16], "%Y-%m-%d %H:%M")
+    return int((minute - _EPOCH).total_seconds()) // 60
+
+
+def new_rollup(window_minutes: int = WINDOW_MINUTES, top_k: int = SLOW_TOP_K) -> dict:
+    """分単位の部分集計を window_minutes 個だけ持つリングバッファを返す"""
+    return {
+        "window_minutes": window_minutes,
+        "top_k": top_k,
+        # slots[i] は minutes[i] 分の部分集計（analyze_logs.new_state 形式）
+        "slots": [None] * window_minutes,
+        "minutes": [None] * window_minutes,
+        "latest": None,
+        "dropped": 0,
+    }
+
+
+def add_rows(rollup: dict, rows: Iterable[dict]) -> dict:
+    """
+    行を該当する分のスロットに累積する
+
+    最新の分から window_minutes 以上古い行はリングバッファの範囲外のため破棄し、
+    dropped に件数を加算する
+    """
+    size = rollup["window_minutes"]
+    slots = rollup["slots"]
+    minutes = rollup["minutes"]
+    last_prefix = None
+    minute = None
+    for row in rows:
+        # 同じ分が続く間は日時パースを省略する
+        prefix = row["timestamp"][:16]
+        if prefix != last_prefix:
+            minute = _minute_index(prefix)
+            last_prefix = prefix
+        latest = rollup["latest"]
+        if latest is not None and minute <= latest - size:
+            rollup["dropped"] += 1
+            continue
+        if latest is None or minute > latest:
+            rollup["latest"] = minute
+
+        slot = minute % size
+        if minutes[slot] != minute:
+            slots[slot] = new_state(rollup["top_k"])
+            minutes[slot] = minute
+        accumulate((row,), slots[slot])
+    return rollup
+
+
+def add_csv_lines(rollup: dict, lines: Iterable[str], has_header: bool = False) -> dict:
+    """CSV行（ヘッダーなしが既定）を追加する。tail したログの追記分を渡す想定"""
+    fieldnames = None if has_header else [
+        "timestamp", "user_id", "endpoint", "status_code", "response_time_ms",
+    ]
+    return add_rows(rollup, csv.DictReader(lines, fieldnames=fieldnames))
+
+
+def query(rollup: dict, minutes: int, until: str | None = None) -> dict:
+    """
+    直近 minutes 分の集計を analyze_logs と同じ形式で返す
+
+    :param minutes: 集計する分数（window_minutes 以下）
+    :param until: 集計期間の終端（'YYYY-MM-DD HH:MM'）。省略時は最新の分
+    """
+    if minutes > rollup["window_minutes"]:
+        raise ValueError(
+            f"minutes={minutes} はリングバッファの保持期間 {rollup['window_minutes']} 分を超えています"
+        )
+    end = _minute_index(until) if until is not None else rollup["latest"]
+    if end is None:
+        return build_result(new_state(rollup["top_k"]))
+    states = [
+        state
+        for state, minute in zip(rollup["slots"], rollup["minutes"])
+        if minute is not None and end - minutes < minute <= end
+    ]
+    return build_result(merge_states(*states))
+
+
+if __name__ == "__main__":
+    csv_path = Path(__file__).parent / "data" / "sample.csv"
+    rollup = new_rollup()
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        add_csv_lines(rollup, f, has_header=True)
+    for window in (5, 15, 60):
+        print(f"直近{window}分:", query(rollup, window)["endpoint_stats"])
@@ -0,0 +1,80 @@
+"""
+bench_analyze_logs.py - csv.DictReader 版と列指向版の処理時間・ピークメモリ比較
+
+使い方: python bench_analyze_logs.py [行数 ...]（省略時は 10^5, 10^6, 10^7 行）
+"""
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analyze_logs import analyze_logs_stream
+from analyze_logs_columnar import analyze_logs_columnar
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+ROW_COUNTS = [10**5, 10**6, 10**7]
+ENDPOINTS = ["/api/users", "/api/orders", "/api/products", "/api/cart", "/api/payment"]
+
+
+def generate(path: Path, n_rows: int, seed: int = 0) -> None:
+    """sample.csv と同じ列構成の合成アクセスログを書き出す"""
+    rng = np.random.default_rng(seed)
+    base = pd.Timestamp("2026-02-01")
+    seconds = np.sort(rng.integers(0, 86400, size=n_rows))
+    df = pd.DataFrame(
+        {
+            "timestamp": (base + pd.to_timedelta(seconds, unit="s")).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+            "user_id": [f"u{i:05d}" for i in rng.integers(0, 50_000, size=n_rows)],
+            "endpoint": rng.choice(ENDPOINTS, size=n_rows),
+            "status_code": rng.choice([200, 201, 404, 500], size=n_rows, p=[0.8, 0.1, 0.06, 0.04]),
+            "response_time_ms": rng.lognormal(4.5, 1.0, size=n_rows).astype(int) + 1,
+        }
+    )
+    df.to_csv(path, index=False)
+
+
+def measure(func, path: Path) -> tuple[dict, float, float]:
+    """処理時間（秒）とピークメモリ（MB）を計測する
+
+    tracemalloc は Python オブジェクトの生成を大きく遅くするため、
+    時間計測とメモリ計測は別々の実行で行う
+    """
+    start = time.perf_counter()
+    result = func(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in row_counts:
+            path = Path(tmp) / f"access_{n_rows}.csv"
+            generate(path, n_rows)
+            result_a, time_a, peak_a = measure(analyze_logs_stream, path)
+            result_b, time_b, peak_b = measure(analyze_logs_columnar, path)
+            assert result_a == result_b, "2つのエンジンの結果が一致しません"
+            logger.info(
+                f"{n_rows:>12,}行 | DictReader: {time_a:7.2f}s / {peak_a:7.1f} MB"
+                f" | 列指向: {time_b:7.2f}s / {peak_b:7.1f} MB"
+                f" | 速度比 x{time_a / time_b:.1f}"
+            )
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
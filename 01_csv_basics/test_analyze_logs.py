@@ -0,0 +1,171 @@
+"""
+test_analyze_logs.py - analyze_logs.py のユニットテスト
+"""
+from pathlib import Path
+
+from analyze_logs import (
+    accumulate,
+    analyze_logs,
+    analyze_logs_stream,
+    analyze_partial,
+    build_result,
+    merge_states,
+    new_state,
+    percentile,
+)
+from analyze_logs_columnar import analyze_logs_columnar
+from analyze_logs_rollup import add_csv_lines, add_rows, new_rollup, query
+
+SAMPLE_PATH = Path(__file__).parent / "data" / "sample.csv"
+
+
+def read_sample() -> str:
+    return SAMPLE_PATH.read_text(encoding="utf-8")
+
+
+# ── ストリーミング ────────────────────────────────────────────────────────────
+
+def test_stream_from_path_matches_analyze_logs():
+    """パス入力のストリーミング集計が analyze_logs と一致する"""
+    assert analyze_logs_stream(SAMPLE_PATH) == analyze_logs(read_sample())
+
+
+def test_stream_from_line_iterable_matches_analyze_logs():
+    """行イテラブル入力のストリーミング集計が analyze_logs と一致する"""
+    lines = iter(read_sample().splitlines(keepends=True))
+    assert analyze_logs_stream(lines) == analyze_logs(read_sample())
+
+
+# ── マージ ────────────────────────────────────────────────────────────────────
+
+def test_merge_shards_matches_single_pass():
+    """行を2シャードに分けて集計・マージしても結果が同じ"""
+    header, *rows = read_sample().splitlines(keepends=True)
+    mid = len(rows) // 2
+    part1 = analyze_partial([header, *rows[:mid]])
+    part2 = analyze_partial([header, *rows[mid:]])
+    assert build_result(merge_states(part1, part2)) == analyze_logs(read_sample())
+
+
+def test_header_only_is_empty():
+    """ヘッダーのみの入力 → 空の結果"""
+    header = read_sample().splitlines(keepends=True)[0]
+    assert analyze_logs_stream([header]) == {"endpoint_stats": {}, "slow_requests": []}
+
+
+# ── パーセンタイル・上位K件 ──────────────────────────────────────────────────
+
+def make_rows(response_times, endpoint="/api/x"):
+    return [
+        {
+            "timestamp": f"2026-02-01 08:00:{i % 60:02d}",
+            "user_id": f"u{i:03d}",
+            "endpoint": endpoint,
+            "status_code": "200",
+            "response_time_ms": str(rt),
+        }
+        for i, rt in enumerate(response_times)
+    ]
+
+
+def test_percentiles_within_relative_error():
+    """p50/p95/p99 がソート済み実測値との相対誤差 2% 以内"""
+    times = [(i * 37) % 5000 + 1 for i in range(10_000)]
+    result = build_result(accumulate(make_rows(times), new_state()))
+    ordered = sorted(times)
+    for q in (50, 95, 99):
+        exact = ordered[-(-len(ordered) * q // 100) - 1]
+        approx = result["endpoint_stats"]["/api/x"][f"p{q}_response_time"]
+        assert abs(approx - exact) <= exact * 0.02
+
+
+def test_small_values_are_exact():
+    """128ms 未満はバケット幅1なので正確な値になる"""
+    state = accumulate(make_rows([10, 20, 30, 40, 50]), new_state())
+    assert percentile(state["stats"]["/api/x"]["hist"], 50) == 30
+
+
+def test_slow_requests_bounded_top_k():
+    """slow_requests は上位 top_k 件のみ、レスポンスタイム降順"""
+    times = list(range(1001, 1201))
+    result = build_result(accumulate(make_rows(times), new_state(top_k=5)))
+    assert [r["response_time_ms"] for r in result["slow_requests"]] == [
+        1200, 1199, 1198, 1197, 1196,
+    ]
+
+
+def test_merge_histograms_and_top_k():
+    """シャードごとのヒストグラム・上位K件をマージしても一括集計と同じ"""
+    times = [(i * 7919) % 4000 + 1 for i in range(2_000)]
+    rows = make_rows(times)
+    whole = build_result(accumulate(rows, new_state(top_k=10)))
+    parts = [accumulate(rows[i::3], new_state(top_k=10)) for i in range(3)]
+    assert build_result(merge_states(*parts)) == whole
+
+
+# ── 列指向エンジン ────────────────────────────────────────────────────────────
+
+def test_columnar_matches_dictreader():
+    """列指向エンジンの結果が csv.DictReader 版と一致する"""
+    assert analyze_logs_columnar(SAMPLE_PATH) == analyze_logs(read_sample())
+
+
+def test_columnar_chunks_match_single_pass(tmp_path):
+    """チャンクに分けて読み込んでも一括集計と同じ（ヒストグラム・上位K件を含む）"""
+    times = [(i * 7919) % 4000 + 1 for i in range(2_000)]
+    rows = make_rows(times)
+    rows[5]["status_code"] = "500"
+    path = tmp_path / "access.csv"
+    header = "timestamp,user_id,endpoint,status_code,response_time_ms\n"
+    path.write_text(
+        header + "".join(",".join(r.values()) + "\n" for r in rows), encoding="utf-8"
+    )
+    expected = build_result(accumulate(rows, new_state(top_k=10)))
+    assert analyze_logs_columnar(path, top_k=10, chunksize=300) == expected
+
+
+# ── 分単位ロールアップ ────────────────────────────────────────────────────────
+
+def make_minute_rows(n_minutes, per_minute=2):
+    """08:00 から n_minutes 分、毎分 per_minute 件の行を作る"""
+    return [
+        {
+            "timestamp": f"2026-02-01 {8 + m // 60:02d}:{m % 60:02d}:{s:02d}",
+            "user_id": "u001",
+            "endpoint": "/api/x",
+            "status_code": "500" if m % 2 else "200",
+            "response_time_ms": str(10 + m),
+        }
+        for m in range(n_minutes)
+        for s in range(per_minute)
+    ]
+
+
+def test_rollup_full_window_matches_analyze_logs():
+    """保持期間内の全件を問い合わせると analyze_logs と一致する"""
+    rollup = new_rollup()
+    with open(SAMPLE_PATH, "r", newline="", encoding="utf-8") as f:
+        add_csv_lines(rollup, f, has_header=True)
+    assert query(rollup, 60) == analyze_logs(read_sample())
+
+
+def test_rollup_last_n_minutes():
+    """直近5分の問い合わせは最新5分の行だけを集計する"""
+    rollup = add_rows(new_rollup(), make_minute_rows(30))
+    expected = build_result(accumulate(make_minute_rows(30)[-10:], new_state()))
+    assert query(rollup, 5) == expected
+
+
+def test_rollup_ring_buffer_is_bounded():
+    """保持期間を超えた分は上書きされ、スロット数は一定"""
+    rollup = add_rows(new_rollup(window_minutes=15), make_minute_rows(120))
+    assert len(rollup["slots"]) == 15
+    assert query(rollup, 15)["endpoint_stats"]["/api/x"]["count"] == 30
+
+
+def test_rollup_drops_rows_older_than_window():
+    """最新分から保持期間以上古い行は破棄してカウントする"""
+    rows = make_minute_rows(20, per_minute=1)
+    rollup = add_rows(new_rollup(window_minutes=5), rows + rows[:3])
+    assert rollup["dropped"] == 3
+    assert query(rollup, 5)["endpoint_stats"]["/api/x"]["count"] == 5
@@ -1,19 +1,61 @@
+import hashlib
+import io
+import json
 import pandas as pd
 from pathlib import Path
 
+BASE_PATH = Path(__file__).parent
+# 増分実行の状態（入力ファイルごとの読み込み済みバイト位置 + 商品別累計）
+WATERMARK_FILE = "sales_watermark.json"
 
-def etl_sales(input_file) -> None:
+# 読み込むカラムと型（quantity は不正値 "abc" 等を含むため文字列で読み、Transform で float64 に数値化する）
+# unit_price は型を固定しない（空欄・小数がなければ int64、あれば float64。変更前と同じ出力にするため）
+DTYPES = {
+    "order_id": "int64",
+    "product_name": "category",
+    "quantity": "string",
+    "order_date": "string",
+    "customer_id": "string",
+}
+USECOLS = ["order_id", "product_name", "quantity", "unit_price", "order_date", "customer_id"]
+
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    不正データの除外（quantity が負数または数値以外、order_date が不正、product_name が空）と
+    売上金額（quantity × unit_price）の計算を行う。unit_price が空の行は sales_amount が NaN になる
+    """
+    df_cleaned: pd.DataFrame = df.dropna(subset=["product_name"])
+    df_cleaned["order_date"] = pd.to_datetime(df_cleaned["order_date"], errors="coerce")
+    df_cleaned = df_cleaned.dropna(subset=["order_date"])
+    df_cleaned["quantity"] = pd.to_numeric(df_cleaned["quantity"], errors="coerce").astype("float64")
+    df_cleaned = df_cleaned.dropna(subset=["quantity"])
+    df_cleaned = df_cleaned[df_cleaned["quantity"] >= 0]
+    df_cleaned["sales_amount"] = df_cleaned["quantity"] * df_cleaned["unit_price"]
+    return df_cleaned
+
+
+def summarize(df_cleaned: pd.DataFrame) -> pd.DataFrame:
+    """商品別の total_quantity / total_sales_amount を集計する"""
+    return df_cleaned.groupby("product_name", as_index=False, observed=True).agg(
+        total_quantity=("quantity", "sum"), total_sales_amount=("sales_amount", "sum")
+    )
+
+
+def etl_sales(input_file, parquet_dir=None, output_dir=BASE_PATH) -> None:
     """
     売上データのCSVファイルを読み込み、データクレンジング・変換を行い、集計結果を出力する
 
     :param input_file: 売上データのCSVファイルパス
+    :param parquet_dir: 指定した場合、sales_cleaned を order_date の年月で分割した Parquet としても出力する
+    :param output_dir: CSVの出力先フォルダ
     :return : None
     """
 
     """
-    1. **Extract（抽出）**: CSVファイルを読み込む
+    1. **Extract（抽出）**: 必要なカラムだけを型を指定して読み込む
     """
-    df = pd.read_csv(input_file)
+    df = pd.read_csv(input_file, usecols=USECOLS, dtype=DTYPES)
     print(df.head())
 
     """
@@ -22,28 +64,147 @@ def etl_sales(input_file) -> None:
    - 売上金額の計算（quantity × unit_price）
    - 日付を datetime 型に変換
    """
-    df_cleaned: pd.DataFrame = df.dropna(subset=["product_name"])
-    df_cleaned["order_date"] = pd.to_datetime(df_cleaned["order_date"], errors="coerce")
-    df_cleaned = df_cleaned.dropna(subset=["order_date"])
-    df_cleaned["quantity"] = pd.to_numeric(df_cleaned["quantity"], errors="coerce")
-    df_cleaned = df_cleaned.dropna(subset=["quantity"])
-    df_cleaned = df_cleaned[df_cleaned["quantity"] >= 0]
-    df_cleaned["sales_amount"] = df_cleaned["quantity"] * df_cleaned["unit_price"]
-
-    df_summary: pd.DataFrame = df_cleaned.copy()
-    df_summary = df_summary.groupby("product_name", as_index=False).agg(
-        total_quantity=("quantity", "sum"), total_sales_amount=("sales_amount", "sum")
-    )
+    df_cleaned = clean(df)
+    df_summary = summarize(df_cleaned)
 
     """
     3. **Load（出力）**:
    - クレンジング後のデータを `sales_cleaned.csv` に出力
    - 商品別売上集計を `sales_summary.csv` に出力
+   - （任意）クレンジング後のデータを order_month=YYYY-MM で分割した Parquet に出力
     """
-    output_cleaned_path = Path(__file__).parent / "sales_cleaned.csv"
+    output_cleaned_path = Path(output_dir) / "sales_cleaned.csv"
     df_cleaned.to_csv(output_cleaned_path, index=False)
-    output_summary_path = Path(__file__).parent / "sales_summary.csv"
+    output_summary_path = Path(output_dir) / "sales_summary.csv"
     df_summary.to_csv(output_summary_path, index=False)
+    if parquet_dir is not None:
+        write_parquet(df_cleaned, parquet_dir)
+
+
+def write_parquet(df_cleaned: pd.DataFrame, parquet_dir, part_name: str | None = None) -> None:
+    """
+    クレンジング後のデータを order_month（order_date の年月）でパーティション分割して Parquet 出力する
+
+    part_name なし（全件実行）: 書き込む月のパーティションは既存のファイルを消してから書く。
+    part_name あり（増分実行）: 各パーティションに {part_name}-0.parquet として追加する。
+    同じ名前で書き直せば上書きになるため、どちらも再実行で行が重複しない。
+    読み込み側は filters=[("order_month", "=", "2026-01")] で不要な月のファイルを読み飛ばせる。
+    pyarrow が必要。
+    """
+    df_parquet = df_cleaned.assign(order_month=df_cleaned["order_date"].dt.strftime("%Y-%m"))
+    if part_name is None:
+        options = {"existing_data_behavior": "delete_matching"}
+    else:
+        options = {
+            "existing_data_behavior": "overwrite_or_ignore",
+            "basename_template": f"{part_name}-{{i}}.parquet",
+        }
+    df_parquet.to_parquet(
+        parquet_dir, engine="pyarrow", partition_cols=["order_month"], index=False, **options
+    )
+
+
+def increment_name(file_key: str, offset: int) -> str:
+    """
+    増分の Parquet ファイル名（入力ファイルと開始バイト位置から決まる）
+
+    ウォーターマークの保存前に落ちた場合、再実行は同じ offset から読み直すため同じ名前になり、
+    前回書いたファイルを上書きする（追記された行が増えていても、読み直す範囲は前回を含む）。
+    """
+    digest = hashlib.sha1(file_key.encode("utf-8")).hexdigest()[:12]
+    return f"inc-{digest}-{offset:012d}"
+
+
+def load_watermark(output_dir) -> dict:
+    """増分実行の状態を読み込む（初回は空の状態）"""
+    path = Path(output_dir) / WATERMARK_FILE
+    if not path.exists():
+        return {"files": {}, "cleaned_size": 0, "summary": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_watermark(state: dict, output_dir) -> None:
+    """状態を一時ファイルに書いてから置き換える（途中で落ちても壊れた状態を残さない）"""
+    path = Path(output_dir) / WATERMARK_FILE
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def extract_new_rows(input_file, offset: int) -> tuple[pd.DataFrame, int]:
+    """
+    前回のバイト位置 offset 以降に追記された行だけを読み込む
+
+    末尾が改行で終わっていない行は書き込み途中とみなし、次回に回す。
+    :return: 新規行の DataFrame と、次回の開始バイト位置
+    """
+    with open(input_file, "rb") as f:
+        header = f.readline()
+        start = max(offset, len(header))
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    df = pd.read_csv(io.BytesIO(header + data[:end]), usecols=USECOLS, dtype=DTYPES)
+    return df, start + end
+
+
+def etl_sales_incremental(input_file, parquet_dir=None, output_dir=BASE_PATH) -> int:
+    """
+    前回実行以降に追記された行だけをクレンジングし、商品別集計に加算する
+
+    入力ファイルごとに読み込み済みのバイト位置をウォーターマークとして保存するため、
+    処理時間は履歴全体ではなく新規行の件数に比例する。新しい日次ファイルは先頭から読み込む。
+    ファイルが前回より短くなっている（作り直された）場合は ValueError とし、
+    etl_sales で全件再作成してからウォーターマークを削除すること。
+
+    :param input_file: 売上データのCSVファイルパス（追記型、または日次ファイル）
+    :param parquet_dir: 指定した場合、新規行を年月パーティションの Parquet に追加する
+    :param output_dir: CSV・ウォーターマークの出力先フォルダ
+    :return: 今回処理した新規行数（クレンジング前）
+    """
+    output_dir = Path(output_dir)
+    state = load_watermark(output_dir)
+    file_key = str(Path(input_file).resolve())
+    offset = state["files"].get(file_key, 0)
+    if Path(input_file).stat().st_size < offset:
+        raise ValueError(
+            f"{input_file} が前回のウォーターマーク（{offset} bytes）より短くなっています"
+        )
+
+    # 1. Extract: 追記分のみ
+    df_new, next_offset = extract_new_rows(input_file, offset)
+
+    # 2. Transform: 新規行のクレンジングと商品別集計を、保存済みの累計に加算
+    df_cleaned = clean(df_new)
+    summary = state["summary"]
+    for row in summarize(df_cleaned).itertuples(index=False):
+        total = summary.setdefault(
+            row.product_name, {"total_quantity": 0.0, "total_sales_amount": 0.0}
+        )
+        total["total_quantity"] += float(row.total_quantity)
+        total["total_sales_amount"] += float(row.total_sales_amount)
+
+    # 3. Load: 前回コミット時点まで切り詰めてから追記する（途中失敗の再実行でも重複しない）
+    #    Parquet は開始バイト位置から決まるファイル名で書くので、再実行時は上書きになる
+    output_cleaned_path = output_dir / "sales_cleaned.csv"
+    with open(output_cleaned_path, "a+b") as f:
+        f.truncate(state["cleaned_size"])
+    df_cleaned.to_csv(
+        output_cleaned_path, mode="a", index=False, header=state["cleaned_size"] == 0
+    )
+    if parquet_dir is not None and not df_cleaned.empty:
+        write_parquet(df_cleaned, parquet_dir, increment_name(file_key, offset))
+
+    state["files"][file_key] = next_offset
+    state["cleaned_size"] = output_cleaned_path.stat().st_size
+    save_watermark(state, output_dir)
+
+    df_summary = pd.DataFrame(
+        [{"product_name": name, **total} for name, total in sorted(summary.items())],
+        columns=["product_name", "total_quantity", "total_sales_amount"],
+    )
+    df_summary.to_csv(output_dir / "sales_summary.csv", index=False)
+    return len(df_new)
 
 
 if __name__ == "__main__":
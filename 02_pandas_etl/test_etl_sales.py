@@ -0,0 +1,150 @@
+"""
+test_etl_sales.py - etl_sales.py のユニットテスト
+"""
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import etl_sales as etl
+from etl_sales import etl_sales, etl_sales_incremental
+
+RAW_PATH = Path(__file__).parent / "data" / "sales_raw.csv"
+
+
+def split_raw(tmp_path: Path, n_first: int) -> tuple[Path, list[str]]:
+    """先頭 n_first 行だけのCSVと、残りの行を返す"""
+    header, *rows = RAW_PATH.read_text(encoding="utf-8").splitlines(keepends=True)
+    path = tmp_path / "sales.csv"
+    path.write_text(header + "".join(rows[:n_first]), encoding="utf-8")
+    return path, rows[n_first:]
+
+
+def test_full_run_types(tmp_path):
+    """全件実行: quantity が float64 に数値化され、不正行が除外される"""
+    etl_sales(RAW_PATH, output_dir=tmp_path)
+    cleaned = pd.read_csv(tmp_path / "sales_cleaned.csv")
+    summary = pd.read_csv(tmp_path / "sales_summary.csv")
+    assert cleaned["order_id"].tolist() == [1, 2, 4, 8]
+    assert cleaned["quantity"].dtype == "float64"
+    assert summary.set_index("product_name")["total_sales_amount"].to_dict() == {
+        "みかん": 1040, "りんご": 450, "バナナ": 500,
+    }
+
+
+def test_sample_output_unchanged(tmp_path):
+    """サンプルデータの出力CSVは、型指定前の read_csv（推論）版と同じ内容"""
+    etl_sales(RAW_PATH, output_dir=tmp_path)
+    assert (tmp_path / "sales_cleaned.csv").read_text(encoding="utf-8") == (
+        "order_id,product_name,quantity,unit_price,order_date,customer_id,sales_amount\n"
+        "1,りんご,3.0,150,2026-01-15,C001,450.0\n"
+        "2,バナナ,5.0,100,2026-01-15,C002,500.0\n"
+        "4,みかん,10.0,80,2026-01-16,C003,800.0\n"
+        "8,みかん,3.0,80,2026-01-18,C003,240.0\n"
+    )
+    assert (tmp_path / "sales_summary.csv").read_text(encoding="utf-8") == (
+        "product_name,total_quantity,total_sales_amount\n"
+        "みかん,13.0,1040.0\n"
+        "りんご,3.0,450.0\n"
+        "バナナ,5.0,500.0\n"
+    )
+
+
+def test_typed_extract_keeps_fractional_and_blank(tmp_path):
+    """小数の quantity / unit_price は切り捨てずに残し、空欄の unit_price は sales_amount が NaN になる"""
+    path = tmp_path / "sales.csv"
+    path.write_text(
+        "order_id,product_name,quantity,unit_price,order_date,customer_id\n"
+        "1,りんご,2.5,100,2026-01-15,C001\n"
+        "2,りんご,2,,2026-01-15,C001\n"
+        "3,バナナ,1,80.5,2026-01-15,C002\n",
+        encoding="utf-8",
+    )
+    etl_sales(path, output_dir=tmp_path)
+    cleaned = pd.read_csv(tmp_path / "sales_cleaned.csv")
+    assert cleaned["order_id"].tolist() == [1, 2, 3]
+    assert cleaned["quantity"].tolist() == [2.5, 2.0, 1.0]
+    assert cleaned["sales_amount"].fillna(-1).tolist() == [250.0, -1, 80.5]
+    summary = pd.read_csv(tmp_path / "sales_summary.csv").set_index("product_name")
+    assert summary.loc["りんご", "total_quantity"] == 4.5
+    assert summary.loc["バナナ", "total_sales_amount"] == 80.5
+
+
+def test_parquet_round_trip_rerun(tmp_path):
+    """Parquet は年月で分割され、再実行しても行が重複しない"""
+    parquet_dir = tmp_path / "parquet"
+    for _ in range(2):
+        etl_sales(RAW_PATH, parquet_dir=parquet_dir, output_dir=tmp_path)
+    df = pd.read_parquet(parquet_dir).sort_values("order_id")
+    assert df["order_id"].tolist() == [1, 2, 4, 8]
+    assert df["sales_amount"].tolist() == [450, 500, 800, 240]
+    assert df["order_month"].astype(str).unique().tolist() == ["2026-01"]
+    january = pd.read_parquet(parquet_dir, filters=[("order_month", "=", "2026-01")])
+    assert len(january) == 4
+
+
+def test_incremental_matches_full_run(tmp_path):
+    """追記ごとに増分実行した結果が、全件実行と一致する"""
+    full_dir = tmp_path / "full"
+    full_dir.mkdir()
+    etl_sales(RAW_PATH, output_dir=full_dir)
+
+    inc_dir = tmp_path / "inc"
+    inc_dir.mkdir()
+    path, rest = split_raw(tmp_path, 3)
+    assert etl_sales_incremental(path, output_dir=inc_dir) == 3
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(rest)
+    assert etl_sales_incremental(path, output_dir=inc_dir) == len(rest)
+
+    for name in ["sales_cleaned.csv", "sales_summary.csv"]:
+        pd.testing.assert_frame_equal(
+            pd.read_csv(inc_dir / name), pd.read_csv(full_dir / name)
+        )
+
+
+def test_incremental_rerun_without_new_rows(tmp_path):
+    """新規行がなければ何も加算されない（冪等）"""
+    path = tmp_path / "sales.csv"
+    shutil.copy(RAW_PATH, path)
+    etl_sales_incremental(path, output_dir=tmp_path)
+    before = (tmp_path / "sales_summary.csv").read_text(encoding="utf-8")
+    assert etl_sales_incremental(path, output_dir=tmp_path) == 0
+    assert (tmp_path / "sales_summary.csv").read_text(encoding="utf-8") == before
+
+
+def test_incremental_holds_back_partial_line(tmp_path):
+    """改行で終わっていない書き込み途中の行は次回に回す"""
+    path, rest = split_raw(tmp_path, 1)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(rest[0].rstrip("\n"))
+    assert etl_sales_incremental(path, output_dir=tmp_path) == 1
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert etl_sales_incremental(path, output_dir=tmp_path) == 1
+    summary = pd.read_csv(tmp_path / "sales_summary.csv")
+    assert summary["total_quantity"].sum() == 3 + 5
+
+
+def test_incremental_parquet_rerun_after_crash(tmp_path, monkeypatch):
+    """Parquet 書き込み後・ウォーターマーク保存前に落ちても、再実行で行が重複しない"""
+    parquet_dir = tmp_path / "parquet"
+    path, rest = split_raw(tmp_path, 3)
+    etl_sales_incremental(path, parquet_dir=parquet_dir, output_dir=tmp_path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(rest[:2])
+
+    def crash(state, output_dir):
+        raise RuntimeError("crash")
+
+    with monkeypatch.context() as m:
+        m.setattr(etl, "save_watermark", crash)
+        with pytest.raises(RuntimeError):
+            etl_sales_incremental(path, parquet_dir=parquet_dir, output_dir=tmp_path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(rest[2:])
+    etl_sales_incremental(path, parquet_dir=parquet_dir, output_dir=tmp_path)
+
+    df = pd.read_parquet(parquet_dir).sort_values("order_id")
+    assert df["order_id"].tolist() == [1, 2, 4, 8]
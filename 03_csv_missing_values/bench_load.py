@@ -0,0 +1,86 @@
+"""
+bench_load.py - Load の集計（lambda 版 / ベクトル化版）の処理時間比較
+
+使い方: python bench_load.py [行数 ...]（省略時は 10^5, 10^6 行。ユーザー数は行数の 1/5）
+"""
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl_pipeline import hourly_report, user_summary
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+ROW_COUNTS = [10**5, 10**6]
+
+
+def user_summary_lambda(df: pd.DataFrame) -> pd.DataFrame:
+    """変更前の Load のユーザー別サマリー（比較用）"""
+    return df.groupby("user_id", as_index=False).agg(
+        total_views=("action", lambda x: (x == "view").sum()),
+        total_duration=("duration_sec", "sum"),
+        has_purchased=("action", lambda x: (x == "purchase").any()),
+    )
+
+
+def hourly_report_lambda(df: pd.DataFrame) -> pd.DataFrame:
+    """変更前の Load の時間別レポート（比較用、unique_users は nunique による正確な値）"""
+    return df.groupby("hour", as_index=False).agg(
+        access_count=("page", "count"),
+        unique_users=("user_id", "nunique"),
+        avg_duration=("duration_sec", lambda x: round(x.mean(), 1)),
+    )
+
+
+def assert_same_hourly(old: pd.DataFrame, new: pd.DataFrame, tolerance: float = 0.03) -> None:
+    """unique_users 以外は完全一致、unique_users は HLL の推定誤差（既定3%）以内"""
+    pd.testing.assert_frame_equal(
+        old.drop(columns="unique_users"), new.drop(columns="unique_users")
+    )
+    error = (new["unique_users"] - old["unique_users"]).abs()
+    assert (error <= old["unique_users"] * tolerance + 1).all(), "unique_users の誤差が大きすぎます"
+
+
+def generate(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Transform 後と同じ列構成の合成データ"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "user_id": [f"U{i:07d}" for i in rng.integers(0, max(n_rows // 5, 1), size=n_rows)],
+            "page": rng.choice(["/top", "/products/1", "/cart", "/checkout"], size=n_rows),
+            "action": rng.choice(["view", "add", "purchase"], size=n_rows, p=[0.7, 0.2, 0.1]),
+            "duration_sec": rng.integers(1, 300, size=n_rows).astype(float),
+            "hour": rng.integers(0, 24, size=n_rows),
+        }
+    )
+
+
+def timed(func, df: pd.DataFrame) -> tuple[pd.DataFrame, float]:
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+    for n_rows in row_counts:
+        df = generate(n_rows)
+        for name, old, new, check in [
+            ("user_summary", user_summary_lambda, user_summary, pd.testing.assert_frame_equal),
+            ("hourly_report", hourly_report_lambda, hourly_report, assert_same_hourly),
+        ]:
+            result_old, time_old = timed(old, df)
+            result_new, time_new = timed(new, df)
+            check(result_old, result_new)
+            logger.info(
+                f"{n_rows:>10,}行 {name:<14} | lambda: {time_old:7.2f}s"
+                f" | ベクトル化: {time_new:7.2f}s | 速度比 x{time_old / time_new:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,22 @@
+import math
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+import hll
+
+BASE_PATH = Path(__file__).parent
+# hourly_report.csv と同じフォルダに保存する時間帯別ユニークユーザーの HLL スケッチ
+HLL_FILE = "hourly_users_hll.npz"
+CHUNK_SIZE = 100_000
+# チャンクごとのユーザー別集計をこの行数までためてから、まとめて1回 groupby で畳み込む
+USER_BUFFER_ROWS = 2_000_000
+# 中央値スケッチ: 異なる値がこの数を超えたら対数バケット（相対誤差 SKETCH_ALPHA / 2）に切り替える
+SKETCH_MAX_DISTINCT = 2048
+SKETCH_ALPHA = 0.01
+# 対数バケットの番号のずらし幅（float64 の正の値の範囲 [5e-324, 1.8e308] のバケット番号 ±75,000 程度より大きくする）
+_BUCKET_OFFSET = 1 << 20
+
 
 def etl_pipeline(input_file: str) -> None:
     """
@@ -20,18 +36,15 @@ def Extract(input_file: str) -> pd.DataFrame:
     return df
 
 
-def Transform(df: pd.DataFrame) -> pd.DataFrame:
-    # Transform (変換・クレンジング）
+def drop_invalid(df: pd.DataFrame) -> pd.DataFrame:
     # 1.不正データの除外: timestamp が空、または duration_sec が負の値のレコードを除外する
     df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
     df = df.dropna(subset=["timestamp"])
     df = df[(df["duration_sec"] >= 0) | (df["duration_sec"].isna())]
+    return df
 
-    # 2.欠損値の補完: duration_sec が空の場合、同じ action の中央値で補完する
-    df["duration_sec"] = df["duration_sec"].fillna(
-        df.groupby("action")["duration_sec"].transform("median")
-    )
 
+def finish_transform(df: pd.DataFrame) -> pd.DataFrame:
     # 3.エラーの除外: status_code が 400以上のレコードを除外する
     df = df[df["status_code"] < 400]
 
@@ -45,26 +58,293 @@ def Transform(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def Load(df: pd.DataFrame) -> None:
-    # Load- 2つの集計CSVを出力する
-    # 1.ユーザー別サマリー
-    df_user_summary = df.groupby("user_id", as_index=False).agg(
-        total_views=("action", lambda x: (x == "view").sum()),
-        total_duration=("duration_sec", "sum"),
-        has_purchased=("action", lambda x: (x == "purchase").any()),
+def Transform(df: pd.DataFrame) -> pd.DataFrame:
+    # Transform (変換・クレンジング）
+    df = drop_invalid(df)
+
+    # 2.欠損値の補完: duration_sec が空の場合、同じ action の中央値で補完する
+    df["duration_sec"] = df["duration_sec"].fillna(
+        df.groupby("action")["duration_sec"].transform("median")
     )
-    df_user_summary.to_csv(Path(__file__).parent / "user_summary.csv", index=False)
+    return finish_transform(df)
 
-    # 2.時間別レポート
+
+def user_summary(df: pd.DataFrame) -> pd.DataFrame:
+    # ユーザー別サマリー
+    # action の判定を先に列全体で行い、集計は組み込みの sum / any のみにする（グループごとの lambda 呼び出しをなくす）
+    return (
+        df.assign(
+            is_view=df["action"] == "view",
+            is_purchase=df["action"] == "purchase",
+        )
+        .groupby("user_id", as_index=False)
+        .agg(
+            total_views=("is_view", "sum"),
+            total_duration=("duration_sec", "sum"),
+            has_purchased=("is_purchase", "any"),
+        )
+    )
+
+
+def hourly_sketches(df: pd.DataFrame, precision: int = hll.DEFAULT_PRECISION) -> dict:
+    # 時間帯ごとの user_id の HLL スケッチ {hour: レジスタ}
+    sketches = hll.add_grouped(df["hour"], df["user_id"], precision)
+    return {int(hour): registers for hour, registers in sketches.items()}
+
+
+def hourly_report(df: pd.DataFrame, sketches: dict | None = None) -> pd.DataFrame:
+    # 時間別レポート（平均の丸めはグループごとではなく結果の列に1回だけ行う）
+    # unique_users は user_id の集合を持たず、HLL スケッチの推定値を使う
+    if sketches is None:
+        sketches = hourly_sketches(df)
     df_hourly_report = df.groupby("hour", as_index=False).agg(
         access_count=("page", "count"),
-        unique_users=("user_id", "nunique"),
-        avg_duration=("duration_sec", lambda x: round(x.mean(), 1)),
+        avg_duration=("duration_sec", "mean"),
+    )
+    df_hourly_report.insert(
+        2,
+        "unique_users",
+        [round(hll.estimate(sketches[hour])) for hour in df_hourly_report["hour"]],
+    )
+    df_hourly_report["avg_duration"] = df_hourly_report["avg_duration"].round(1)
+    return df_hourly_report
+
+
+def Load(
+    df: pd.DataFrame,
+    output_dir: Path = BASE_PATH,
+    precision: int = hll.DEFAULT_PRECISION,
+) -> None:
+    # Load- 2つの集計CSVを出力する
+    # 1.ユーザー別サマリー
+    user_summary(df).to_csv(Path(output_dir) / "user_summary.csv", index=False)
+
+    # 2.時間別レポート（HLL スケッチも保存し、日をまたいだマージに使う）
+    sketches = hourly_sketches(df, precision)
+    hourly_report(df, sketches).to_csv(Path(output_dir) / "hourly_report.csv", index=False)
+    hll.save(Path(output_dir) / HLL_FILE, sketches)
+
+
+def unique_users_from_sketches(paths: list, by_hour: bool = False) -> int | dict:
+    """
+    保存済みの HLL スケッチ（日次の hourly_users_hll.npz 等）をマージしてユニークユーザー数を推定する
+
+    :param paths: スケッチファイルのパス（例: 1週間分）
+    :param by_hour: True の場合は {hour: ユニーク数}、False の場合は全時間帯の合計ユニーク数
+    """
+    merged: dict = {}
+    for path in paths:
+        for hour, registers in hll.load(path).items():
+            merged[hour] = hll.merge(merged[hour], registers) if hour in merged else registers
+    if by_hour:
+        return {hour: round(hll.estimate(r)) for hour, r in sorted(merged.items())}
+    if not merged:
+        return 0
+    return round(hll.estimate(hll.merge(*merged.values())))
+
+
+def new_sketch() -> dict:
+    """中央値スケッチ: 値ごとの件数（上限超過後は対数バケットごとの件数）"""
+    return {"exact": {}, "buckets": None}
+
+
+def _bucket_of(values: np.ndarray) -> np.ndarray:
+    # |v| を (1 + alpha) を底とする対数でバケット化する（1 未満の値も同じ相対誤差）。
+    # 0 はバケット0、正の値は _BUCKET_OFFSET + i、負の値は -(_BUCKET_OFFSET + i) にして、番号の順が値の順になるようにする
+    magnitude = np.abs(values)
+    with np.errstate(divide="ignore"):
+        index = np.floor(np.log(magnitude) / math.log1p(SKETCH_ALPHA))
+    index = np.where(magnitude > 0, index + _BUCKET_OFFSET, 0).astype("int64")
+    return np.where(values < 0, -index, index)
+
+
+def _bucket_value(index: int) -> float:
+    if index == 0:
+        return 0.0
+    # バケット範囲 [(1+a)^i, (1+a)^(i+1)) の幾何中点
+    value = (1 + SKETCH_ALPHA) ** (abs(index) - _BUCKET_OFFSET + 0.5)
+    return value if index > 0 else -value
+
+
+def sketch_add(sketch: dict, values: pd.Series) -> None:
+    """欠損を除いた値をスケッチに加算する"""
+    values = values.dropna()
+    if values.empty:
+        return
+    if sketch["buckets"] is None:
+        exact = sketch["exact"]
+        for value, count in values.value_counts(sort=False).items():
+            exact[value] = exact.get(value, 0) + int(count)
+        if len(exact) <= SKETCH_MAX_DISTINCT:
+            return
+        # 異なる値が多すぎる場合はバケットに切り替え、以後メモリを一定にする
+        keys = np.fromiter(exact.keys(), dtype="float64", count=len(exact))
+        counts = np.fromiter(exact.values(), dtype="int64", count=len(exact))
+        sketch["buckets"] = {}
+        sketch["exact"] = {}
+    else:
+        keys = values.to_numpy(dtype="float64")
+        counts = np.ones(len(keys), dtype="int64")
+    buckets = sketch["buckets"]
+    index, inverse = np.unique(_bucket_of(keys), return_inverse=True)
+    bucket_counts = np.bincount(inverse, weights=counts)
+    for i, count in zip(index.tolist(), bucket_counts.tolist()):
+        buckets[i] = buckets.get(i, 0) + int(count)
+
+
+def sketch_median(sketch: dict) -> float:
+    """
+    スケッチから中央値を返す（値がない場合は NaN）
+
+    異なる値が SKETCH_MAX_DISTINCT 以下なら pandas の median と同じ正確な値
+    （件数が偶数のときは中央2値の平均）になる
+    """
+    if sketch["buckets"] is None:
+        counts = sketch["exact"]
+        to_value = float
+    else:
+        counts = sketch["buckets"]
+        to_value = _bucket_value
+    total = sum(counts.values())
+    if total == 0:
+        return float("nan")
+    lower_rank, upper_rank = (total + 1) // 2, total // 2 + 1
+    lower = upper = None
+    seen = 0
+    for key in sorted(counts):
+        seen += counts[key]
+        if lower is None and seen >= lower_rank:
+            lower = to_value(key)
+        if seen >= upper_rank:
+            upper = to_value(key)
+            break
+    return (lower + upper) / 2
+
+
+def new_load_state(precision: int = hll.DEFAULT_PRECISION) -> dict:
+    """Load の集計をチャンクごとに累積するための状態"""
+    # users: user_id を index とする DataFrame（畳み込み済み）、user_parts: 未畳み込みのチャンクごとの集計
+    # hourly: {hour: 件数・合計・HLL レジスタ}
+    return {"users": None, "user_parts": [], "user_rows": 0, "hourly": {}, "precision": precision}
+
+
+def reduce_users(state: dict) -> None:
+    """ためておいたチャンクごとのユーザー別集計を、畳み込み済みの集計とまとめて1回の groupby で合算する"""
+    if not state["user_parts"]:
+        return
+    parts = state["user_parts"] if state["users"] is None else [state["users"], *state["user_parts"]]
+    state["users"] = (
+        pd.concat(parts)
+        .groupby(level=0)
+        .agg({"total_views": "sum", "total_duration": "sum", "has_purchased": "any"})
     )
+    state["user_parts"] = []
+    state["user_rows"] = 0
+
 
-    df_hourly_report.to_csv(Path(__file__).parent / "hourly_report.csv", index=False)
+def accumulate_load(df: pd.DataFrame, state: dict, buffer_rows: int = USER_BUFFER_ROWS) -> None:
+    """
+    Transform 済みのチャンクを user_summary / hourly_report の中間集計に加算する
+
+    ユーザー別の集計は毎チャンク畳み込むと全ユーザー分の concat + groupby がチャンク数だけ繰り返されるため、
+    buffer_rows 行たまるまでリストに積み、超えたとき（と build_load_outputs）にまとめて畳み込む。
+    """
+    if df.empty:
+        return
+    part = user_summary(df).set_index("user_id")
+    state["user_parts"].append(part)
+    state["user_rows"] += len(part)
+    if state["user_rows"] > buffer_rows:
+        reduce_users(state)
+
+    grouped = df.groupby("hour")
+    access_count = grouped["page"].count()
+    duration_sum = grouped["duration_sec"].sum()
+    duration_count = grouped["duration_sec"].count()
+    sketches = hourly_sketches(df, state["precision"])
+    for hour in access_count.index:
+        h = state["hourly"].setdefault(
+            int(hour),
+            {
+                "access_count": 0,
+                "duration_sum": 0.0,
+                "duration_count": 0,
+                "users": hll.new_registers(state["precision"]),
+            },
+        )
+        h["access_count"] += int(access_count[hour])
+        h["duration_sum"] += float(duration_sum[hour])
+        h["duration_count"] += int(duration_count[hour])
+        if int(hour) in sketches:
+            np.maximum(h["users"], sketches[int(hour)], out=h["users"])
+
+
+def build_load_outputs(state: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """中間集計から user_summary / hourly_report と同じ形式の DataFrame を生成する"""
+    reduce_users(state)
+    if state["users"] is None:
+        df_user_summary = pd.DataFrame(
+            columns=["user_id", "total_views", "total_duration", "has_purchased"]
+        )
+    else:
+        df_user_summary = state["users"].sort_index().reset_index()
+    df_hourly_report = pd.DataFrame(
+        [
+            {
+                "hour": hour,
+                "access_count": h["access_count"],
+                "unique_users": round(hll.estimate(h["users"])),
+                "avg_duration": (
+                    round(h["duration_sum"] / h["duration_count"], 1)
+                    if h["duration_count"] > 0
+                    else float("nan")
+                ),
+            }
+            for hour, h in sorted(state["hourly"].items())
+        ],
+        columns=["hour", "access_count", "unique_users", "avg_duration"],
+    )
+    return df_user_summary, df_hourly_report
+
+
+def etl_pipeline_chunked(
+    input_file: str,
+    chunksize: int = CHUNK_SIZE,
+    output_dir: Path = BASE_PATH,
+    precision: int = hll.DEFAULT_PRECISION,
+) -> None:
+    """
+    アクセスログをチャンク単位で2回読み、全件をメモリに載せずに etl_pipeline と同じCSVを出力する
+
+    1パス目: 不正データを除外し、action ごとの duration_sec を中央値スケッチに加算する
+    2パス目: スケッチの中央値で欠損を補完し、Transform の残りを適用して Load の集計に加算する
+    ピークメモリはチャンクサイズ（+ ユーザー別の中間集計と USER_BUFFER_ROWS 行までの未畳み込み分、
+    時間帯ごとの HLL レジスタ）で決まり、ファイルサイズに依存しない。
+    """
+    # 1パス目: action 別の中央値スケッチ
+    sketches: dict = {}
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        chunk = drop_invalid(chunk)
+        for action, durations in chunk.groupby("action")["duration_sec"]:
+            sketch_add(sketches.setdefault(action, new_sketch()), durations)
+    medians = {action: sketch_median(sketch) for action, sketch in sketches.items()}
+
+    # 2パス目: 補完 → 変換 → 集計
+    state = new_load_state(precision)
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        chunk = drop_invalid(chunk)
+        chunk["duration_sec"] = chunk["duration_sec"].fillna(chunk["action"].map(medians))
+        accumulate_load(finish_transform(chunk), state)
+
+    df_user_summary, df_hourly_report = build_load_outputs(state)
+    df_user_summary.to_csv(Path(output_dir) / "user_summary.csv", index=False)
+    df_hourly_report.to_csv(Path(output_dir) / "hourly_report.csv", index=False)
+    hll.save(
+        Path(output_dir) / HLL_FILE,
+        {hour: h["users"] for hour, h in state["hourly"].items()},
+    )
 
 
 if __name__ == "__main__":
-    csv_path = Path(__file__).parent / "data" / "access_log.csv"
+    csv_path = BASE_PATH / "data" / "access_log.csv"
     etl_pipeline(csv_path)
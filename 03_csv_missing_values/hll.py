@@ -0,0 +1,97 @@
+"""
+hll.py - HyperLogLog によるユニーク数の推定（NumPy 実装）
+
+レジスタは長さ 2^precision の uint8 配列。同じ precision のレジスタは要素ごとの max でマージできるため、
+日次のスケッチから週次・月次のユニーク数を生データを読み直さずに求められる。
+標準誤差は約 1.04 / sqrt(2^precision)（precision=14 で約0.8%、16KB）。
+"""
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PRECISION = 14
+
+
+def _check_precision(precision: int) -> None:
+    if not 4 <= precision <= 18:
+        raise ValueError(f"precision は 4〜18 で指定してください: {precision}")
+
+
+def new_registers(precision: int = DEFAULT_PRECISION) -> np.ndarray:
+    _check_precision(precision)
+    return np.zeros(1 << precision, dtype="uint8")
+
+
+def precision_of(registers: np.ndarray) -> int:
+    return int(len(registers)).bit_length() - 1
+
+
+def _index_rank(values: pd.Series, precision: int) -> tuple[np.ndarray, np.ndarray]:
+    """各値のレジスタ番号と rank を返す。ハッシュは実行ごとに変わらない hash_pandas_object を使う"""
+    hashed = pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy()
+    index = (hashed >> np.uint64(64 - precision)).astype("int64")
+    rest = hashed << np.uint64(precision)
+    # 残りのビットの先頭から続く 0 の数 + 1（frexp の指数 = bit_length）
+    _, bit_length = np.frexp(rest.astype("float64"))
+    rank = np.minimum(64 - np.minimum(bit_length, 64) + 1, 64 - precision + 1)
+    return index, rank.astype("uint8")
+
+
+def add(registers: np.ndarray, values: pd.Series) -> np.ndarray:
+    """値（欠損を除く）をレジスタに加える"""
+    values = values.dropna()
+    if values.empty:
+        return registers
+    index, rank = _index_rank(values, precision_of(registers))
+    np.maximum.at(registers, index, rank)
+    return registers
+
+
+def add_grouped(
+    keys: pd.Series, values: pd.Series, precision: int = DEFAULT_PRECISION
+) -> dict:
+    """キー（時間帯など）ごとのレジスタ {キー: レジスタ} を、ハッシュ計算1回でまとめて作る"""
+    _check_precision(precision)
+    mask = values.notna() & keys.notna()
+    codes, uniques = pd.factorize(keys[mask], sort=True)
+    registers = np.zeros((len(uniques), 1 << precision), dtype="uint8")
+    if len(uniques):
+        index, rank = _index_rank(values[mask], precision)
+        np.maximum.at(registers, (codes, index), rank)
+    return {key: registers[i] for i, key in enumerate(uniques.tolist())}
+
+
+def merge(*registers: np.ndarray) -> np.ndarray:
+    """同じ precision のレジスタを要素ごとの max でマージする"""
+    if len({len(r) for r in registers}) != 1:
+        raise ValueError("precision の異なるスケッチはマージできません")
+    return np.maximum.reduce(registers)
+
+
+def estimate(registers: np.ndarray) -> float:
+    """ユニーク数の推定値（小さい値は linear counting で補正）"""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype("int64")))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * m and zeros > 0:
+        return m * math.log(m / zeros)
+    return float(raw)
+
+
+def save(path: Path, sketches: dict) -> None:
+    """{キー: レジスタ} を1ファイル（npz）に保存する"""
+    keys = sorted(sketches)
+    np.savez_compressed(
+        path,
+        keys=np.array(keys, dtype="int64"),
+        registers=np.stack([sketches[k] for k in keys]) if keys else np.zeros((0, 0), "uint8"),
+    )
+
+
+def load(path: Path) -> dict:
+    """save で保存した {キー: レジスタ} を読み込む"""
+    with np.load(path) as data:
+        return {int(k): r.copy() for k, r in zip(data["keys"], data["registers"])}
@@ -0,0 +1,166 @@
+"""
+test_etl_pipeline.py - etl_pipeline.py のユニットテスト
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_load import (
+    assert_same_hourly,
+    generate,
+    hourly_report_lambda,
+    user_summary_lambda,
+)
+from etl_pipeline import (
+    Extract,
+    Load,
+    Transform,
+    HLL_FILE,
+    accumulate_load,
+    build_load_outputs,
+    etl_pipeline_chunked,
+    hourly_report,
+    new_load_state,
+    new_sketch,
+    sketch_add,
+    sketch_median,
+    unique_users_from_sketches,
+    user_summary,
+)
+import hll
+
+LOG_PATH = Path(__file__).parent / "data" / "access_log.csv"
+
+
+def transformed() -> pd.DataFrame:
+    return Transform(Extract(LOG_PATH))
+
+
+# ── Load の集計 ───────────────────────────────────────────────────────────────
+
+def test_load_outputs(tmp_path):
+    """サンプルデータの user_summary.csv / hourly_report.csv の内容"""
+    Load(transformed(), output_dir=tmp_path)
+    users = pd.read_csv(tmp_path / "user_summary.csv")
+    hourly = pd.read_csv(tmp_path / "hourly_report.csv")
+    assert users["user_id"].tolist() == ["U001", "U002", "U003", "U005"]
+    assert users["total_views"].tolist() == [3, 3, 0, 1]
+    assert users["has_purchased"].tolist() == [False, True, True, False]
+    assert hourly["avg_duration"].tolist() == [34.3, 24.5]
+
+
+def test_vectorized_matches_lambda_sample():
+    """ベクトル化版が lambda 版と同じ結果（サンプルデータ）"""
+    df = transformed()
+    pd.testing.assert_frame_equal(user_summary(df), user_summary_lambda(df))
+    pd.testing.assert_frame_equal(hourly_report(df), hourly_report_lambda(df))
+
+
+def test_vectorized_matches_lambda_synthetic():
+    """ベクトル化版が lambda 版と同じ結果（合成データ）"""
+    df = generate(2_000)
+    pd.testing.assert_frame_equal(user_summary(df), user_summary_lambda(df))
+    assert_same_hourly(hourly_report_lambda(df), hourly_report(df))
+
+
+# ── チャンク処理・中央値スケッチ ──────────────────────────────────────────────
+
+def test_chunked_matches_batch(tmp_path):
+    """チャンク2パス版の出力CSVが一括版と一致する"""
+    (tmp_path / "batch").mkdir()
+    (tmp_path / "chunked").mkdir()
+    Load(transformed(), output_dir=tmp_path / "batch")
+    etl_pipeline_chunked(LOG_PATH, chunksize=4, output_dir=tmp_path / "chunked")
+    for name in ["user_summary.csv", "hourly_report.csv"]:
+        assert (tmp_path / "chunked" / name).read_text() == (tmp_path / "batch" / name).read_text()
+
+
+def test_user_buffer_reduce_matches_batch():
+    """ユーザー別集計を途中で何度畳み込んでも（buffer_rows が小さくても）一括の user_summary と一致する"""
+    df = generate(2_000)
+    expected = user_summary(df)
+    for buffer_rows in [0, 500, 10**6]:
+        state = new_load_state()
+        for start in range(0, len(df), 300):
+            accumulate_load(df.iloc[start:start + 300], state, buffer_rows=buffer_rows)
+        users, _ = build_load_outputs(state)
+        pd.testing.assert_frame_equal(users, expected)
+
+
+def test_sketch_median_exact_for_few_distinct_values():
+    """異なる値が少ない場合は pandas の median と完全一致（偶数件は中央2値の平均）"""
+    values = pd.Series([5.0, 1.0, np.nan, 3.0, 8.0, 3.0, 10.0])
+    sketch = new_sketch()
+    sketch_add(sketch, values[:3])
+    sketch_add(sketch, values[3:])
+    assert sketch_median(sketch) == values.median()
+
+
+def test_sketch_median_bounded_for_many_distinct_values():
+    """異なる値が多い場合はバケット数が上限内で、相対誤差 1% 以内"""
+    values = pd.Series(np.random.default_rng(0).lognormal(3, 1, 50_000))
+    sketch = new_sketch()
+    for start in range(0, len(values), 10_000):
+        sketch_add(sketch, values[start:start + 10_000])
+    assert sketch["buckets"] is not None
+    assert len(sketch["buckets"]) < 2048
+    assert abs(sketch_median(sketch) - values.median()) <= values.median() * 0.01
+
+
+@pytest.mark.parametrize("values", [
+    # 中央値が 1 未満（約0.05）
+    np.random.default_rng(1).lognormal(-3, 1, 50_000),
+    # 0 と負の値を含む（バケット番号の順が値の順になる）
+    np.concatenate([np.zeros(5_000), -np.random.default_rng(2).lognormal(0, 1, 20_000),
+                    np.random.default_rng(3).lognormal(-1, 1, 30_000)]),
+])
+def test_sketch_median_bounded_below_one(values):
+    """1 未満の値でもバケット化後の中央値は相対誤差 1% 以内"""
+    values = pd.Series(values)
+    sketch = new_sketch()
+    sketch_add(sketch, values)
+    assert sketch["buckets"] is not None
+    assert abs(sketch_median(sketch) - values.median()) <= abs(values.median()) * 0.01
+
+
+def test_sketch_median_empty_is_nan():
+    """値がない action の中央値は NaN（補完されない）"""
+    sketch = new_sketch()
+    sketch_add(sketch, pd.Series([np.nan]))
+    assert np.isnan(sketch_median(sketch))
+
+
+# ── HyperLogLog ───────────────────────────────────────────────────────────────
+
+def test_hll_small_counts_are_exact():
+    """少数の値は linear counting でほぼ正確（重複・欠損は数えない）"""
+    registers = hll.add(hll.new_registers(), pd.Series(["U1", "U2", "U2", None, "U3"]))
+    assert round(hll.estimate(registers)) == 3
+
+
+def test_hll_large_count_within_error():
+    """10万件の推定誤差が 3% 以内"""
+    users = pd.Series([f"U{i:07d}" for i in range(100_000)])
+    estimate = hll.estimate(hll.add(hll.new_registers(12), users))
+    assert abs(estimate - 100_000) <= 3_000
+
+
+def test_sketches_merge_across_days(tmp_path):
+    """日次スケッチをマージした週次ユニーク数が、全期間の正確な値に近い"""
+    days = []
+    for day in range(7):
+        df = generate(3_000, seed=day)
+        df["user_id"] = df["user_id"].str.replace("U", f"D{day % 3}-")
+        out = tmp_path / f"day{day}"
+        out.mkdir()
+        Load(df, output_dir=out)
+        days.append(df)
+    paths = [tmp_path / f"day{day}" / HLL_FILE for day in range(7)]
+    exact = pd.concat(days)["user_id"].nunique()
+    assert abs(unique_users_from_sketches(paths) - exact) <= exact * 0.03
+    by_hour = unique_users_from_sketches(paths, by_hour=True)
+    exact_by_hour = pd.concat(days).groupby("hour")["user_id"].nunique()
+    for hour, count in by_hour.items():
+        assert abs(count - exact_by_hour[hour]) <= exact_by_hour[hour] * 0.03 + 1
@@ -0,0 +1,69 @@
+"""
+bench_hours.py - 勤務時間の計算（pd.to_datetime 版 / HH:MM 直接変換版）の処理時間比較
+
+使い方: python bench_hours.py [行数 ...]（省略時は 10^7 行）
+"""
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl_merge import work_hours
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+ROW_COUNTS = [10**7]
+HHMM = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)], dtype=object)
+
+
+def work_hours_to_datetime(clock_in: pd.Series, clock_out: pd.Series) -> pd.Series:
+    """変更前の勤務時間の計算（比較用、日をまたぐ勤務は負の値になる）"""
+    return round(
+        (
+            pd.to_datetime(clock_out, format="%H:%M")
+            - pd.to_datetime(clock_in, format="%H:%M")
+        ).dt.total_seconds()
+        / 3600,
+        1,
+    )
+
+
+def generate(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """日中勤務（clock_out > clock_in）の勤怠。clock_out の 1% は欠損"""
+    rng = np.random.default_rng(seed)
+    clock_in = rng.integers(6 * 60, 12 * 60, size=n_rows)
+    clock_out = clock_in + rng.integers(60, 12 * 60, size=n_rows)
+    df = pd.DataFrame(
+        {
+            "clock_in": pd.Series(HHMM[clock_in], dtype="str"),
+            "clock_out": pd.Series(HHMM[clock_out], dtype="str"),
+        }
+    )
+    df.loc[rng.random(n_rows) < 0.01, "clock_out"] = None
+    return df
+
+
+def timed(func, df: pd.DataFrame):
+    start = time.perf_counter()
+    result = func(df["clock_in"], df["clock_out"])
+    return result, time.perf_counter() - start
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+    for n_rows in row_counts:
+        df = generate(n_rows)
+        result_old, time_old = timed(work_hours_to_datetime, df)
+        result_new, time_new = timed(work_hours, df)
+        np.testing.assert_array_equal(result_old.to_numpy(), result_new)
+        logger.info(
+            f"{n_rows:>12,}行 | to_datetime: {time_old:7.2f}s"
+            f" | HH:MM 直接変換: {time_new:7.2f}s | 速度比 x{time_old / time_new:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
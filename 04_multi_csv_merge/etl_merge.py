@@ -1,8 +1,15 @@
+import hashlib
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
 BASE_PATH = Path(__file__).parent
 DATA_PATH = BASE_PATH / "data"
+# 部門・社員マスタのキャッシュ（元CSVの更新日時・サイズが変わったときだけ作り直す）
+MASTER_CACHE_PATH = BASE_PATH / "master_cache.pkl"
+CHUNK_SIZE = 100_000
+# 増分集計の状態（社員別の累計・適用済み日付・日付ごとの寄与分）
+STATE_DIR = BASE_PATH / "attendance_state"
 
 
 def extract(
@@ -15,66 +22,132 @@ def extract(
     return dept_df, emp_df, att_df
 
 
-def transform(
-    dept_df: pd.DataFrame, emp_df: pd.DataFrame, att_df: pd.DataFrame
-) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    """1.不整合検出"""
-    issues = []
+def _issue_frame(issue_type: str, record_id: pd.Series, detail) -> pd.DataFrame:
+    """不整合レポートの1種類分を列単位で作る（detail は文字列または Series）"""
+    return pd.DataFrame(
+        {"issue_type": issue_type, "record_id": record_id, "detail": detail},
+        columns=["issue_type", "record_id", "detail"],
+    )
+
+
+def _to_text(col: pd.Series) -> pd.Series:
+    # str(値) と同じ文字列にする（欠損は "nan"）
+    return col.astype(str).fillna("nan")
+
+
+def dept_issues(dept_ids, emp_df: pd.DataFrame) -> pd.DataFrame:
     # invalid_dept: 社員マスタに存在しないdept_idを持つ社員
-    invalid_dept = emp_df[~emp_df["dept_id"].isin(dept_df["dept_id"])]
-    for _, row in invalid_dept.iterrows():
-        issues.append(
-            {
-                "issue_type": "invalid_dept",
-                "record_id": row["emp_id"],
-                "detail": "id=" + str(row["dept_id"]) + "は部門マスタに存在しない",
-            }
-        )
+    invalid_dept = emp_df[~emp_df["dept_id"].isin(dept_ids)]
+    return _issue_frame(
+        "invalid_dept",
+        invalid_dept["emp_id"],
+        "id=" + _to_text(invalid_dept["dept_id"]) + "は部門マスタに存在しない",
+    )
+
+
+def attendance_issues(
+    emp_ids, att_df: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame]:
     # invalid_emp: 勤怠記録に存在しない emp_id のレコード（社員マスタにないもの）
-    invalid_emp = att_df[~att_df["emp_id"].isin(emp_df["emp_id"])]
-    for _, row in invalid_emp.iterrows():
-        issues.append(
-            {
-                "issue_type": "invalid_emp",
-                "record_id": row["emp_id"],
-                "detail": "社員マスタに存在しない社員の勤怠レコード",
-            }
-        )
+    invalid_emp = att_df[~att_df["emp_id"].isin(emp_ids)]
     # missing_clock_in: clock_in が空（欠損）の勤怠レコード
     missing_clock_in = att_df[att_df["clock_in"].isna()]
-    for _, row in missing_clock_in.iterrows():
-        issues.append(
-            {
-                "issue_type": "missing_clock_in",
-                "record_id": row["emp_id"],
-                "detail": "date=" + str(row["date"]) + "の clock_in が欠損",
-            }
-        )
-
-    """ 2.データ結合 """
-    merge_df = pd.merge(emp_df, dept_df, on="dept_id", how="left")
+    return (
+        _issue_frame(
+            "invalid_emp",
+            invalid_emp["emp_id"],
+            "社員マスタに存在しない社員の勤怠レコード",
+        ),
+        _issue_frame(
+            "missing_clock_in",
+            missing_clock_in["emp_id"],
+            "date=" + _to_text(missing_clock_in["date"]) + "の clock_in が欠損",
+        ),
+    )
 
-    """ 3.勤務時間の計算 """
-    att_df = att_df.dropna(subset="clock_in")
-    att_df = att_df[att_df["emp_id"].isin(emp_df["emp_id"])]
-    att_df["hours"] = round(
-        (
-            pd.to_datetime(att_df["clock_out"], format="%H:%M")
-            - pd.to_datetime(att_df["clock_in"], format="%H:%M")
-        ).dt.total_seconds()
-        / 3600,
-        1,
+
+def find_issues(
+    dept_df: pd.DataFrame, emp_df: pd.DataFrame, att_df: pd.DataFrame
+) -> pd.DataFrame:
+    """1.不整合検出（行ループを使わず、マスク・列単位の文字列結合・concat で作る）"""
+    invalid_emp, missing_clock_in = attendance_issues(emp_df["emp_id"], att_df)
+    return pd.concat(
+        [dept_issues(dept_df["dept_id"], emp_df), invalid_emp, missing_clock_in],
+        ignore_index=True,
     )
-    att_hour_df = att_df.groupby("emp_id").agg(hours=("hours", "sum"))
 
-    """ 4.残業カウント"""
+
+def hhmm_to_minutes(col: pd.Series) -> np.ndarray:
+    """
+    "HH:MM" の時刻を 0時からの分（float64、欠損は NaN）に変換する
+
+    固定幅の文字列をバイト配列として読み、数字4桁を直接計算する（Timestamp は作らない）。
+    固定幅でない値（"9:00" など）だけ pd.to_datetime(format="%H:%M") で変換し、不正な値はそこで ValueError になる。
+    """
+    missing = col.isna().to_numpy()
+    try:
+        # 6バイト目が 0 でなければ6文字以上（切り捨てで見逃さないよう1バイト余分に取る）
+        chars = col.fillna("00:00").to_numpy(dtype="S6").view("uint8").reshape(-1, 6)
+    except UnicodeEncodeError:
+        chars = np.zeros((len(col), 6), dtype="uint8")
+    digits = chars[:, [0, 1, 3, 4]].astype("int16") - ord("0")
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 2] * 10 + digits[:, 3]
+    fixed = (
+        (chars[:, 2] == ord(":"))
+        & (chars[:, 5] == 0)
+        & ((digits >= 0) & (digits <= 9)).all(axis=1)
+        & (hours < 24)
+        & (minutes < 60)
+    )
+    result = (hours * 60 + minutes).astype("float64")
+    other = ~fixed & ~missing
+    if other.any():
+        parsed = pd.to_datetime(col[other], format="%H:%M")
+        result[other] = (parsed.dt.hour * 60 + parsed.dt.minute).to_numpy()
+    result[missing] = np.nan
+    return result
+
+
+def work_hours(clock_in: pd.Series, clock_out: pd.Series) -> np.ndarray:
+    """勤務時間（時間、小数1桁）。clock_out が clock_in より前なら日をまたいだ勤務として24時間を足す"""
+    minutes = hhmm_to_minutes(clock_out) - hhmm_to_minutes(clock_in)
+    minutes[minutes < 0] += 24 * 60
+    return np.round(minutes / 60, 1)
+
+
+def valid_attendance(emp_ids, att_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    clock_in 欠損・社員マスタにない社員の勤怠を除き、1件ごとの勤務時間 hours を追加する
+
+    emp_ids が None の場合は社員マスタでは絞り込まない（summarize でのマスタとの結合で落ちる）。
+    """
+    att_df = att_df.dropna(subset="clock_in")
+    if emp_ids is not None:
+        att_df = att_df[att_df["emp_id"].isin(emp_ids)]
+    att_df["hours"] = work_hours(att_df["clock_in"], att_df["clock_out"])
+    return att_df
+
+
+def attendance_totals(att_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """社員別の勤務時間合計と残業回数（残業のない社員は含まない）"""
+    att_hour_df = att_df.groupby("emp_id").agg(hours=("hours", "sum"))
     att_count_df = (
         att_df[att_df["status"] == "overtime"]
         .groupby("emp_id")
         .agg(overtime_count=("status", "size"))
     )
+    return att_hour_df, att_count_df
+
 
-    """ 集計まとめ """
+def summarize(
+    dept_df: pd.DataFrame,
+    emp_df: pd.DataFrame,
+    att_hour_df: pd.DataFrame,
+    att_count_df: pd.DataFrame,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """社員別の合計をマスタと結合し、dept_summary / employee_work を作る"""
+    merge_df = pd.merge(emp_df, dept_df, on="dept_id", how="left")
     merge_df = pd.merge(merge_df, att_hour_df, on="emp_id", how="left")
     merge_df = pd.merge(merge_df, att_count_df, on="emp_id", how="left")
 
@@ -89,8 +162,205 @@ def transform(
     employee_work = merge_df.groupby(["emp_id", "name", "dept_name"]).agg(
         total_hours=("hours", "sum"), overtime_count=("overtime_count", "sum")
     )
+    # 勤務時間は1件ごとに小数1桁に丸めてあるので、合計も小数1桁に丸めて浮動小数点の誤差を出力に残さない
+    # （増分版は寄与分の加算・減算を繰り返すため、丸めないと全件の transform と表記がずれる）
+    dept_summary["total_work_hours"] = dept_summary["total_work_hours"].round(1)
+    employee_work["total_hours"] = employee_work["total_hours"].round(1)
+    return dept_summary, employee_work
+
+
+def transform(
+    dept_df: pd.DataFrame, emp_df: pd.DataFrame, att_df: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """1.不整合検出"""
+    issues = find_issues(dept_df, emp_df, att_df)
+
+    """ 2.勤務時間の計算 """
+    att_df = valid_attendance(emp_df["emp_id"], att_df)
+
+    """ 3.社員別の勤務時間合計・残業カウント"""
+    att_hour_df, att_count_df = attendance_totals(att_df)
+
+    """ 4.データ結合・集計まとめ """
+    dept_summary, employee_work = summarize(dept_df, emp_df, att_hour_df, att_count_df)
+
+    return issues, dept_summary, employee_work
+
+
+def _file_signature(path: Path) -> list:
+    stat = Path(path).stat()
+    return [str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size]
+
+
+def load_masters(
+    dept_path: Path, emp_path: Path, cache_path: Path = MASTER_CACHE_PATH
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    部門・社員マスタをキャッシュから読み込む
+
+    キャッシュには dept_id / emp_id をインデックスにした DataFrame を保存する。
+    元CSVのパス・更新日時・サイズのいずれかが変わっていればCSVから作り直す。
+    """
+    signature = [_file_signature(dept_path), _file_signature(emp_path)]
+    if Path(cache_path).exists():
+        cache = pd.read_pickle(cache_path)
+        if cache["signature"] == signature:
+            return cache["dept"], cache["emp"]
+
+    dept_df = pd.read_csv(dept_path).set_index("dept_id", drop=False)
+    emp_df = pd.read_csv(emp_path).set_index("emp_id", drop=False)
+    pd.to_pickle({"signature": signature, "dept": dept_df, "emp": emp_df}, cache_path)
+    return dept_df, emp_df
+
+
+def stream_attendance(
+    att_path: Path, emp_df: pd.DataFrame, chunksize: int = CHUNK_SIZE
+) -> tuple[list, list, pd.Series, pd.Series]:
+    """
+    勤怠CSVをチャンクごとに読み、不整合の検出と社員別の合計への加算を行う
+
+    保持するのは検出した不整合と社員別の合計だけなので、メモリは勤怠の履歴件数に比例しない。
+    :return: invalid_emp / missing_clock_in の不整合（チャンクごとのリスト）、社員別の勤務時間合計・残業回数
+    """
+    invalid_emp_parts, missing_parts = [], []
+    hours = pd.Series(dtype="float64")
+    overtime = pd.Series(dtype="int64")
+    for chunk in pd.read_csv(att_path, chunksize=chunksize):
+        invalid_emp, missing_clock_in = attendance_issues(emp_df.index, chunk)
+        invalid_emp_parts.append(invalid_emp)
+        missing_parts.append(missing_clock_in)
+
+        att_hour_df, att_count_df = attendance_totals(valid_attendance(emp_df.index, chunk))
+        hours = hours.add(att_hour_df["hours"], fill_value=0)
+        overtime = overtime.add(att_count_df["overtime_count"], fill_value=0)
+    return invalid_emp_parts, missing_parts, hours, overtime
+
+
+def transform_streaming(
+    dept_path: Path,
+    emp_path: Path,
+    att_path: Path,
+    chunksize: int = CHUNK_SIZE,
+    cache_path: Path = MASTER_CACHE_PATH,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """マスタはキャッシュ、勤怠はチャンク読み込みで transform と同じ3つの結果を返す"""
+    dept_df, emp_df = load_masters(dept_path, emp_path, cache_path)
+    invalid_emp_parts, missing_parts, hours, overtime = stream_attendance(
+        att_path, emp_df, chunksize
+    )
+    issues = pd.concat(
+        [dept_issues(dept_df.index, emp_df), *invalid_emp_parts, *missing_parts],
+        ignore_index=True,
+    )
+    dept_summary, employee_work = summarize(
+        dept_df.reset_index(drop=True),
+        emp_df.reset_index(drop=True),
+        hours.rename_axis("emp_id").to_frame("hours"),
+        overtime.astype("int64").rename_axis("emp_id").to_frame("overtime_count"),
+    )
+    return issues, dept_summary, employee_work
+
+
+def _date_contribution(att_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    1日分の勤怠から社員別の tenth_hours（勤務時間の 0.1 時間単位の整数）/ overtime_count の寄与分を作る
+
+    日付のハッシュは勤怠の内容だけで決まるため、寄与分は社員マスタで絞り込まずに保存する。
+    後から社員マスタに追加された社員の分も、summarize でマスタと結合した時点で集計に入る。
+    勤務時間は1件ごとに小数1桁に丸めてあるので、整数で持てば加算・減算を繰り返しても誤差が出ない。
+    """
+    att_hour_df, att_count_df = attendance_totals(valid_attendance(None, att_df))
+    tenth_hours = (att_hour_df["hours"] * 10).round().astype("int64").to_frame("tenth_hours")
+    return tenth_hours.join(att_count_df, how="outer").fillna(
+        {"tenth_hours": 0, "overtime_count": 0}
+    ).astype({"tenth_hours": "int64", "overtime_count": "int64"})
+
+
+def _date_hash(att_df: pd.DataFrame) -> str:
+    """1日分の勤怠の内容ハッシュ（行の順序には依存しない）"""
+    rows = att_df.sort_values(list(att_df.columns)).to_csv(index=False)
+    return hashlib.sha256(rows.encode("utf-8")).hexdigest()[:16]
+
+
+def load_state(state_dir: Path = STATE_DIR) -> dict:
+    """社員別の累計と適用済み日付 {date: 内容ハッシュ} を読み込む（初回は空）"""
+    path = Path(state_dir) / "state.pkl"
+    if not path.exists():
+        empty = pd.DataFrame(
+            {"tenth_hours": pd.Series(dtype="int64"), "overtime_count": pd.Series(dtype="int64")}
+        ).rename_axis("emp_id")
+        return {"totals": empty, "applied": {}}
+    return pd.read_pickle(path)
+
+
+def apply_attendance(
+    att_path: Path,
+    dept_path: Path,
+    emp_path: Path,
+    state_dir: Path = STATE_DIR,
+    cache_path: Path = MASTER_CACHE_PATH,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, dict]:
+    """
+    新しい日付の勤怠だけを社員別の累計に加算し、累計から dept_summary / employee_work を作り直す
 
-    return pd.DataFrame(issues), dept_summary, employee_work
+    - 未適用の日付: 寄与分を累計に加算する
+    - 適用済みで内容が同じ日付: 何もしない（同じファイルを再投入しても二重計上しない）
+    - 適用済みで内容が変わった日付（遅れて届いた修正）: 前回の寄与分を引いてから新しい寄与分を加算する
+
+    日付ごとの寄与分は state_dir/contrib/ に内容ハッシュ付きのファイル名で保存し、修正時に参照する。
+    1つの日付の勤怠は1回の入力にすべて含まれている前提（日次ファイルの単位）。
+
+    :return: 今回の入力の不整合、dept_summary、employee_work、{date: "added" / "replaced" / "unchanged"}
+    """
+    state_dir = Path(state_dir)
+    contrib_dir = state_dir / "contrib"
+    contrib_dir.mkdir(parents=True, exist_ok=True)
+    dept_df, emp_df = load_masters(dept_path, emp_path, cache_path)
+    state = load_state(state_dir)
+    totals = state["totals"]
+    applied = dict(state["applied"])
+
+    att_df = pd.read_csv(att_path)
+    invalid_emp, missing_clock_in = attendance_issues(emp_df.index, att_df)
+    issues = pd.concat(
+        [dept_issues(dept_df.index, emp_df), invalid_emp, missing_clock_in],
+        ignore_index=True,
+    )
+
+    actions = {}
+    obsolete = []
+    for date, rows in att_df.groupby("date", sort=True):
+        date_hash = _date_hash(rows)
+        old_hash = applied.get(date)
+        if old_hash == date_hash:
+            actions[date] = "unchanged"
+            continue
+        if old_hash is not None:
+            old_path = contrib_dir / f"{date}_{old_hash}.pkl"
+            totals = totals.sub(pd.read_pickle(old_path), fill_value=0)
+            obsolete.append(old_path)
+        contribution = _date_contribution(rows)
+        pd.to_pickle(contribution, contrib_dir / f"{date}_{date_hash}.pkl")
+        totals = totals.add(contribution, fill_value=0)
+        applied[date] = date_hash
+        actions[date] = "added" if old_hash is None else "replaced"
+
+    # 状態の更新は一時ファイル経由で1回だけ行い、その後に古い寄与分を削除する
+    totals = totals.astype({"tenth_hours": "int64", "overtime_count": "int64"})
+    tmp_path = state_dir / "state.pkl.tmp"
+    pd.to_pickle({"totals": totals, "applied": applied}, tmp_path)
+    tmp_path.replace(state_dir / "state.pkl")
+    for path in obsolete:
+        path.unlink(missing_ok=True)
+
+    # 累計から2つのレポートを作り直す（残業0回の社員は transform と同じく残業なし扱い）
+    dept_summary, employee_work = summarize(
+        dept_df.reset_index(drop=True),
+        emp_df.reset_index(drop=True),
+        (totals["tenth_hours"] / 10).to_frame("hours"),
+        totals.loc[totals["overtime_count"] > 0, ["overtime_count"]],
+    )
+    return issues, dept_summary, employee_work, actions
 
 
 def load(
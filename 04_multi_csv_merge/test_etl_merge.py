@@ -0,0 +1,267 @@
+"""
+test_etl_merge.py - etl_merge.py のユニットテスト
+"""
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl_merge import (
+    DATA_PATH,
+    apply_attendance,
+    extract,
+    find_issues,
+    hhmm_to_minutes,
+    load_masters,
+    transform,
+    transform_streaming,
+    work_hours,
+)
+
+
+def find_issues_iterrows(dept_df, emp_df, att_df) -> pd.DataFrame:
+    """変更前の iterrows による不整合検出（比較用）"""
+    issues = []
+    for _, row in emp_df[~emp_df["dept_id"].isin(dept_df["dept_id"])].iterrows():
+        issues.append({
+            "issue_type": "invalid_dept",
+            "record_id": row["emp_id"],
+            "detail": "id=" + str(row["dept_id"]) + "は部門マスタに存在しない",
+        })
+    for _, row in att_df[~att_df["emp_id"].isin(emp_df["emp_id"])].iterrows():
+        issues.append({
+            "issue_type": "invalid_emp",
+            "record_id": row["emp_id"],
+            "detail": "社員マスタに存在しない社員の勤怠レコード",
+        })
+    for _, row in att_df[att_df["clock_in"].isna()].iterrows():
+        issues.append({
+            "issue_type": "missing_clock_in",
+            "record_id": row["emp_id"],
+            "detail": "date=" + str(row["date"]) + "の clock_in が欠損",
+        })
+    return pd.DataFrame(issues)
+
+
+def sample_frames():
+    return extract(
+        DATA_PATH / "departments.csv",
+        DATA_PATH / "employees.csv",
+        DATA_PATH / "attendance.csv",
+    )
+
+
+# ── 不整合検出 ────────────────────────────────────────────────────────────────
+
+def test_issues_sample():
+    """サンプルデータで3種類の不整合を1件ずつ検出する"""
+    issues, _, _ = transform(*sample_frames())
+    assert issues.to_dict("records") == [
+        {"issue_type": "invalid_dept", "record_id": "E008", "detail": "id=D005は部門マスタに存在しない"},
+        {"issue_type": "invalid_emp", "record_id": "E099", "detail": "社員マスタに存在しない社員の勤怠レコード"},
+        {"issue_type": "missing_clock_in", "record_id": "E003", "detail": "date=2026-02-04の clock_in が欠損"},
+    ]
+
+
+def test_issues_match_iterrows_with_missing_values():
+    """欠損した dept_id / date を含む合成データでも iterrows 版と一致する"""
+    rng = np.random.default_rng(0)
+    dept_df = pd.DataFrame({"dept_id": ["D001", "D002"], "dept_name": ["営業部", "開発部"]})
+    emp_df = pd.DataFrame({
+        "emp_id": [f"E{i:03d}" for i in range(50)],
+        "dept_id": rng.choice(["D001", "D002", "D009", None], size=50),
+    })
+    att_df = pd.DataFrame({
+        "emp_id": [f"E{i:03d}" for i in rng.integers(0, 60, size=500)],
+        "date": rng.choice(["2026-02-03", "2026-02-04", None], size=500),
+        "clock_in": rng.choice(["09:00", None], size=500, p=[0.8, 0.2]),
+    })
+    pd.testing.assert_frame_equal(
+        find_issues(dept_df, emp_df, att_df),
+        find_issues_iterrows(dept_df, emp_df, att_df),
+    )
+
+
+def test_issues_empty_keeps_columns():
+    """不整合がない場合も列名付きの空の DataFrame を返す"""
+    dept_df, emp_df, att_df = sample_frames()
+    emp_df = emp_df[emp_df["dept_id"].isin(dept_df["dept_id"])]
+    att_df = att_df[att_df["emp_id"].isin(emp_df["emp_id"]) & att_df["clock_in"].notna()]
+    issues = find_issues(dept_df, emp_df, att_df)
+    assert issues.empty
+    assert list(issues.columns) == ["issue_type", "record_id", "detail"]
+
+
+# ── マスタキャッシュ・勤怠のチャンク読み込み ──────────────────────────────────
+
+def test_streaming_matches_transform(tmp_path):
+    """チャンク読み込み版の3つの結果が一括版と一致する（キャッシュ作成時・再利用時とも）"""
+    expected = transform(*sample_frames())
+    for _ in range(2):
+        result = transform_streaming(
+            DATA_PATH / "departments.csv",
+            DATA_PATH / "employees.csv",
+            DATA_PATH / "attendance.csv",
+            chunksize=4,
+            cache_path=tmp_path / "master_cache.pkl",
+        )
+        for actual, exp in zip(result, expected):
+            pd.testing.assert_frame_equal(actual, exp)
+
+
+def test_master_cache_rebuilt_when_source_changes(tmp_path):
+    """マスタCSVが変わるとキャッシュを作り直し、変わらなければ再利用する"""
+    dept_path = tmp_path / "departments.csv"
+    emp_path = tmp_path / "employees.csv"
+    cache_path = tmp_path / "master_cache.pkl"
+    shutil.copy(DATA_PATH / "departments.csv", dept_path)
+    shutil.copy(DATA_PATH / "employees.csv", emp_path)
+
+    _, emp_df = load_masters(dept_path, emp_path, cache_path)
+    assert emp_df.index.name == "emp_id"
+    mtime = cache_path.stat().st_mtime_ns
+    load_masters(dept_path, emp_path, cache_path)
+    assert cache_path.stat().st_mtime_ns == mtime
+
+    with open(emp_path, "a", encoding="utf-8") as f:
+        f.write("\nE011,新人太郎,D001,2026-04-01")
+    _, emp_df = load_masters(dept_path, emp_path, cache_path)
+    assert "E011" in emp_df.index
+
+
+def split_by_date(tmp_path):
+    """勤怠CSVを日付ごとのファイルに分ける（日次ファイルの再現）"""
+    att_df = pd.read_csv(DATA_PATH / "attendance.csv")
+    paths = {}
+    for date, rows in att_df.groupby("date"):
+        paths[date] = tmp_path / f"attendance_{date}.csv"
+        rows.to_csv(paths[date], index=False)
+    return paths
+
+
+def run_incremental(tmp_path, att_path):
+    return apply_attendance(
+        att_path,
+        DATA_PATH / "departments.csv",
+        DATA_PATH / "employees.csv",
+        tmp_path / "state",
+        tmp_path / "master_cache.pkl",
+    )
+
+
+def test_incremental_matches_transform(tmp_path):
+    """日付ごとに増分適用した累計が全件の transform と一致し、同じ日の再投入は二重計上しない"""
+    _, dept_summary, employee_work = transform(*extract(
+        DATA_PATH / "departments.csv", DATA_PATH / "employees.csv", DATA_PATH / "attendance.csv"
+    ))
+    for path in split_by_date(tmp_path).values():
+        assert set(run_incremental(tmp_path, path)[3].values()) == {"added"}
+    _, inc_dept, inc_work, actions = run_incremental(tmp_path, path)
+    assert set(actions.values()) == {"unchanged"}
+    pd.testing.assert_frame_equal(inc_dept, dept_summary)
+    pd.testing.assert_frame_equal(inc_work, employee_work)
+
+
+def test_incremental_late_correction_replaces_date(tmp_path):
+    """適用済みの日付の修正版は、前回の寄与分と置き換わる"""
+    paths = split_by_date(tmp_path)
+    for path in paths.values():
+        run_incremental(tmp_path, path)
+    first_date, first_path = next(iter(paths.items()))
+    corrected = pd.read_csv(first_path)
+    row = corrected.index[corrected["emp_id"] == "E001"][0]
+    corrected.loc[row, ["clock_out", "status"]] = ["21:00", "overtime"]
+    corrected.to_csv(first_path, index=False)
+
+    _, _, before, _ = run_incremental(tmp_path, paths[max(paths)])
+    _, _, after, actions = run_incremental(tmp_path, first_path)
+    assert actions == {first_date: "replaced"}
+    full = pd.concat([pd.read_csv(p) for p in paths.values()], ignore_index=True)
+    _, _, expected = transform(*extract(
+        DATA_PATH / "departments.csv", DATA_PATH / "employees.csv", DATA_PATH / "attendance.csv"
+    )[:2], full)
+    pd.testing.assert_frame_equal(after, expected)
+    assert after.loc["E001", "overtime_count"].item() == before.loc["E001", "overtime_count"].item() + 1
+    assert len(list((tmp_path / "state" / "contrib").glob(f"{first_date}_*.pkl"))) == 1
+
+
+def test_incremental_picks_up_employee_added_to_master(tmp_path):
+    """適用済みの勤怠の社員が後から社員マスタに追加されても、全件の transform と一致する"""
+    for name in ["departments.csv", "employees.csv", "attendance.csv"]:
+        shutil.copy(DATA_PATH / name, tmp_path / name)
+    paths = [tmp_path / name for name in ["attendance.csv", "departments.csv", "employees.csv"]]
+    apply_attendance(*paths, tmp_path / "state", tmp_path / "master_cache.pkl")
+    with open(tmp_path / "employees.csv", "a", encoding="utf-8") as f:
+        f.write("\nE099,新井一郎,D001,2026-02-01\n")
+
+    _, inc_dept, inc_work, actions = apply_attendance(
+        *paths, tmp_path / "state", tmp_path / "master_cache.pkl"
+    )
+    assert set(actions.values()) == {"unchanged"}
+    _, dept_summary, employee_work = transform(*extract(
+        tmp_path / "departments.csv", tmp_path / "employees.csv", tmp_path / "attendance.csv"
+    ))
+    assert employee_work.loc["E099", "total_hours"].item() == 9.0
+    pd.testing.assert_frame_equal(inc_dept, dept_summary)
+    pd.testing.assert_frame_equal(inc_work, employee_work)
+
+
+def synthetic_attendance(n_dates: int, seed: int = 0) -> pd.DataFrame:
+    """社員マスタの全員 + マスタにない E099 の、n_dates 日分の勤怠（分単位の打刻）"""
+    rng = np.random.default_rng(seed)
+    emp_ids = [f"E{i:03d}" for i in range(1, 11)] + ["E099"]
+    rows = []
+    for day in range(n_dates):
+        date = (pd.Timestamp("2026-01-01") + pd.Timedelta(days=day)).strftime("%Y-%m-%d")
+        for emp_id in emp_ids:
+            start = int(rng.integers(7 * 60, 11 * 60))
+            end = start + int(rng.integers(6 * 60, 13 * 60))
+            rows.append({
+                "emp_id": emp_id,
+                "date": date,
+                "clock_in": f"{start // 60:02d}:{start % 60:02d}",
+                "clock_out": f"{end // 60 % 24:02d}:{end % 60:02d}",
+                "status": "overtime" if end - start > 9 * 60 else "normal",
+            })
+    return pd.DataFrame(rows)
+
+
+def test_incremental_csv_matches_transform_over_many_dates(tmp_path):
+    """多くの日付の加算と修正の置き換えを繰り返しても、出力CSVの表記が全件の transform と一致する"""
+    att_df = synthetic_attendance(40)
+    paths = {}
+    for date, rows in att_df.groupby("date"):
+        paths[date] = tmp_path / f"attendance_{date}.csv"
+        rows.to_csv(paths[date], index=False)
+        run_incremental(tmp_path, paths[date])
+    # 遅れて届いた修正: 10日分の打刻を別の値に置き換える
+    corrected = synthetic_attendance(40, seed=1)
+    for date in sorted(paths)[::4]:
+        rows = corrected[corrected["date"] == date]
+        rows.to_csv(paths[date], index=False)
+        att_df = pd.concat([att_df[att_df["date"] != date], rows], ignore_index=True)
+        _, inc_dept, inc_work, actions = run_incremental(tmp_path, paths[date])
+        assert actions == {date: "replaced"}
+
+    dept_df, emp_df = extract(
+        DATA_PATH / "departments.csv", DATA_PATH / "employees.csv", DATA_PATH / "attendance.csv"
+    )[:2]
+    _, dept_summary, employee_work = transform(dept_df, emp_df, att_df)
+    assert inc_dept.to_csv() == dept_summary.to_csv()
+    assert inc_work.to_csv() == employee_work.to_csv()
+
+
+def test_work_hours_overnight_and_missing():
+    """日をまたぐ勤務は24時間を足し、欠損は NaN、固定幅でない "9:30" も変換できる"""
+    hours = work_hours(
+        pd.Series(["09:00", "22:00", "9:30", "08:15", "10:00"]),
+        pd.Series(["18:30", "06:00", "18:00", None, "10:00"]),
+    )
+    np.testing.assert_array_equal(hours, [9.5, 8.0, 8.5, np.nan, 0.0])
+
+
+@pytest.mark.parametrize("value", ["24:00", "09:60", "09-00", "09:000"])
+def test_hhmm_to_minutes_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        hhmm_to_minutes(pd.Series(["09:00", value]))
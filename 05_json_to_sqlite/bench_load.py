@@ -0,0 +1,123 @@
+"""
+bench_load.py - JSON → SQLite（1行ずつ execute / 一括ロード / ストリーミング）の rows/sec とピークメモリの比較
+
+使い方: python bench_load.py [注文数 ...]（省略時は 10^6 件。顧客数は注文数の 1/10、明細は1注文あたり0〜4件）
+時間は extract〜Load 全体。ピークメモリは tracemalloc で別に計測する（計測中は遅くなるため）。
+並列は PARTS 個に分けたファイルを load_parallel で投入する（ピークメモリは書き込み側のプロセスのみ）。
+"""
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from etl_json_to_sqlite import (
+    Load,
+    extract,
+    extract_stream,
+    load_parallel,
+    load_stream,
+    transform,
+    transform_stream,
+)
+
+ORDER_COUNTS = [10**6]
+PARTS = 4
+STATUSES = ["completed", "pending", "cancelled"]
+
+
+def generate(n_orders: int, seed: int = 0) -> dict:
+    """data/orders.json と同じ構造の合成データ"""
+    rng = random.Random(seed)
+    n_customers = max(n_orders // 10, 1)
+    orders = []
+    for i in range(n_orders):
+        customer_id = rng.randrange(n_customers)
+        orders.append(
+            {
+                "order_id": f"ORD{i:08d}",
+                "customer": {
+                    "id": f"C{customer_id:07d}",
+                    "name": f"顧客{customer_id}",
+                    "email": f"c{customer_id}@example.com",
+                },
+                "items": [
+                    {
+                        "product_id": f"P{p:04d}",
+                        "name": f"商品{p}",
+                        "quantity": rng.randint(1, 5),
+                        "price": rng.randrange(100, 100_000, 100),
+                    }
+                    for p in rng.sample(range(1000), rng.randint(0, 4))
+                ],
+                "order_date": f"2026-02-{rng.randint(1, 28):02d}",
+                "status": rng.choice(STATUSES),
+            }
+        )
+    return {"orders": orders}
+
+
+def run_row_by_row(json_path: Path, part_paths: list, db_path: Path) -> int:
+    return Load(*transform(extract(json_path)), db_path=db_path)
+
+
+def run_bulk(json_path: Path, part_paths: list, db_path: Path) -> int:
+    return Load(*transform(extract(json_path)), db_path=db_path, bulk=True)
+
+
+def run_stream(json_path: Path, part_paths: list, db_path: Path) -> int:
+    return load_stream(transform_stream(extract_stream(json_path)), db_path=db_path)
+
+
+def run_parallel(json_path: Path, part_paths: list, db_path: Path) -> int:
+    return load_parallel(part_paths, db_path=db_path)
+
+
+MODES = [
+    ("1行ずつ", run_row_by_row),
+    ("一括ロード", run_bulk),
+    ("ストリーミング", run_stream),
+    ("並列", run_parallel),
+]
+
+
+def write_json(path: Path, orders: list) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"orders": orders}, file, ensure_ascii=False)
+
+
+def main():
+    order_counts = [int(arg) for arg in sys.argv[1:]] or ORDER_COUNTS
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench.db"
+        for n_orders in order_counts:
+            orders = generate(n_orders)["orders"]
+            json_path = Path(tmp_dir) / f"orders_{n_orders}.json"
+            write_json(json_path, orders)
+            # 並列ロード用に、同じ注文を PARTS 個のファイルに分けたもの
+            part_paths = [Path(tmp_dir) / f"orders_{n_orders}_{i}.json" for i in range(PARTS)]
+            for i, path in enumerate(part_paths):
+                write_json(path, orders[i::PARTS])
+            del orders
+            size_mb = json_path.stat().st_size / 1e6
+            for name, run in MODES:
+                start = time.perf_counter()
+                n_rows = run(json_path, part_paths, db_path)
+                elapsed = time.perf_counter() - start
+
+                tracemalloc.start()
+                run(json_path, part_paths, db_path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(
+                    f"{n_orders:>10,}注文 ({size_mb:,.0f}MB) {name:<8} | {n_rows:>10,}行 {elapsed:7.2f}s"
+                    f" | {n_rows / elapsed:>10,.0f} rows/sec | ピーク {peak / 1e6:8,.1f}MB"
+                )
+            for path in [json_path, *part_paths]:
+                path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+bench_verify.py - Verify のクエリ時間の比較（変更前の JOIN 集計 / INDEXES ありの JOIN 集計 / 集計テーブル）
+
+使い方: python bench_verify.py [注文数 ...]（省略時は 10^6 件。データは bench_load.py と同じ合成データ）
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_load import generate
+from etl_json_to_sqlite import INDEXES, load_stream, transform_stream
+
+ORDER_COUNTS = [10**6]
+REPEAT = 3
+
+# 変更前の Verify のクエリ（比較用。並び順を揃えるため ORDER BY だけ追加）
+CUSTOMER_REVENUE_JOIN = """
+    SELECT c.customer_id, c.name, SUM(oi.quantity * oi.price) AS total_amount
+    FROM order_items oi
+    LEFT JOIN orders o ON oi.order_id = o.order_id
+    LEFT JOIN customers c ON o.customer_id = c.customer_id
+    WHERE o.status = 'completed'
+    GROUP BY c.customer_id, c.name
+    ORDER BY c.customer_id
+"""
+PRODUCT_QUANTITY_JOIN = """
+    SELECT oi.product_id, oi.product_name, SUM(oi.quantity) AS total_quantity
+    FROM order_items oi
+    LEFT JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status = 'completed'
+    GROUP BY oi.product_id, oi.product_name
+    ORDER BY total_quantity DESC, oi.product_id, oi.product_name
+"""
+CUSTOMER_REVENUE_SUMMARY = """
+    SELECT r.customer_id, c.name, r.total_amount
+    FROM customer_revenue r
+    LEFT JOIN customers c ON r.customer_id = c.customer_id
+    ORDER BY r.customer_id
+"""
+PRODUCT_QUANTITY_SUMMARY = """
+    SELECT product_id, product_name, total_quantity
+    FROM product_quantity
+    ORDER BY total_quantity DESC, product_id, product_name
+"""
+
+
+def verify_by_join(conn: sqlite3.Connection) -> tuple[list, list]:
+    """order_items / orders / customers から集計し直す（変更前の Verify と同じ結果）"""
+    return (
+        conn.execute(CUSTOMER_REVENUE_JOIN).fetchall(),
+        conn.execute(PRODUCT_QUANTITY_JOIN).fetchall(),
+    )
+
+
+def verify_by_summary(conn: sqlite3.Connection) -> tuple[list, list]:
+    return (
+        conn.execute(CUSTOMER_REVENUE_SUMMARY).fetchall(),
+        conn.execute(PRODUCT_QUANTITY_SUMMARY).fetchall(),
+    )
+
+
+def timed(func, conn: sqlite3.Connection) -> tuple[tuple, float]:
+    """REPEAT 回実行して最短時間を返す"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(conn)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    order_counts = [int(arg) for arg in sys.argv[1:]] or ORDER_COUNTS
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_orders in order_counts:
+            db_path = Path(tmp_dir) / f"bench_{n_orders}.db"
+            load_stream(transform_stream(generate(n_orders)["orders"]), db_path=db_path)
+            conn = sqlite3.connect(db_path)
+
+            summary, time_summary = timed(verify_by_summary, conn)
+            joined, time_indexed = timed(verify_by_join, conn)
+            assert joined == summary
+            # 変更前の状態（セカンダリインデックスなし）
+            for sql in INDEXES:
+                conn.execute("DROP INDEX " + sql.split()[5])
+            joined, time_no_index = timed(verify_by_join, conn)
+            assert joined == summary
+            conn.close()
+
+            print(
+                f"{n_orders:>10,}注文 | JOIN 集計（インデックスなし）: {time_no_index:7.3f}s"
+                f" | JOIN 集計（インデックスあり）: {time_indexed:7.3f}s"
+                f" | 集計テーブル: {time_summary:7.4f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
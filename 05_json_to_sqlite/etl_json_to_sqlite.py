@@ -1,8 +1,19 @@
+import hashlib
+import multiprocessing
+import os
 import sqlite3
 import json
+import time
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
+from queue import Empty
 
 BASE_PATH = Path(__file__).parent
+# ストリーミング読み込みで1回に読む文字数
+READ_CHUNK_SIZE = 1 << 16
+# デコードエラーをバッファの末尾で値が切れたせいとみなす範囲（途中で切れた "-Infinity" や \uXXXX が収まる文字数）
+TRUNCATED_TAIL = 16
 
 
 def extract(file_path: str) -> list:
@@ -10,6 +21,102 @@ def extract(file_path: str) -> list:
         return json.load(file)
 
 
+class _JsonStream:
+    """ファイルを READ_CHUNK_SIZE ずつ読みながら、JSON の値を1つずつ取り出すためのバッファ"""
+
+    def __init__(self, file, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 読み終えた部分を捨ててから追記する（バッファは「値1つ + チャンク」程度に収まる）
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """空白を飛ばして次の1文字を返す（ファイル末尾なら空文字）"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._read_more():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"'{char}' が必要です", self.buf, self.pos)
+        self.pos += 1
+
+    def _truncated(self, error: json.JSONDecodeError) -> bool:
+        """
+        デコードエラーが、値がバッファの末尾で切れているせいで起きたものか
+
+        閉じていない文字列はバッファの末尾まで読んで初めてエラーになり、位置は文字列の先頭を指す。
+        それ以外（途中で切れたリテラル・数値・区切り）はエラーの位置が末尾の近くになる。
+        末尾から離れた位置のエラーは続きを読んでも直らないので、バッファを伸ばさずにすぐ送出する。
+        """
+        return error.msg.startswith("Unterminated string") or len(self.buf) - error.pos <= TRUNCATED_TAIL
+
+    def value(self, decoder: json.JSONDecoder):
+        """次の JSON の値を1つデコードする。途中で切れていれば続きを読んで再試行する"""
+        self.peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as error:
+                if not self._truncated(error) or not self._read_more():
+                    raise
+                continue
+            # 数値はバッファの末尾で切れていてもデコードできてしまうので、続きがあるか確かめる
+            if end == len(self.buf) and self._read_more():
+                continue
+            self.pos = end
+            return obj
+
+
+def extract_stream(file_path: str, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    orders 配列の注文を1件ずつ返すジェネレータ（json.load でファイル全体を読まない）
+
+    トップレベルのオブジェクトのキーを順に読み、"orders" の配列だけを要素ごとにデコードする。
+    ほかのキーの値は1つずつデコードして捨てる。メモリに持つのは注文1件とバッファ分だけ。
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as file:
+        stream = _JsonStream(file, chunk_size)
+        stream.expect("{")
+        while stream.peek() != "}":
+            key = stream.value(decoder)
+            stream.expect(":")
+            if key != "orders":
+                stream.value(decoder)
+            else:
+                stream.expect("[")
+                while stream.peek() != "]":
+                    yield stream.value(decoder)
+                    if stream.peek() == ",":
+                        stream.expect(",")
+                stream.expect("]")
+            if stream.peek() == ",":
+                stream.expect(",")
+        stream.expect("}")
+
+
+def order_hash(order: dict) -> str:
+    """注文1件（顧客・明細を含む）の内容ハッシュ。キーの順序や空白には依存しない"""
+    content = json.dumps(order, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
 def transform(data: list) -> list:
     customers = {}
     orders = []
@@ -29,6 +136,7 @@ def transform(data: list) -> list:
                 "customer_id": order["customer"]["id"],
                 "order_date": order["order_date"],
                 "status": order["status"],
+                "content_hash": order_hash(order),
             }
         )
         # Transform order items data
@@ -45,14 +153,110 @@ def transform(data: list) -> list:
     return customers, orders, order_items
 
 
-def Load(customers: dict, orders: list, order_items: list) -> None:
-    conn = sqlite3.connect(BASE_PATH / "ecommerce.db")
-    cursor = conn.cursor()
+def transform_stream(orders):
+    """
+    注文を1件ずつ受け取り、(テーブル名, 行のタプル) を返すジェネレータ
+
+    顧客は注文ごとに出力する（重複は INSERT OR REPLACE で後勝ちになり、transform の dict と同じ結果）。
+    """
+    for order in orders:
+        customer = order["customer"]
+        yield "customers", (customer["id"], customer["name"], customer["email"])
+        yield "orders", (
+            order["order_id"],
+            customer["id"],
+            order["order_date"],
+            order["status"],
+            order_hash(order),
+        )
+        for item in order["items"]:
+            yield "order_items", (
+                order["order_id"],
+                item["product_id"],
+                item["name"],
+                item["quantity"],
+                item["price"],
+            )
+
+
+# 一括ロードで executemany に渡す1回あたりの行数
+BATCH_SIZE = 10_000
+# 一括ロード中だけ使う設定（接続ごとの設定なので close で元に戻る）
+# ロードは DROP からの作り直しなので、途中で失敗したら最初からやり直す前提でジャーナルをメモリに置く
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",  # 256MB（負の値は KiB 単位）
+    "PRAGMA temp_store = MEMORY",
+]
+# データ投入後に作るインデックス（投入中にインデックスを更新しない）
+# order_items(order_id) は増分ロードの明細の入れ替えと集計テーブルの更新で注文ごとに明細を引くのに使う
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)",
+]
+# 以前作っていたが使うクエリがないインデックス（Verify は集計テーブルを読む）。増分ロードで既存のDBから削除する
+OBSOLETE_INDEXES = ["idx_orders_customer_id", "idx_orders_status_customer_id"]
+SUMMARY_TABLES = ["customer_revenue", "product_quantity"]
+# 完了済み注文の明細を集計して集計テーブルに足し込む（sign = -1 で差し引く）
+# n_items は寄与している明細の件数で、0 になった行は削除する
+ADD_CUSTOMER_REVENUE = """
+    INSERT INTO customer_revenue (customer_id, total_amount, n_items)
+    SELECT o.customer_id, :sign * SUM(oi.quantity * oi.price), :sign * COUNT(*)
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status = 'completed' AND {condition}
+    GROUP BY o.customer_id
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        n_items = n_items + excluded.n_items
+"""
+ADD_PRODUCT_QUANTITY = """
+    INSERT INTO product_quantity (product_id, product_name, total_quantity, n_items)
+    SELECT oi.product_id, oi.product_name, :sign * SUM(oi.quantity), :sign * COUNT(*)
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.order_id
+    WHERE o.status = 'completed' AND {condition}
+    GROUP BY oi.product_id, oi.product_name
+    ON CONFLICT (product_id, product_name) DO UPDATE SET
+        total_quantity = total_quantity + excluded.total_quantity,
+        n_items = n_items + excluded.n_items
+"""
 
+INSERT_CUSTOMER = "INSERT OR REPLACE INTO customers (customer_id, name, email) VALUES (?, ?, ?)"
+INSERT_ORDER = "INSERT OR REPLACE INTO orders (order_id, customer_id, order_date, status, content_hash) VALUES (?, ?, ?, ?, ?)"
+INSERT_ORDER_ITEM = "INSERT OR REPLACE INTO order_items (order_id, product_id, product_name, quantity, price) VALUES (?, ?, ?, ?, ?)"
+# 増分ロード用: 主キーが既にあれば更新する
+UPSERT_CUSTOMER = (
+    "INSERT INTO customers (customer_id, name, email) VALUES (?, ?, ?)"
+    " ON CONFLICT (customer_id) DO UPDATE SET name = excluded.name, email = excluded.email"
+)
+UPSERT_ORDER = (
+    "INSERT INTO orders (order_id, customer_id, order_date, status, content_hash) VALUES (?, ?, ?, ?, ?)"
+    " ON CONFLICT (order_id) DO UPDATE SET customer_id = excluded.customer_id,"
+    " order_date = excluded.order_date, status = excluded.status, content_hash = excluded.content_hash"
+)
+# 並列ロードでパース側から書き込み側へ渡すキューの長さ（バッチ数）。パースが速すぎてもメモリはここで頭打ちになる
+QUEUE_SIZE = 8
+# 並列ロードの書き込み側がキューを待つ間隔（秒）。この間隔でパース側のプロセスが異常終了していないか確かめる
+WORKER_POLL_SECONDS = 1.0
+# 増分ロードで既存のハッシュを1回の SELECT で引く注文数（SQL の変数の上限より小さくする）
+INCREMENTAL_BATCH_SIZE = 500
+INSERTS = {
+    "customers": INSERT_CUSTOMER,
+    "orders": INSERT_ORDER,
+    "order_items": INSERT_ORDER_ITEM,
+}
+
+
+def drop_tables(cursor: sqlite3.Cursor) -> None:
+    for table in SUMMARY_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
     cursor.execute("DROP TABLE IF EXISTS order_items")
     cursor.execute("DROP TABLE IF EXISTS orders")
     cursor.execute("DROP TABLE IF EXISTS customers")
 
+
+def create_tables(cursor: sqlite3.Cursor) -> None:
     # Create tables if they don't exist
     cursor.execute(
         """
@@ -69,7 +273,8 @@ def Load(customers: dict, orders: list, order_items: list) -> None:
             order_id TEXT PRIMARY KEY,
             customer_id TEXT,
             order_date TEXT,
-            status TEXT
+            status TEXT,
+            content_hash TEXT
         )
     """
     )
@@ -85,60 +290,393 @@ def Load(customers: dict, orders: list, order_items: list) -> None:
         )
     """
     )
-
-    # Insert customers data
-    for customer_id, customer in customers.items():
-        cursor.execute(
-            "INSERT OR REPLACE INTO customers (customer_id, name, email) VALUES (?, ?, ?)",
-            (customer["customer_id"], customer["name"], customer["email"]),
+    # Verify 用の集計テーブル（完了済み注文の顧客別売上・商品別数量）
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS customer_revenue (
+            customer_id TEXT PRIMARY KEY,
+            total_amount INTEGER,
+            n_items INTEGER
         )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_quantity (
+            product_id TEXT,
+            product_name TEXT,
+            total_quantity INTEGER,
+            n_items INTEGER,
+            PRIMARY KEY (product_id, product_name)
+        )
+    """
+    )
+
+
+def add_to_summaries(cursor: sqlite3.Cursor, order_ids: list | None = None, sign: int = 1) -> None:
+    """
+    注文の明細を集計テーブルに足し込む（sign=-1 で差し引く）
+
+    order_ids を省略すると全注文を対象にする（全件ロード後の作り直し用）。
+    """
+    if order_ids is None:
+        condition, params = "1 = 1", {}
+    else:
+        condition = f"o.order_id IN ({', '.join(f':id{i}' for i in range(len(order_ids)))})"
+        params = {f"id{i}": order_id for i, order_id in enumerate(order_ids)}
+    for sql in [ADD_CUSTOMER_REVENUE, ADD_PRODUCT_QUANTITY]:
+        cursor.execute(sql.format(condition=condition), {"sign": sign, **params})
+    for table in SUMMARY_TABLES:
+        cursor.execute(f"DELETE FROM {table} WHERE n_items = 0")
+
 
-    # Insert orders data
+def customer_rows(customers: dict):
+    for customer in customers.values():
+        yield (customer["customer_id"], customer["name"], customer["email"])
+
+
+def order_rows(orders: list):
     for order in orders:
-        cursor.execute(
-            "INSERT OR REPLACE INTO orders (order_id, customer_id, order_date, status) VALUES (?, ?, ?, ?)",
-            (
-                order["order_id"],
-                order["customer_id"],
-                order["order_date"],
-                order["status"],
-            ),
+        yield (
+            order["order_id"],
+            order["customer_id"],
+            order["order_date"],
+            order["status"],
+            order["content_hash"],
         )
 
-    # Insert order items data
+
+def order_item_rows(order_items: list):
     for item in order_items:
-        cursor.execute(
-            "INSERT OR REPLACE INTO order_items (order_id, product_id, product_name, quantity, price) VALUES (?, ?, ?, ?, ?)",
-            (
-                item["order_id"],
-                item["product_id"],
-                item["product_name"],
-                item["quantity"],
-                item["price"],
-            ),
+        yield (
+            item["order_id"],
+            item["product_id"],
+            item["product_name"],
+            item["quantity"],
+            item["price"],
         )
 
+
+def _batches(rows, size: int):
+    """行のイテレータを size 行ずつのリストに分ける"""
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def count_rows(cursor: sqlite3.Cursor) -> int:
+    """
+    3テーブルに入っている行数の合計
+
+    ストリーミング・並列では同じ顧客を注文ごとに INSERT OR REPLACE するため、投入した文の数ではなく
+    テーブルの行数を返す（どのロード方法でも同じ入力なら同じ値になり、rows/sec を比べられる）。
+    """
+    return sum(cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in INSERTS)
+
+
+@contextmanager
+def bulk_transaction(db_path: Path):
+    """
+    一括ロード用の接続。BULK_PRAGMAS を設定し、DROP・テーブル作成〜投入〜インデックス作成を
+    1つのトランザクションで行う（with ブロックで例外が出たら ROLLBACK して前回の内容が残る）
+    """
+    conn = sqlite3.connect(db_path)
+    # 暗黙のトランザクションを使わず、BEGIN / COMMIT を明示する
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    for pragma in BULK_PRAGMAS:
+        cursor.execute(pragma)
+    try:
+        cursor.execute("BEGIN")
+        drop_tables(cursor)
+        create_tables(cursor)
+        yield cursor
+        for sql in INDEXES:
+            cursor.execute(sql)
+        add_to_summaries(cursor)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def Load(
+    customers: dict,
+    orders: list,
+    order_items: list,
+    db_path: Path = BASE_PATH / "ecommerce.db",
+    bulk: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """
+    3テーブルを作り直してデータを投入し、投入した行数（count_rows）を返す
+
+    bulk=True のときは一括ロード:
+    - BULK_PRAGMAS を設定し、DROP〜投入〜インデックス作成を1つのトランザクションで行う
+    - 1行ずつの execute ではなく batch_size 行ずつ executemany で投入する
+    """
+    inserts = [
+        (INSERT_CUSTOMER, customer_rows(customers)),
+        (INSERT_ORDER, order_rows(orders)),
+        (INSERT_ORDER_ITEM, order_item_rows(order_items)),
+    ]
+    if bulk:
+        with bulk_transaction(db_path) as cursor:
+            for sql, rows in inserts:
+                for batch in _batches(rows, batch_size):
+                    cursor.executemany(sql, batch)
+            n_rows = count_rows(cursor)
+        return n_rows
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    drop_tables(cursor)
+    create_tables(cursor)
+    for sql, rows in inserts:
+        for row in rows:
+            cursor.execute(sql, row)
+    n_rows = count_rows(cursor)
+    for sql in INDEXES:
+        cursor.execute(sql)
+    add_to_summaries(cursor)
     conn.commit()
     conn.close()
+    return n_rows
+
+
+def load_stream(rows, db_path: Path = BASE_PATH / "ecommerce.db", batch_size: int = BATCH_SIZE) -> int:
+    """
+    transform_stream の (テーブル名, 行) を一括ロードの設定で投入し、投入した行数（count_rows）を返す
+
+    テーブルごとのバッファの合計が batch_size 行になるたびに executemany で書き出すので、
+    メモリに持つ行数は入力の大きさによらず batch_size 行まで。
+    """
+    buffers = {table: [] for table in INSERTS}
+    with bulk_transaction(db_path) as cursor:
+        n_buffered = 0
+        for table, row in rows:
+            buffers[table].append(row)
+            n_buffered += 1
+            if n_buffered < batch_size:
+                continue
+            for table, buffer in buffers.items():
+                cursor.executemany(INSERTS[table], buffer)
+                buffer.clear()
+            n_buffered = 0
+        for table, buffer in buffers.items():
+            cursor.executemany(INSERTS[table], buffer)
+        n_rows = count_rows(cursor)
+    return n_rows
+
+
+def _parse_worker(tasks, queue, batch_size: int) -> None:
+    """
+    並列ロードのパース側のプロセス: tasks から受け取ったファイルを1つずつストリーミングで読み、
+    テーブルごとの行のリスト {テーブル名: [行, ...]} を batch_size 行ずつキューに入れる
+
+    tasks から None を受け取ったら終了の印 None を入れて終わる。
+    失敗したら例外をキューに入れ（終了の印は入れない）、例外で終了する（終了コード1）
+    """
+    try:
+        for file_path in iter(tasks.get, None):
+            for batch in _batches(transform_stream(extract_stream(file_path)), batch_size):
+                rows = {table: [] for table in INSERTS}
+                for table, row in batch:
+                    rows[table].append(row)
+                queue.put(rows)
+    except Exception as error:
+        queue.put(error)
+        raise
+    queue.put(None)
+
+
+def _check_workers(processes: list) -> None:
+    """終了の印を入れずに異常終了したパース側のプロセス（OOM killer・セグフォルトなど）があれば例外を送出する"""
+    lost = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+    if lost:
+        raise RuntimeError(f"パース側のプロセスが異常終了しました（終了コード {lost}）")
+
+
+def load_parallel(
+    file_paths: list,
+    db_path: Path = BASE_PATH / "ecommerce.db",
+    workers: int | None = None,
+    batch_size: int = BATCH_SIZE,
+    queue_size: int = QUEUE_SIZE,
+    poll_seconds: float = WORKER_POLL_SECONDS,
+) -> int:
+    """
+    分割された注文ファイルを workers 個のプロセスでパースし、このプロセスだけが SQLite に書き込む
+
+    - パース・変換（JSON のデコード、customer / items の平坦化）はパース側のプロセスで並列に行う
+    - 書き込みは1つの接続・1トランザクション（一括ロードと同じ設定）で、長さ queue_size のキューから受け取って executemany する
+    - パースと書き込みが同時に進むので、ファイルが1つでもパースの時間は書き込みと重なる
+    - キューが poll_seconds 秒空いたら、パース側のプロセスが異常終了していないか確かめる。
+      終了の印を入れないまま落ちたプロセスがあれば、待ち続けずに RuntimeError で ROLLBACK する
+
+    ファイルをまたいで同じ注文が出てくる場合、どちらが残るかは処理の順序による（ファイル内では後勝ち）。
+    :return: 投入した行数（count_rows）
+    """
+    ctx = multiprocessing.get_context()
+    queue = ctx.Queue(maxsize=queue_size)
+    tasks = ctx.Queue()
+    n_workers = min(workers or os.cpu_count(), len(file_paths))
+    for path in file_paths:
+        tasks.put(str(path))
+    for _ in range(n_workers):
+        tasks.put(None)
+    processes = [
+        ctx.Process(target=_parse_worker, args=(tasks, queue, batch_size), daemon=True)
+        for _ in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        with bulk_transaction(db_path) as cursor:
+            remaining = n_workers
+            while remaining:
+                try:
+                    rows = queue.get(timeout=poll_seconds)
+                except Empty:
+                    _check_workers(processes)
+                    continue
+                if rows is None:
+                    remaining -= 1
+                    continue
+                # パースで例外が出ていればここで送出し、トランザクションは ROLLBACK される
+                if isinstance(rows, Exception):
+                    raise rows
+                for table, table_rows in rows.items():
+                    cursor.executemany(INSERTS[table], table_rows)
+            n_rows = count_rows(cursor)
+    except BaseException:
+        # 失敗したら、キューが空かないまま待っているパース側のプロセスを止める
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+    return n_rows
+
+
+def _ensure_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    テーブル・インデックスがなければ作り、OBSOLETE_INDEXES は削除する。content_hash 列のない既存の orders には列を追加し、
+    集計テーブルのない既存のDBでは集計テーブルを既存のデータから作る
+    """
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    create_tables(cursor)
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(orders)")}
+    if "content_hash" not in columns:
+        cursor.execute("ALTER TABLE orders ADD COLUMN content_hash TEXT")
+    for sql in INDEXES:
+        cursor.execute(sql)
+    for name in OBSOLETE_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    if not set(SUMMARY_TABLES) <= existing:
+        for table in SUMMARY_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        add_to_summaries(cursor)
+
+
+def load_incremental(
+    orders,
+    db_path: Path = BASE_PATH / "ecommerce.db",
+    batch_size: int = INCREMENTAL_BATCH_SIZE,
+) -> dict:
+    """
+    テーブルを作り直さずに注文を反映する（日次の差分エクスポート向け）
+
+    - 注文ごとに内容ハッシュを計算し、DBの content_hash と同じなら何もしない
+    - 新規・変更された注文だけ、顧客と注文を主キーで UPSERT し、その注文の order_items を入れ替える
+    - 集計テーブルは変更前の注文の寄与分を差し引き、入れ替えた後の寄与分を足す
+    - 全体を1つのトランザクションで行い、途中で失敗したら ROLLBACK する
+    - content_hash が NULL の既存の注文（列の追加前にロードしたもの）は変更ありとして扱う
+
+    :param orders: 注文（dict）のイテレータ。extract_stream の結果をそのまま渡せる
+    :return: {"inserted": 新規, "updated": 変更, "unchanged": 変更なし} の注文数
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    conn = sqlite3.connect(db_path)
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN")
+        _ensure_schema(cursor)
+        for batch in _batches(orders, batch_size):
+            # 同じ注文がバッチ内に複数あれば後勝ち
+            latest = {order["order_id"]: order for order in batch}
+            placeholders = ", ".join("?" * len(latest))
+            existing = dict(
+                cursor.execute(
+                    f"SELECT order_id, content_hash FROM orders WHERE order_id IN ({placeholders})",
+                    list(latest),
+                )
+            )
+            changed = []
+            for order_id, order in latest.items():
+                content_hash = order_hash(order)
+                if order_id not in existing:
+                    counts["inserted"] += 1
+                elif existing[order_id] == content_hash:
+                    counts["unchanged"] += 1
+                    continue
+                else:
+                    counts["updated"] += 1
+                changed.append((order, content_hash))
+            if not changed:
+                continue
+
+            # 変更前の注文の寄与分を集計テーブルから差し引き、入れ替えた後に足し直す
+            changed_ids = [o["order_id"] for o, _ in changed]
+            add_to_summaries(cursor, [i for i in changed_ids if i in existing], sign=-1)
+            cursor.executemany(
+                UPSERT_CUSTOMER,
+                [(o["customer"]["id"], o["customer"]["name"], o["customer"]["email"]) for o, _ in changed],
+            )
+            cursor.executemany(
+                UPSERT_ORDER,
+                [
+                    (o["order_id"], o["customer"]["id"], o["order_date"], o["status"], h)
+                    for o, h in changed
+                ],
+            )
+            cursor.executemany(
+                "DELETE FROM order_items WHERE order_id = ?",
+                [(o["order_id"],) for o, _ in changed if o["order_id"] in existing],
+            )
+            cursor.executemany(
+                INSERT_ORDER_ITEM,
+                [
+                    (o["order_id"], item["product_id"], item["name"], item["quantity"], item["price"])
+                    for o, _ in changed
+                    for item in o["items"]
+                ],
+            )
+            add_to_summaries(cursor, changed_ids)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return counts
 
 
-def Verify():
-    conn = sqlite3.connect(BASE_PATH / "ecommerce.db")
+def Verify(db_path: Path = BASE_PATH / "ecommerce.db") -> tuple[list, list]:
+    """ロード時に更新している集計テーブルを読む（order_items を集計し直さない）"""
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     cursor.execute(
         """
-        SELECT 
-            c.customer_id,
-            c.name,
-            -- oi.quantity,
-            -- oi.price,
-            SUM(oi.quantity * oi.price) AS total_amount
-        FROM order_items oi
-        LEFT JOIN orders o ON oi.order_id = o.order_id
-        LEFT JOIN customers c ON o.customer_id = c.customer_id
-        WHERE o.status = 'completed'
-        GROUP BY c.customer_id, c.name
+        SELECT r.customer_id, c.name, r.total_amount
+        FROM customer_revenue r
+        LEFT JOIN customers c ON r.customer_id = c.customer_id
+        ORDER BY r.customer_id
     """
     )
     verify1 = cursor.fetchall()
@@ -146,27 +684,24 @@ def Verify():
 
     cursor.execute(
         """
-        SELECT 
-            oi.product_id,
-            oi.product_name,
-            SUM(oi.quantity) AS total_quantity
-        FROM order_items oi
-        LEFT JOIN orders o ON oi.order_id = o.order_id
-        WHERE o.status = 'completed'
-        GROUP BY oi.product_id, oi.product_name
-        ORDER BY total_quantity DESC
+        SELECT product_id, product_name, total_quantity
+        FROM product_quantity
+        ORDER BY total_quantity DESC, product_id, product_name
     """
     )
     verify2 = cursor.fetchall()
     print(verify2)
 
     conn.close()
+    return verify1, verify2
 
 
 def main():
-    data = extract(BASE_PATH / "data" / "orders.json")
-    customers, orders, order_items = transform(data)
-    Load(customers, orders, order_items)
+    # 注文を1件ずつ読み、タプルにしてバッチ単位で投入する（ファイル全体をメモリに載せない）
+    start = time.perf_counter()
+    n_rows = load_stream(transform_stream(extract_stream(BASE_PATH / "data" / "orders.json")))
+    elapsed = time.perf_counter() - start
+    print(f"Load: {n_rows:,} rows, {n_rows / elapsed:,.0f} rows/sec")
     Verify()
 
 
@@ -0,0 +1,264 @@
+"""
+test_etl_json_to_sqlite.py - etl_json_to_sqlite.py のユニットテスト
+"""
+import json
+import os
+import signal
+import sqlite3
+import time
+
+import pytest
+
+from bench_verify import verify_by_join
+import etl_json_to_sqlite as etl
+from etl_json_to_sqlite import (
+    BASE_PATH,
+    Load,
+    Verify,
+    extract,
+    extract_stream,
+    load_incremental,
+    load_parallel,
+    load_stream,
+    transform,
+    transform_stream,
+)
+
+ORDERS_PATH = BASE_PATH / "data" / "orders.json"
+
+TABLES = ["customers", "orders", "order_items"]
+
+
+def dump(db_path) -> dict:
+    conn = sqlite3.connect(db_path)
+    tables = {
+        table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+        for table in TABLES
+    }
+    indexes = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    }
+    conn.close()
+    return tables, indexes
+
+
+def contents(db_path) -> dict:
+    """order_items の id（投入順の連番）を除いたテーブルの内容"""
+    tables, _ = dump(db_path)
+    tables["order_items"] = sorted(row[1:] for row in tables["order_items"])
+    return tables
+
+
+def test_bulk_load_matches_row_by_row(tmp_path):
+    """一括ロード（小さいバッチで複数回 executemany）と1行ずつのロードで同じ内容・インデックスになる"""
+    customers, orders, order_items = transform(extract(ORDERS_PATH))
+    n_rows = Load(customers, orders, order_items, db_path=tmp_path / "row.db")
+    n_bulk = Load(customers, orders, order_items, db_path=tmp_path / "bulk.db", bulk=True, batch_size=2)
+    assert n_rows == n_bulk == len(customers) + len(orders) + len(order_items)
+    assert dump(tmp_path / "row.db") == dump(tmp_path / "bulk.db")
+
+
+def test_bulk_load_rolls_back_on_error(tmp_path):
+    """一括ロードの途中で失敗したら、前回ロードした内容が残る"""
+    customers, orders, order_items = transform(extract(ORDERS_PATH))
+    db_path = tmp_path / "bulk.db"
+    Load(customers, orders, order_items, db_path=db_path, bulk=True)
+    before = dump(db_path)
+    broken = order_items + [{"order_id": "ORD999"}]
+    with pytest.raises(KeyError):
+        Load(customers, orders, broken, db_path=db_path, bulk=True)
+    assert dump(db_path) == before
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_extract_stream_matches_json_load(tmp_path, chunk_size):
+    """チャンクの境界がどこにあっても json.load と同じ注文が順に返り、orders 以外のキーは読み飛ばす"""
+    data = {
+        "exported_at": 1234567,
+        "meta": {"orders": [1, 2], "flags": [True, False, None, -1.5e-3], "note": "a\\b\u00e9\u2603\\"},
+        **extract(ORDERS_PATH),
+        "count": 10,
+    }
+    path = tmp_path / "orders.json"
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    assert list(extract_stream(path, chunk_size=chunk_size)) == data["orders"]
+
+
+def test_extract_stream_rejects_truncated_file(tmp_path):
+    path = tmp_path / "orders.json"
+    path.write_text(ORDERS_PATH.read_text(encoding="utf-8")[:-50], encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        list(extract_stream(path))
+
+
+def test_extract_stream_malformed_order_fails_without_buffering_rest(tmp_path, monkeypatch):
+    """先頭近くの壊れた注文は、後続のデータをバッファに読み込まずにすぐエラーにする"""
+    order = extract(ORDERS_PATH)["orders"][0]
+    body = ",".join(json.dumps(order, ensure_ascii=False) for _ in range(20_000))
+    path = tmp_path / "orders.json"
+    path.write_text('{"orders": [{"order_id": tru, "x": 1},' + body + "]}", encoding="utf-8")
+    largest = 0
+    read_more = etl._JsonStream._read_more
+
+    def tracked(self):
+        nonlocal largest
+        more = read_more(self)
+        largest = max(largest, len(self.buf))
+        return more
+
+    monkeypatch.setattr(etl._JsonStream, "_read_more", tracked)
+    with pytest.raises(json.JSONDecodeError):
+        list(extract_stream(path, chunk_size=1024))
+    assert largest <= 2 * 1024
+
+
+def test_load_stream_matches_load(tmp_path):
+    """ストリーミング版（注文1件ずつ → タプル → バッチ投入）と dict 版で同じ内容になる"""
+    Load(*transform(extract(ORDERS_PATH)), db_path=tmp_path / "batch.db")
+    load_stream(transform_stream(extract_stream(ORDERS_PATH)), db_path=tmp_path / "stream.db", batch_size=3)
+    assert dump(tmp_path / "batch.db") == dump(tmp_path / "stream.db")
+
+
+def item_ids(db_path) -> dict:
+    conn = sqlite3.connect(db_path)
+    ids = {}
+    for order_id, item_id in conn.execute("SELECT order_id, id FROM order_items ORDER BY id"):
+        ids.setdefault(order_id, []).append(item_id)
+    conn.close()
+    return ids
+
+
+def test_incremental_into_empty_db_matches_load(tmp_path):
+    Load(*transform(extract(ORDERS_PATH)), db_path=tmp_path / "full.db")
+    counts = load_incremental(extract_stream(ORDERS_PATH), db_path=tmp_path / "inc.db", batch_size=2)
+    assert counts == {"inserted": 5, "updated": 0, "unchanged": 0}
+    assert dump(tmp_path / "full.db") == dump(tmp_path / "inc.db")
+
+
+def test_incremental_touches_only_changed_orders(tmp_path):
+    """変更された注文の明細だけを入れ替え、変更のない注文の明細はそのまま残す"""
+    db_path = tmp_path / "ecommerce.db"
+    Load(*transform(extract(ORDERS_PATH)), db_path=db_path)
+    before = item_ids(db_path)
+
+    data = extract(ORDERS_PATH)
+    data["orders"][0]["items"][0]["quantity"] = 5
+    data["orders"].append({
+        "order_id": "ORD999",
+        "customer": {"id": "C001", "name": "田中太郎", "email": "tanaka@example.com"},
+        "items": [{"product_id": "P001", "name": "ノートPC", "quantity": 1, "price": 98000}],
+        "order_date": "2026-02-10",
+        "status": "completed",
+    })
+    counts = load_incremental(data["orders"], db_path=db_path)
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 4}
+
+    after = item_ids(db_path)
+    changed = data["orders"][0]["order_id"]
+    assert {k: v for k, v in after.items() if k not in (changed, "ORD999")} == {
+        k: v for k, v in before.items() if k != changed
+    }
+    assert after[changed] != before[changed]
+    # 明細の id（連番）以外は、差分を反映したデータで作り直した場合と同じ
+    Load(*transform(data), db_path=tmp_path / "full.db")
+    assert contents(db_path) == contents(tmp_path / "full.db")
+
+
+def test_incremental_adds_hash_column_to_old_schema(tmp_path):
+    """content_hash 列のない既存DBには列を追加し、既存の注文はすべて変更ありとして反映する（古いインデックスは削除）"""
+    db_path = tmp_path / "ecommerce.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE orders (order_id TEXT PRIMARY KEY, customer_id TEXT, order_date TEXT, status TEXT)")
+    conn.execute("INSERT INTO orders VALUES ('ORD001', 'C001', '2026-02-01', 'completed')")
+    conn.execute("CREATE INDEX idx_orders_status_customer_id ON orders (status, customer_id)")
+    conn.commit()
+    conn.close()
+    counts = load_incremental(extract_stream(ORDERS_PATH), db_path=db_path)
+    assert counts == {"inserted": 4, "updated": 1, "unchanged": 0}
+    # 使わなくなったインデックスは削除される
+    conn = sqlite3.connect(db_path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+    conn.close()
+    assert indexes == {"idx_order_items_order_id"}
+    assert load_incremental(extract_stream(ORDERS_PATH), db_path=db_path)["unchanged"] == 5
+
+
+def test_summary_tables_follow_incremental_changes(tmp_path):
+    """増分ロードで状態・顧客・明細が変わっても、集計テーブルは JOIN で集計し直した結果と一致する"""
+    db_path = tmp_path / "ecommerce.db"
+    load_stream(transform_stream(extract_stream(ORDERS_PATH)), db_path=db_path)
+    conn = sqlite3.connect(db_path)
+    assert Verify(db_path) == verify_by_join(conn)
+
+    orders = extract(ORDERS_PATH)["orders"]
+    orders[0]["status"] = "cancelled"
+    orders[1]["status"] = "completed"
+    orders[2]["customer"] = {"id": "C009", "name": "新規顧客", "email": None}
+    orders[2]["items"].append({"product_id": "P009", "name": "ケーブル", "quantity": 3, "price": 800})
+    load_incremental(orders, db_path=db_path, batch_size=2)
+    assert Verify(db_path) == verify_by_join(conn)
+    assert ("C009", "新規顧客", 2500 + 45000 + 2400) in Verify(db_path)[0]
+
+    # 完了済みの注文がすべてなくなった顧客・商品は集計テーブルから消える
+    for order in orders:
+        order["status"] = "cancelled"
+    load_incremental(orders, db_path=db_path)
+    assert Verify(db_path) == verify_by_join(conn) == ([], [])
+    conn.close()
+
+
+def split_orders(tmp_path, n_parts: int) -> list:
+    """orders.json を n_parts 個のファイルに分ける（分割エクスポートの再現）"""
+    orders = extract(ORDERS_PATH)["orders"]
+    paths = []
+    for i in range(n_parts):
+        path = tmp_path / f"orders_{i}.json"
+        path.write_text(json.dumps({"orders": orders[i::n_parts]}, ensure_ascii=False), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_load_parallel_matches_load_stream(tmp_path):
+    """複数プロセスでパースし、1つの書き込み側で投入した結果がストリーミング版と同じ"""
+    customers, orders, order_items = transform(extract(ORDERS_PATH))
+    n_stream = load_stream(transform_stream(extract_stream(ORDERS_PATH)), db_path=tmp_path / "stream.db")
+    n_rows = load_parallel(split_orders(tmp_path, 3), db_path=tmp_path / "parallel.db", workers=2, batch_size=2)
+    # 顧客を注文ごとに投入しても、行数は重複を除いたテーブルの行数（Load と同じ）
+    assert n_rows == n_stream == len(customers) + len(orders) + len(order_items)
+    assert contents(tmp_path / "parallel.db") == contents(tmp_path / "stream.db")
+    assert Verify(tmp_path / "parallel.db") == Verify(tmp_path / "stream.db")
+
+
+def test_load_parallel_parse_error_rolls_back(tmp_path):
+    """ワーカーでのパースの失敗は呼び出し側に送出され、前回の内容が残る"""
+    db_path = tmp_path / "ecommerce.db"
+    load_stream(transform_stream(extract_stream(ORDERS_PATH)), db_path=db_path)
+    before = dump(db_path)
+    paths = split_orders(tmp_path, 2)
+    paths[1].write_text(paths[1].read_text(encoding="utf-8")[:-30], encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        load_parallel(paths, db_path=db_path, workers=2, batch_size=1)
+    assert dump(db_path) == before
+
+
+def test_load_parallel_lost_worker_rolls_back(tmp_path, monkeypatch):
+    """終了の印を入れずに落ちたパース側のプロセスを待ち続けず、RuntimeError で ROLLBACK する"""
+    db_path = tmp_path / "ecommerce.db"
+    load_stream(transform_stream(extract_stream(ORDERS_PATH)), db_path=db_path)
+    before = dump(db_path)
+    extract_stream_orig = etl.extract_stream
+
+    def killed_on_second_file(file_path, *args, **kwargs):
+        # OOM killer に止められた場合と同じく、例外も終了の印も出さずにプロセスが消える
+        if file_path.endswith("orders_1.json"):
+            os.kill(os.getpid(), signal.SIGKILL)
+        return extract_stream_orig(file_path, *args, **kwargs)
+
+    # fork で起動するパース側のプロセスにも差し替えが引き継がれる
+    monkeypatch.setattr(etl, "extract_stream", killed_on_second_file)
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        load_parallel(split_orders(tmp_path, 2), db_path=db_path, workers=2, poll_seconds=0.1)
+    assert time.perf_counter() - start < 10
+    assert dump(db_path) == before
@@ -0,0 +1,142 @@
+"""
+bench_aggregate.py - レポート集計（df.copy() + lambda 版 / 事前集計1回版）の処理時間・メモリ比較
+
+使い方: python bench_aggregate.py [行数 ...]（省略時は 10^6, 10^7 行）
+パース後と同じ列構成の DataFrame を合成し、3つのレポートを作るところだけを測る。
+メモリは集計中の RSS の増分の最大値（別スレッドで 10ms ごとに /proc/self/statm を読む）。
+解放済みのメモリの再利用で差が出ないよう、版ごとに別プロセスでデータを作って測る。
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_parse import ENDPOINTS, SERVERS
+from parse_log import pre_aggregate, reports_from_pre_aggregate
+
+ROW_COUNTS = [10**6, 10**7]
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def server_metrics_lambda(df: pd.DataFrame) -> pd.DataFrame:
+    """変更前の server_metrics（比較用）"""
+    df_server_metrics = df.copy()
+    return df_server_metrics.groupby("server").agg(
+        total_requests=("status", "count"),
+        error_count=("status", lambda x: (x >= 400).sum()),
+        error_rate=("status", lambda x: round((x >= 400).sum() / len(x) * 100, 1)),
+        avg_response_time=("response_time", lambda x: round(x.mean(), 1)),
+    )
+
+
+def endpoint_report_lambda(df: pd.DataFrame) -> pd.DataFrame:
+    """変更前の endpoint_report（比較用）"""
+    df_endpoint_report = df.copy()
+    return (
+        df_endpoint_report.groupby("endpoint")
+        .agg(
+            total_request=("status", "count"),
+            error_count=("status", lambda x: (x >= 400).sum()),
+            avg_response_time=("response_time", lambda x: round(x.mean(), 1)),
+        )
+        .reset_index()
+        .sort_values("error_count", ascending=False)
+    )
+
+
+def anomaly_minutes_lambda(df: pd.DataFrame) -> pd.DataFrame:
+    """変更前の anomaly_minutes（比較用）"""
+    df_anomaly_minutes = df.copy()
+    df_anomaly_minutes = df_anomaly_minutes.groupby("minute").agg(
+        request_count=("status", "count"),
+        error_count=("status", lambda x: (x >= 400).sum()),
+        error_rate=("status", lambda x: round((x >= 400).sum() / len(x) * 100, 1)),
+    )
+    return df_anomaly_minutes[df_anomaly_minutes["error_rate"] > 50]
+
+
+def reports_lambda(df: pd.DataFrame) -> tuple:
+    """変更前の transform の集計部分（minute 列の追加を含む）"""
+    df["minute"] = df["timestamp"].dt.strftime("%H:%M")
+    return server_metrics_lambda(df), endpoint_report_lambda(df), anomaly_minutes_lambda(df)
+
+
+def reports_pre_aggregate(df: pd.DataFrame) -> tuple:
+    return reports_from_pre_aggregate(pre_aggregate(df))
+
+
+def generate(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """parse_records_fast の結果と同じ列構成の合成データ（1日分、5%がエラー）"""
+    rng = np.random.default_rng(seed)
+    error = rng.random(n_rows) < 0.05
+    seconds = np.sort(rng.integers(0, 86400, size=n_rows))
+    return pd.DataFrame(
+        {
+            "timestamp": pd.Timestamp("2026-02-10") + pd.to_timedelta(seconds, unit="s"),
+            "level": pd.array(np.where(error, "ERROR", "INFO"), dtype="str"),
+            "server": pd.array(rng.choice(SERVERS, size=n_rows), dtype="str"),
+            "endpoint": pd.array(rng.choice(ENDPOINTS, size=n_rows), dtype="str"),
+            "method": pd.array(np.where(error, "POST", "GET"), dtype="str"),
+            "status": np.where(error, 500, 200).astype("int64"),
+            "response_time": np.where(
+                error, rng.integers(1000, 6000, size=n_rows), rng.integers(10, 500, size=n_rows)
+            ).astype("int64"),
+        }
+    )
+
+
+def _rss() -> int:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * PAGE_SIZE
+
+
+def measured(func, df: pd.DataFrame) -> tuple[tuple, float, float]:
+    """func(df) の結果・処理時間（秒）・RSS の増分の最大値（MB）"""
+    base = peak = _rss()
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(0.01):
+            peak = max(peak, _rss())
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    start = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    return result, elapsed, (max(peak, _rss()) - base) / 1e6
+
+
+MODES = {"lambda": reports_lambda, "事前集計": reports_pre_aggregate}
+
+
+def run(mode: str, n_rows: int) -> tuple[tuple, float, float]:
+    return measured(MODES[mode], generate(n_rows))
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+    ctx = multiprocessing.get_context("spawn")
+    for n_rows in row_counts:
+        results = {}
+        for mode in MODES:
+            with ctx.Pool(1) as pool:
+                results[mode] = pool.apply(run, (mode, n_rows))
+        (result_old, time_old, mem_old), (result_new, time_new, mem_new) = results.values()
+        for old, new in zip(result_old, result_new):
+            pd.testing.assert_frame_equal(old, new)
+        print(
+            f"{n_rows:>12,}行 | lambda: {time_old:7.2f}s {mem_old:>8,.0f}MB"
+            f" | 事前集計: {time_new:7.2f}s {mem_new:>8,.0f}MB | x{time_old / time_new:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+bench_detector.py - ストリーミング版の lines/sec（detector なし / あり）と、障害を混ぜたログでの検知結果
+
+使い方: python bench_detector.py [行数 ...]（省略時は 10^6 行。12:00〜12:04 に web03 の行をすべてエラーにする）
+しきい値ごとに、障害の時間帯の検知と、それ以外の時間帯の検知（誤検知）の件数を出す。
+"""
+import sys
+import time
+
+from bench_parse import generate
+from parse_log import new_detector, new_stream_state, stream_parse_log
+
+LINE_COUNTS = [10**6]
+INCIDENT = ("12:00", "12:05")
+THRESHOLDS = [3.0, 4.0, 5.0]
+
+
+def with_incident(lines: list) -> list:
+    """INCIDENT の時間帯の web03 の行をステータス 500 にする"""
+    return [
+        text.replace("status=200", "status=500")
+        if INCIDENT[0] <= text[11:16] < INCIDENT[1] and "server=web03" in text else text
+        for text in lines
+    ]
+
+
+def run(lines: list, detector: dict | None) -> tuple[list, float]:
+    """返り値は検知結果（"metric" を含む dict）のリストと処理時間"""
+    state = new_stream_state(detector=detector)
+    start = time.perf_counter()
+    events = list(stream_parse_log(lines, state))
+    return [e for e in events if "metric" in e], time.perf_counter() - start
+
+
+def main():
+    line_counts = [int(arg) for arg in sys.argv[1:]] or LINE_COUNTS
+    for n_lines in line_counts:
+        lines = with_incident(generate(n_lines))
+        _, time_plain = run(lines, None)
+        print(f"{n_lines:>12,}行 | detector なし: {n_lines / time_plain:>10,.0f} lines/sec")
+        for threshold in THRESHOLDS:
+            detections, elapsed = run(lines, new_detector(threshold=threshold))
+            incident = [d for d in detections if INCIDENT[0] <= d["minute"][11:] < INCIDENT[1]]
+            web03 = sorted({d["minute"][11:] for d in incident if d["key"] == "web03"})
+            print(
+                f"{'':>14} | threshold={threshold}: {n_lines / elapsed:>10,.0f} lines/sec"
+                f" | 検知 {len(detections):>4} 件（障害の時間帯 {len(incident)} 件、それ以外"
+                f" {len(detections) - len(incident)} 件） | web03 を検知した分: {', '.join(web03)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
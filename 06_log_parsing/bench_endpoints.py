@@ -0,0 +1,53 @@
+"""
+bench_endpoints.py - ID 付きエンドポイントの集計（そのまま / テンプレートにまとめる）の処理時間・メモリ・グループ数の比較
+
+使い方: python bench_endpoints.py [行数 ...]（省略時は 10^6 行。エンドポイントの半分は /api/users/<ID>、ID は行数の 1/2 種類）
+パース後と同じ列構成の DataFrame を合成し、事前集計から3つのレポートを作るところだけを測る（版ごとに別プロセス）。
+"""
+import multiprocessing
+import sys
+
+import numpy as np
+import pandas as pd
+
+from bench_aggregate import generate, measured
+from parse_log import compile_endpoint_templates, pre_aggregate, reports_from_pre_aggregate
+
+ROW_COUNTS = [10**6]
+TEMPLATES = ["/api/users/{id}", "/api/users/{id}/orders"]
+
+
+def generate_with_ids(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    df = generate(n_rows, seed)
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, max(n_rows // 2, 1), size=n_rows)
+    with_id = rng.random(n_rows) < 0.5
+    endpoint = np.where(with_id, "/api/users/" + ids.astype(str), df["endpoint"].to_numpy(dtype=object))
+    df["endpoint"] = pd.array(endpoint, dtype="str")
+    return df
+
+
+def run(templated: bool, n_rows: int) -> tuple[int, int, float, float]:
+    df = generate_with_ids(n_rows)
+    matcher = compile_endpoint_templates(TEMPLATES) if templated else None
+    (pre, reports), elapsed, memory = measured(
+        lambda d: (lambda p: (p, reports_from_pre_aggregate(p)))(pre_aggregate(d, matcher)), df
+    )
+    return len(pre), len(reports[1]), elapsed, memory
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+    ctx = multiprocessing.get_context("spawn")
+    for n_rows in row_counts:
+        for name, templated in [("そのまま", False), ("テンプレート", True)]:
+            with ctx.Pool(1) as pool:
+                n_pre, n_endpoints, elapsed, memory = pool.apply(run, (templated, n_rows))
+            print(
+                f"{n_rows:>12,}行 {name:<8} | {elapsed:6.2f}s {memory:>7,.0f}MB"
+                f" | 事前集計 {n_pre:>10,}行 | endpoint_report {n_endpoints:>10,}行"
+            )
+
+
+if __name__ == "__main__":
+    main()
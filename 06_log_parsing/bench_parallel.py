@@ -0,0 +1,42 @@
+"""
+bench_parallel.py - バッチ版（extract + transform）と並列版（aggregate_parallel）の処理時間比較
+
+使い方: python bench_parallel.py [行数 ...]（省略時は 10^6 行。ワーカー数は 1, 2, 4 と CPU 数）
+合成ログは一時ディレクトリに書き出してから読む。
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from bench_parse import generate
+from parse_log import aggregate_parallel, extract, reports_from_partial, transform
+
+LINE_COUNTS = [10**6]
+
+
+def main():
+    line_counts = [int(arg) for arg in sys.argv[1:]] or LINE_COUNTS
+    worker_counts = sorted({1, 2, 4, os.cpu_count()})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "app_server.log"
+        for n_lines in line_counts:
+            path.write_text("\n".join(generate(n_lines)) + "\n", encoding="utf-8")
+            start = time.perf_counter()
+            expected = transform(extract(path))
+            time_batch = time.perf_counter() - start
+            print(f"{n_lines:>12,}行 | バッチ版: {time_batch:6.2f}s（CPU {os.cpu_count()}個）")
+            for workers in worker_counts:
+                start = time.perf_counter()
+                reports = reports_from_partial(aggregate_parallel(path, workers=workers))
+                elapsed = time.perf_counter() - start
+                for result, exp in zip(reports, expected):
+                    pd.testing.assert_frame_equal(result, exp)
+                print(f"{'':>14} | 並列版 {workers}ワーカー: {elapsed:6.2f}s | x{time_batch / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
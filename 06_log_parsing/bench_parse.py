@@ -0,0 +1,66 @@
+"""
+bench_parse.py - ログのパース（正規表現 / 正規表現なしの高速版）の lines/sec 比較
+
+使い方: python bench_parse.py [行数 ...]（省略時は 10^6 行。1% は不正行、5% は message 付きのエラー行）
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+from parse_log import parse_records, parse_records_fast
+
+LINE_COUNTS = [10**6]
+SERVERS = ["web01", "web02", "web03", "web04"]
+ENDPOINTS = ["/api/users", "/api/products", "/api/orders", "/api/payment", "/api/cart"]
+
+
+def generate(n_lines: int, seed: int = 0) -> list[str]:
+    """data/app_server.log と同じ形式の合成ログ"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_lines):
+        second = i * 86400 // max(n_lines, 1)
+        timestamp = f"2026-02-10 {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+        r = rng.random()
+        if r < 0.01:
+            lines.append("This line is malformed and should be skipped")
+            continue
+        server, endpoint = rng.choice(SERVERS), rng.choice(ENDPOINTS)
+        if r < 0.06:
+            lines.append(
+                f"{timestamp} [ERROR] server={server} endpoint={endpoint} method=POST"
+                f" status=500 response_time={rng.randint(1000, 6000)}ms message=\"DB timeout\""
+            )
+        else:
+            lines.append(
+                f"{timestamp} [INFO] server={server} endpoint={endpoint} method=GET"
+                f" status=200 response_time={rng.randint(10, 500)}ms"
+            )
+    return lines
+
+
+def timed(func, lines: list) -> tuple[tuple, float]:
+    start = time.perf_counter()
+    result = func(lines)
+    return result, time.perf_counter() - start
+
+
+def main():
+    line_counts = [int(arg) for arg in sys.argv[1:]] or LINE_COUNTS
+    for n_lines in line_counts:
+        lines = generate(n_lines)
+        (df_regex, skip_regex), time_regex = timed(parse_records, lines)
+        (df_fast, skip_fast), time_fast = timed(parse_records_fast, lines)
+        pd.testing.assert_frame_equal(df_regex, df_fast)
+        assert skip_regex == skip_fast
+        print(
+            f"{n_lines:>12,}行 | 正規表現: {n_lines / time_regex:>10,.0f} lines/sec ({time_regex:6.2f}s)"
+            f" | 高速版: {n_lines / time_fast:>10,.0f} lines/sec ({time_fast:6.2f}s)"
+            f" | x{time_regex / time_fast:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
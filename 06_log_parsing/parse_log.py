@@ -1,8 +1,33 @@
+import bz2
+import csv
+import glob
+import gzip
+import io
+import math
+import multiprocessing
+import numpy as np
+import os
 import pandas as pd
 import re
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 from pathlib import Path
 
 BASE_PATH = Path(__file__).parent
+# 異常とみなすエラー率（%、これを超える1分間ウィンドウを anomaly_minutes に出す）
+ANOMALY_ERROR_RATE = 50
+# ストリーミング版の状態に残す異常な分・検知結果の件数（古いものから捨てる。follow=True でもメモリが増え続けない）
+STREAM_HISTORY_SIZE = 10_000
+# 逐次異常検知（EWMA・移動窓の z スコア）の既定値: 平滑化係数、窓の分数、z スコアのしきい値、判定を始めるまでの分数
+DETECTOR_ALPHA = 0.1
+DETECTOR_WINDOW = 30
+DETECTOR_THRESHOLD = 4.0
+DETECTOR_MIN_PERIODS = 10
+# 判定する分のリクエスト数の下限（1分あたり）。これより少ない分は基準の更新にだけ使い、異常にはしない
+DETECTOR_MIN_COUNT = 10
+# z スコアの分母（標準偏差）の下限。過去の値がほぼ一定のとき、わずかな変化を異常にしない
+DETECTOR_MIN_STD = {"error_rate": 1.0, "avg_response_time": 10.0}
 # 正規表現パターン（定数）
 LOG_PATTERN = re.compile(
     r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})"
@@ -14,6 +39,25 @@ LOG_PATTERN = re.compile(
     r" response_time=(?P<response_time>\d+)ms"
 )
 
+# 高速パーサーで1回に処理する行数
+BLOCK_SIZE = 200_000
+# 並列版で1回に読むバイト数（改行の直後で切る）
+READ_CHUNK_BYTES = 32 << 20
+# 事前集計のキー（分は 0:00 からの分数。バッチ版の異常検知は日付をまたいでも HH:MM でまとめる）
+PRE_AGGREGATE_KEYS = ["server", "endpoint", "minute"]
+MINUTES_PER_DAY = 24 * 60
+# エンドポイントのテンプレート（main 系で使う。例: "/api/users/{id}"。空なら元のパスのまま集計する）と、
+# 変換結果のキャッシュの最大件数
+ENDPOINT_TEMPLATES = []
+ENDPOINT_CACHE_SIZE = 100_000
+# テンプレートに合わないパスで {id} に置き換えるセグメント（数字・UUID・16桁以上の16進数）
+_ID_SEGMENT = re.compile(r"\d+|[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|[0-9a-fA-F]{16,}")
+# パース結果の列（LOG_PATTERN のグループと同じ順）
+RECORD_COLUMNS = ["timestamp", "level", "server", "endpoint", "method", "status", "response_time"]
+# C パーサーで区切りを誤認しうる文字（含む行は正規表現で処理する）: NUL と、正規表現の \s に当たる
+# ASCII の空白文字（半角スペース・改行以外。\x1c〜\x1f も含む）。非 ASCII の行は別に正規表現へ回す
+_SPECIAL_CHARS = "\x00" + "".join(c for c in map(chr, range(128)) if c.isspace() and c not in " \n")
+
 # def server_metrics(df:pd.DataFrame) -> pd.DataFrame:
 
 
@@ -22,70 +66,864 @@ def extract(file_path: str) -> list:
     return lines
 
 
-def server_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    df_server_metrics = df.copy()
-    df_server_metrics = df_server_metrics.groupby("server").agg(
-        total_requests=("status", "count"),
-        error_count=("status", lambda x: (x >= 400).sum()),
-        error_rate=("status", lambda x: round((x >= 400).sum() / len(x) * 100, 1)),
-        avg_response_time=("response_time", lambda x: round(x.mean(), 1)),
+def _typed_records(df: pd.DataFrame) -> pd.DataFrame:
+    # データ型調整
+    for col in ["level", "server", "endpoint", "method"]:
+        df[col] = df[col].astype("str")
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format="%Y-%m-%d %H:%M:%S")
+    df["status"] = df["status"].astype("int64")
+    df["response_time"] = df["response_time"].astype("int64")
+    return df
+
+
+def parse_records(lines: list) -> tuple[pd.DataFrame, int]:
+    """正規表現で1行ずつパースする（変更前の transform と同じ処理）。パース結果とスキップした行数を返す"""
+    records = []
+    skip_count = 0
+
+    # 各行を正規表現でパースし、フィールドを抽出する
+    for line in lines:
+        m = LOG_PATTERN.match(line)
+        if m:
+            records.append(m.groupdict())
+        else:
+            skip_count += 1
+    return _typed_records(pd.DataFrame(records, columns=RECORD_COLUMNS)), skip_count
+
+
+def _is_word(value: str) -> bool:
+    # ASCII の値に限って \w+ と同じ判定（英数字と _ が1文字以上）
+    return value != "" and value.replace("_", "a").isalnum()
+
+
+def _is_date(value: str) -> bool:
+    # \d{4}-\d{2}-\d{2}
+    return len(value) == 10 and value[4] == value[7] == "-" and (value[:4] + value[5:7] + value[8:]).isdigit()
+
+
+def _is_clock(value: str) -> bool:
+    # \d{2}:\d{2}:\d{2}
+    return len(value) == 8 and value[2] == value[5] == ":" and (value[:2] + value[3:5] + value[6:]).isdigit()
+
+
+def _is_response_time(value: str) -> bool:
+    # \d+ms（ms の後ろに続きがある値は正規表現側で判定する）
+    return value[-2:] == "ms" and value[:-2].isdigit()
+
+
+# 高速パーサーの列ごとの (接頭辞, 接頭辞を除いた値の判定, 値の変換)
+_FIELDS = {
+    "date": ("", _is_date, str),
+    "clock": ("", _is_clock, str),
+    "level": ("[", lambda v: v[-1:] == "]" and _is_word(v[:-1]), lambda v: v[:-1]),
+    "server": ("server=", _is_word, str),
+    "endpoint": ("endpoint=", lambda v: v != "", str),
+    "method": ("method=", _is_word, str),
+    "status": ("status=", str.isdigit, int),
+    "response_time": ("response_time=", _is_response_time, lambda v: int(v[:-2])),
+}
+
+# ブロックの前後に付ける8列の行（列数の推定と、末尾の空行が落ちるのを防ぐ）
+_SENTINEL = " ".join(["-"] * 8)
+
+
+def _block_text(lines: list) -> str:
+    """ブロックの行を改行でつなぐ。非 ASCII・制御文字を含む行は空行にして正規表現側に回す"""
+    text = "\n".join(lines)
+    if not (text.isascii() and not any(c in text for c in _SPECIAL_CHARS)):
+        text = "\n".join(
+            line if line.isascii() and not any(c in line for c in _SPECIAL_CHARS) else ""
+            for line in lines
+        )
+    return f"{_SENTINEL}\n{text}\n{_SENTINEL}"
+
+
+def _factorized_field(col: np.ndarray, prefix: str, check, convert) -> tuple[np.ndarray, np.ndarray, list]:
+    """
+    列を factorize し、ユニークな値ごとに接頭辞と形を確かめて変換する（行ごとの Python 処理をしない）
+
+    :return: 行ごとの判定結果、行ごとのコード、ユニークな値ごとの変換結果（形が違う値は None）
+    """
+    codes, uniques = pd.factorize(col)
+    ok = np.zeros(len(uniques), dtype=bool)
+    values = [None] * len(uniques)
+    n = len(prefix)
+    for i, value in enumerate(uniques):
+        if value.startswith(prefix) and check(value[n:]):
+            ok[i] = True
+            values[i] = convert(value[n:])
+    return ok[codes], codes, values
+
+
+def parse_block(lines: list) -> tuple[pd.DataFrame, int]:
+    """
+    正規表現を使わずに1ブロック分の行をパースする。パース結果とスキップした行数を返す
+
+    1. 行を空白で区切って8列に分ける（pd.read_csv の C パーサー、9列目以降の message は読まない）
+    2. 列ごとに factorize し、ユニークな値だけを key=value の形か確かめて変換する
+       （ログの値は種類が少ないので、Python で処理するのはユニークな値の数だけ）
+    3. 形が違う行だけ LOG_PATTERN でパースする（形が違っても正規表現には合う行があるため）
+    parse_records と同じ行をスキップし、同じ結果を返す。
+    """
+    cols = pd.read_csv(
+        io.StringIO(_block_text(lines)),
+        sep=" ",
+        header=None,
+        names=range(8),
+        usecols=range(8),
+        dtype=object,
+        quoting=csv.QUOTE_NONE,
+        na_filter=False,
+        skip_blank_lines=False,
+    ).iloc[1:-1]
+    if len(cols) != len(lines):
+        # 行の区切りを C パーサーと揃えられなかったブロックは、すべて正規表現で処理する
+        return parse_records(lines)
+
+    fast = np.ones(len(lines), dtype=bool)
+    fields = {}
+    for i, (name, spec) in enumerate(_FIELDS.items()):
+        ok, codes, values = _factorized_field(cols[i].fillna("").to_numpy(), *spec)
+        fast &= ok
+        fields[name] = (codes, values)
+
+    rows = np.flatnonzero(fast)
+
+    def text_column(name: str) -> pd.api.extensions.ExtensionArray:
+        codes, values = fields[name]
+        return pd.array(values, dtype="str").take(codes[rows])
+
+    def int_column(name: str) -> np.ndarray:
+        codes, values = fields[name]
+        return np.array([0 if v is None else v for v in values], dtype="int64")[codes[rows]]
+
+    # タイムスタンプは (日付, 時刻) の組み合わせごとに1回だけ変換する
+    date_codes, dates = fields["date"]
+    clock_codes, clocks = fields["clock"]
+    pairs, pair_codes = np.unique(
+        date_codes[rows].astype("int64") * len(clocks) + clock_codes[rows], return_inverse=True
+    )
+    timestamps = pd.to_datetime(
+        [f"{dates[p // len(clocks)]} {clocks[p % len(clocks)]}" for p in pairs], format="%Y-%m-%d %H:%M:%S"
+    )
+    df = pd.DataFrame(
+        {
+            "timestamp": timestamps.take(pair_codes),
+            "level": text_column("level"),
+            "server": text_column("server"),
+            "endpoint": text_column("endpoint"),
+            "method": text_column("method"),
+            "status": int_column("status"),
+            "response_time": int_column("response_time"),
+        },
+        index=rows,
     )
-    return df_server_metrics
 
+    skip_count = 0
+    if not fast.all():
+        records, index = [], []
+        for i in np.flatnonzero(~fast):
+            m = LOG_PATTERN.match(lines[i])
+            if m:
+                records.append(m.groups())
+                index.append(i)
+            else:
+                skip_count += 1
+        if records:
+            fallback = _typed_records(pd.DataFrame(records, columns=RECORD_COLUMNS, index=index))
+            df = pd.concat([df, fallback]).sort_index()
+    return df.reset_index(drop=True), skip_count
 
-def endpoint_report(df: pd.DataFrame) -> pd.DataFrame:
-    df_endpoint_report = df.copy()
-    df_endpoint_report = (
-        df_endpoint_report.groupby("endpoint")
-        .agg(
-            total_request=("status", "count"),
-            error_count=("status", lambda x: (x >= 400).sum()),
-            avg_response_time=("response_time", lambda x: round(x.mean(), 1)),
+
+def parse_records_fast(lines: list, block_size: int = BLOCK_SIZE) -> tuple[pd.DataFrame, int]:
+    """parse_block を block_size 行ずつ行い、結果をつなげる"""
+    frames, skip_count = [], 0
+    for start in range(0, max(len(lines), 1), block_size):
+        df, skipped = parse_block(lines[start:start + block_size])
+        frames.append(df)
+        skip_count += skipped
+    return pd.concat(frames, ignore_index=True), skip_count
+
+
+def compile_endpoint_templates(
+    templates: list[str], replace_ids: bool = True, cache_size: int = ENDPOINT_CACHE_SIZE
+) -> dict:
+    """
+    エンドポイントのテンプレート（"/api/users/{id}" など）をセグメント単位のトライ木にまとめる
+
+    {...} のセグメントは任意の1セグメントに合う。どのテンプレートにも合わないパスは、replace_ids=True なら
+    数字・UUID・16桁以上の16進数のセグメントを {id} に置き換える（テンプレートを書いていない ID 付きのパスも増えすぎない）。
+    変換結果は元のパス → テンプレートの dict（最大 cache_size 件、古いものから捨てる）に覚えておく。
+    """
+    trie = _new_trie_node()
+    for template in templates:
+        node = trie
+        for segment in template.split("/"):
+            if segment.startswith("{") and segment.endswith("}"):
+                node["wildcard"] = node["wildcard"] or _new_trie_node()
+                node = node["wildcard"]
+            else:
+                node = node["literal"].setdefault(segment, _new_trie_node())
+        node["template"] = template
+    return {"trie": trie, "replace_ids": replace_ids, "cache": OrderedDict(), "cache_size": cache_size}
+
+
+def _new_trie_node() -> dict:
+    return {"literal": {}, "wildcard": None, "template": None}
+
+
+def _match_template(node: dict, segments: list, i: int = 0) -> str | None:
+    """トライ木をたどってテンプレートを探す（同じ位置では {...} より文字どおりのセグメントを優先する）"""
+    if i == len(segments):
+        return node["template"]
+    child = node["literal"].get(segments[i])
+    if child is not None:
+        template = _match_template(child, segments, i + 1)
+        if template is not None:
+            return template
+    if node["wildcard"] is not None:
+        return _match_template(node["wildcard"], segments, i + 1)
+    return None
+
+
+def normalize_endpoint(matcher: dict, endpoint: str) -> str:
+    """エンドポイントをテンプレートにする（クエリ文字列は除く）。同じパスは2回目からキャッシュを引くだけ"""
+    cache = matcher["cache"]
+    template = cache.get(endpoint)
+    if template is None:
+        path = endpoint.split("?", 1)[0]
+        segments = path.split("/")
+        template = _match_template(matcher["trie"], segments)
+        if template is None:
+            template = (
+                "/".join("{id}" if _ID_SEGMENT.fullmatch(s) else s for s in segments)
+                if matcher["replace_ids"] else path
+            )
+        if len(cache) >= matcher["cache_size"]:
+            cache.popitem(last=False)
+        cache[endpoint] = template
+    return template
+
+
+def _group_totals(df: pd.DataFrame, keys) -> pd.DataFrame:
+    """
+    keys ごとの件数・エラー件数・応答時間の合計（count / errors / response_time_sum）を1回の groupby で作る
+
+    エラー判定（status >= 400）は全行で1回だけ行い、件数は groupby の size で数える（1 の列を作らない）。
+    """
+    grouped = pd.DataFrame(
+        {"errors": df["status"] >= 400, "response_time_sum": df["response_time"]}
+    ).groupby(keys)
+    totals = grouped.sum()
+    totals.insert(0, "count", grouped.size())
+    return totals.astype("int64")
+
+
+def _minute_of_day(timestamp: pd.Series) -> pd.Series:
+    # 行ごとの strftime("%H:%M") の代わりに整数で持つ（分単位に切り捨てた時刻を1日の分数で割った余り）
+    minutes = timestamp.to_numpy().astype("datetime64[m]").astype("int64") % MINUTES_PER_DAY
+    return pd.Series(minutes, index=timestamp.index, name="minute")
+
+
+def _minute_labels(minutes: pd.Index) -> pd.Index:
+    """0:00 からの分数を HH:MM の文字列にする（集計後の分の数だけ）"""
+    return pd.Index([f"{m // 60:02d}:{m % 60:02d}" for m in minutes], dtype="str")
+
+
+def server_metrics_from_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    """サーバー別の合計（count / errors / response_time_sum）から server_metrics と同じ表を作る"""
+    totals = totals.sort_index().rename_axis("server")
+    return pd.DataFrame(
+        {
+            "total_requests": totals["count"],
+            "error_count": totals["errors"],
+            "error_rate": round(totals["errors"] / totals["count"] * 100, 1),
+            "avg_response_time": round(totals["response_time_sum"] / totals["count"], 1),
+        }
+    )
+
+
+def endpoint_report_from_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    """エンドポイント別の合計から endpoint_report と同じ表を作る"""
+    totals = totals.sort_index().rename_axis("endpoint")
+    return (
+        pd.DataFrame(
+            {
+                "total_request": totals["count"],
+                "error_count": totals["errors"],
+                "avg_response_time": round(totals["response_time_sum"] / totals["count"], 1),
+            }
         )
         .reset_index()
         .sort_values("error_count", ascending=False)
     )
-    return df_endpoint_report
+
+
+def anomaly_minutes_from_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    """分（HH:MM）別の合計から anomaly_minutes と同じ表を作る"""
+    totals = totals.sort_index().rename_axis("minute")
+    report = pd.DataFrame(
+        {
+            "request_count": totals["count"],
+            "error_count": totals["errors"],
+            "error_rate": round(totals["errors"] / totals["count"] * 100, 1),
+        }
+    )
+    return report[report["error_rate"] > ANOMALY_ERROR_RATE]
+
+
+def _totals_frame(counters: dict) -> pd.DataFrame:
+    return pd.DataFrame.from_dict(
+        counters, orient="index", columns=["count", "errors", "response_time_sum"]
+    ).astype("int64")
+
+
+def server_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    return server_metrics_from_totals(_group_totals(df, df["server"]))
+
+
+def endpoint_report(df: pd.DataFrame) -> pd.DataFrame:
+    return endpoint_report_from_totals(_group_totals(df, df["endpoint"]))
 
 
 def anomaly_minutes(df: pd.DataFrame) -> pd.DataFrame:
-    df_anomaly_minutes = df.copy()
-    df_anomaly_minutes = df_anomaly_minutes.groupby("minute").agg(
-        request_count=("status", "count"),
-        error_count=("status", lambda x: (x >= 400).sum()),
-        error_rate=("status", lambda x: round((x >= 400).sum() / len(x) * 100, 1)),
+    totals = _group_totals(df, _minute_of_day(df["timestamp"]))
+    totals.index = _minute_labels(totals.index)
+    return anomaly_minutes_from_totals(totals)
+
+
+def pre_aggregate(df: pd.DataFrame, endpoint_matcher: dict | None = None) -> pd.DataFrame:
+    """
+    サーバー × エンドポイント × 分ごとの合計（count / errors / response_time_sum）を1回の groupby で作る
+
+    3つのレポートはどれもこの事前集計を足し上げて作れるので、行数に比例する処理はここだけになる。
+    3つのキーは1つの整数にまとめてから groupby する（複数キーの groupby より作業用のメモリが半分以下）。
+    endpoint_matcher（compile_endpoint_templates）を渡すと、エンドポイントをテンプレートにまとめて集計する。
+    """
+    server_codes, servers = pd.factorize(df["server"])
+    endpoint_codes, endpoints = pd.factorize(df["endpoint"])
+    if endpoint_matcher is not None:
+        # テンプレートにするのはユニークなエンドポイントだけ
+        templated = pd.Index([normalize_endpoint(endpoint_matcher, e) for e in endpoints], dtype="str")
+        template_codes, endpoints = pd.factorize(templated)
+        endpoint_codes = template_codes[endpoint_codes]
+    key = server_codes * len(endpoints)
+    key += endpoint_codes
+    del server_codes, endpoint_codes
+    key *= MINUTES_PER_DAY
+    key += _minute_of_day(df["timestamp"]).to_numpy()
+    totals = _group_totals(df, key)
+
+    key = totals.index.to_numpy()
+    pair = key // MINUTES_PER_DAY
+    totals.index = pd.MultiIndex.from_arrays(
+        [servers.take(pair // len(endpoints)), endpoints.take(pair % len(endpoints)), key % MINUTES_PER_DAY],
+        names=PRE_AGGREGATE_KEYS,
     )
-    df_anomaly_minutes = df_anomaly_minutes[df_anomaly_minutes["error_rate"] > 50]
-    return df_anomaly_minutes
+    return totals
 
 
-def transform(lines: list) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    records = []
-    skip_count = 0
+def reports_from_pre_aggregate(pre: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """事前集計から transform と同じ3つのレポートを作る"""
+    minutes = pre.groupby(level="minute").sum()
+    minutes.index = _minute_labels(minutes.index)
+    return (
+        server_metrics_from_totals(pre.groupby(level="server").sum()),
+        endpoint_report_from_totals(pre.groupby(level="endpoint").sum()),
+        anomaly_minutes_from_totals(minutes),
+    )
 
-    # 各行を正規表現でパースし、フィールドを抽出する
+
+def transform(
+    lines: list, endpoint_matcher: dict | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    df, skip_count = parse_records_fast(lines)
+
+    print(f"スキップした不正行: {skip_count}件")
+    print(f"パース成功: {len(df)}件")
+
+    return reports_from_pre_aggregate(pre_aggregate(df, endpoint_matcher))
+
+
+def new_partial() -> dict:
+    """部分集計。サーバー × エンドポイント × 分の事前集計（pre_aggregate）と行数"""
+    return partial_from_records(parse_records([])[0])
+
+
+def partial_from_records(df: pd.DataFrame, skip_count: int = 0, endpoint_matcher: dict | None = None) -> dict:
+    """パース結果（parse_records の DataFrame）から部分集計を作る"""
+    return {"totals": pre_aggregate(df, endpoint_matcher), "parsed": len(df), "skipped": skip_count}
+
+
+def merge_partials(*partials: dict) -> dict:
+    """部分集計を足し合わせる（順序によらず同じ結果になる）"""
+    frames = [p["totals"] for p in partials if len(p["totals"])]
+    return {
+        "totals": (
+            pd.concat(frames).groupby(level=PRE_AGGREGATE_KEYS).sum()
+            if frames else new_partial()["totals"]
+        ),
+        "parsed": sum(p["parsed"] for p in partials),
+        "skipped": sum(p["skipped"] for p in partials),
+    }
+
+
+def reports_from_partial(partial: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """部分集計から transform と同じ3つのレポートを作る"""
+    return reports_from_pre_aggregate(partial["totals"])
+
+
+def byte_ranges(file_path: Path, n_parts: int) -> list[tuple[int, int]]:
+    """ファイルを n_parts 個程度のバイト範囲 [start, end) に分ける。境界は行頭（改行の直後）にそろえる"""
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, "rb") as file:
+        for i in range(1, n_parts):
+            pos = size * i // n_parts
+            if pos <= bounds[-1]:
+                continue
+            # pos - 1 から次の改行の直後まで進める（pos がちょうど行頭ならそのまま）
+            file.seek(pos - 1)
+            file.readline()
+            bounds.append(file.tell())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def _line_chunks(file, chunk_bytes: int, size: float = float("inf")):
+    """
+    バイナリのファイル（圧縮ファイルの展開ストリームでもよい）を chunk_bytes 程度ずつ読み、行のリストを返すジェネレータ
+
+    チャンクは改行の直後で切るので、行の分け方は extract（ファイル全体の splitlines）と同じになる。
+    size を指定したら、そのバイト数まで読む。
+    """
+    rest = b""
+    while size > 0:
+        data = file.read(min(chunk_bytes, size))
+        if not data:
+            break
+        size -= len(data)
+        data = rest + data
+        cut = data.rfind(b"\n") + 1
+        data, rest = data[:cut], data[cut:]
+        if data:
+            yield data.decode("utf-8").splitlines()
+    if rest:
+        yield rest.decode("utf-8").splitlines()
+
+
+def read_range_lines(file_path: Path, start: int, end: int, chunk_bytes: int = READ_CHUNK_BYTES):
+    """バイト範囲 [start, end) を chunk_bytes 程度ずつ読み、行のリストを返すジェネレータ"""
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        yield from _line_chunks(file, chunk_bytes, end - start)
+
+
+def _aggregate_chunks(chunks, endpoint_matcher: dict | None = None) -> dict:
+    """行のリストを1つずつパースし、部分集計を足し合わせていく（保持するのは1チャンク分の行だけ）"""
+    partial = new_partial()
+    for lines in chunks:
+        partial = merge_partials(partial, partial_from_records(*parse_records_fast(lines), endpoint_matcher))
+    return partial
+
+
+def parse_range(
+    file_path: str,
+    start: int,
+    end: int,
+    chunk_bytes: int = READ_CHUNK_BYTES,
+    endpoint_matcher: dict | None = None,
+) -> dict:
+    """バイト範囲をパースして部分集計を返す（並列版のワーカーで実行する）"""
+    return _aggregate_chunks(read_range_lines(file_path, start, end, chunk_bytes), endpoint_matcher)
+
+
+def aggregate_parallel(
+    file_path: Path,
+    workers: int | None = None,
+    n_parts: int | None = None,
+    chunk_bytes: int = READ_CHUNK_BYTES,
+    endpoint_matcher: dict | None = None,
+) -> dict:
+    """
+    ファイルを改行にそろえたバイト範囲に分け、プロセスプールでパース・集計して部分集計をマージする
+
+    ワーカーから返すのはサーバー・エンドポイント・分ごとの合計だけなので、プロセス間で DataFrame 全体を送らない。
+    n_parts の既定はワーカー数（省略時は CPU 数）。
+    """
+    workers = workers or os.cpu_count()
+    ranges = byte_ranges(file_path, n_parts or workers)
+    ctx = multiprocessing.get_context()
+    with ctx.Pool(workers) as pool:
+        partials = pool.starmap(
+            parse_range,
+            [(str(file_path), start, end, chunk_bytes, endpoint_matcher) for start, end in ranges],
+        )
+    return merge_partials(new_partial(), *partials)
+
+
+def transform_parallel(
+    file_path: Path, workers: int | None = None, endpoint_matcher: dict | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """extract + transform の並列版。ファイルを直接読み、transform と同じ3つのレポートを返す"""
+    partial = aggregate_parallel(file_path, workers, endpoint_matcher=endpoint_matcher)
+    print(f"スキップした不正行: {partial['skipped']}件")
+    print(f"パース成功: {partial['parsed']}件")
+    return reports_from_partial(partial)
+
+
+def _open_zstd(file_path: Path, mode: str = "rb"):
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd 圧縮のログを読むには zstandard が必要です（pip install zstandard）") from e
+    # ローテーション時に追記された複数フレームのファイルも最後まで読む
+    return zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), read_across_frames=True)
+
+
+# 拡張子ごとの開き方（どれもバイナリのストリームを返し、ファイル全体は展開しない）
+LOG_OPENERS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".zst": _open_zstd,
+}
+# ローテーションの番号（app_server.log.3.gz の 3）。番号が大きいほど古い
+ROTATION_PATTERN = re.compile(r"^(?P<base>.+?)(?:\.(?P<number>\d+))?$")
+
+
+def open_log(file_path: Path):
+    """ログファイルをバイナリのストリームで開く（.gz / .bz2 / .zst は展開しながら読む）"""
+    return LOG_OPENERS.get(Path(file_path).suffix, open)(file_path, "rb")
+
+
+def _rotation_key(file_path: Path) -> tuple[str, int]:
+    name = file_path.name
+    if file_path.suffix in LOG_OPENERS:
+        name = name[: -len(file_path.suffix)]
+    m = ROTATION_PATTERN.match(name)
+    return m["base"], -int(m["number"] or 0)
+
+
+def log_files(source) -> list[Path]:
+    """
+    ローテーションされたログの一覧を古い順に返す
+
+    source はディレクトリ（中のファイルすべて）、glob パターン（"logs/app_server.log*"）、ファイルのいずれか。
+    app_server.log.3.zst → app_server.log.2.gz → app_server.log.1 → app_server.log の順になる。
+    """
+    source = Path(source)
+    if source.is_dir():
+        files = [path for path in source.iterdir() if path.is_file() and not path.name.startswith(".")]
+    elif source.exists():
+        files = [source]
+    else:
+        files = [Path(path) for path in glob.glob(str(source)) if Path(path).is_file()]
+    return sorted(files, key=_rotation_key)
+
+
+def read_log_chunks(file_path: Path, chunk_bytes: int = READ_CHUNK_BYTES):
+    """1ファイルを（圧縮されていれば展開しながら）chunk_bytes 程度ずつ読み、行のリストを返すジェネレータ"""
+    with open_log(file_path) as file:
+        yield from _line_chunks(file, chunk_bytes)
+
+
+def read_log_set(source, chunk_bytes: int = READ_CHUNK_BYTES):
+    """ローテーションされたログを古い順に1行ずつ返すジェネレータ（stream_parse_log の入力にできる）"""
+    for file_path in log_files(source):
+        for lines in read_log_chunks(file_path, chunk_bytes):
+            yield from lines
+
+
+def parse_log_file(
+    file_path: str, chunk_bytes: int = READ_CHUNK_BYTES, endpoint_matcher: dict | None = None
+) -> dict:
+    """1ファイルをパースして部分集計を返す（圧縮ファイルはバイト範囲に分けられないので1ファイル単位で処理する）"""
+    return _aggregate_chunks(read_log_chunks(file_path, chunk_bytes), endpoint_matcher)
+
+
+def aggregate_log_set(
+    source,
+    workers: int = 1,
+    chunk_bytes: int = READ_CHUNK_BYTES,
+    endpoint_matcher: dict | None = None,
+) -> dict:
+    """
+    ローテーションされたログ全体をパース・集計して部分集計を返す
+
+    workers=1 なら古い順に1ファイルずつ処理する。workers > 1 ならプロセスプールで並列に処理し、
+    圧縮されたファイルは1ファイル単位、圧縮されていないファイルは byte_ranges で workers 個に分けて配る。
+    集計は足し算だけなので、処理の順序によらず結果は同じになる。
+    """
+    files = log_files(source)
+    if workers == 1:
+        return merge_partials(
+            new_partial(), *(parse_log_file(path, chunk_bytes, endpoint_matcher) for path in files)
+        )
+
+    ranges, whole_files = [], []
+    for path in files:
+        if path.suffix in LOG_OPENERS:
+            whole_files.append((str(path), chunk_bytes, endpoint_matcher))
+        else:
+            ranges.extend(
+                (str(path), start, end, chunk_bytes, endpoint_matcher) for start, end in byte_ranges(path, workers)
+            )
+    ctx = multiprocessing.get_context()
+    with ctx.Pool(workers) as pool:
+        compressed = pool.starmap_async(parse_log_file, whole_files)
+        partials = pool.starmap(parse_range, ranges) + compressed.get()
+    return merge_partials(new_partial(), *partials)
+
+
+def transform_log_set(
+    source, workers: int = 1, endpoint_matcher: dict | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """ローテーションされたログ全体から transform と同じ3つのレポートを作る"""
+    partial = aggregate_log_set(source, workers, endpoint_matcher=endpoint_matcher)
+    print(f"スキップした不正行: {partial['skipped']}件")
+    print(f"パース成功: {partial['parsed']}件")
+    return reports_from_partial(partial)
+
+
+def read_lines(file_path: Path, follow: bool = False, poll_interval: float = 1.0):
+    """
+    ログを1行ずつ遅延読み込みするジェネレータ（改行は除く）
+
+    follow=True のときは tail -f のようにファイル末尾で追記を待ち続ける（呼び出し側が止める）。
+    改行で終わっていない書き込み途中の行は、改行が書かれるまで返さない。
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        pending = ""
+        while True:
+            line = file.readline()
+            if line.endswith("\n"):
+                yield (pending + line).rstrip("\r\n")
+                pending = ""
+            elif line:
+                pending += line
+            elif follow:
+                time.sleep(poll_interval)
+            else:
+                if pending:
+                    yield pending.rstrip("\r")
+                return
+
+
+def new_detector(
+    alpha: float = DETECTOR_ALPHA,
+    window: int = DETECTOR_WINDOW,
+    threshold: float = DETECTOR_THRESHOLD,
+    min_periods: int = DETECTOR_MIN_PERIODS,
+    min_std: dict | None = None,
+    min_count: int = DETECTOR_MIN_COUNT,
+) -> dict:
+    """
+    サーバー別・エンドポイント別の分ごとのエラー率・平均応答時間を逐次判定する異常検知の状態
+
+    系列（("server", "web01") と指標の組）ごとに EWMA の平均・分散と、直近 window 分の値の合計・二乗和だけを持つ。
+    1分の値で更新する処理は O(1) で、過去のログを読み直さない。
+    min_std は指標ごとの標準偏差の下限で、指定しなかった指標は DETECTOR_MIN_STD の値を使う。
+    min_count はリクエスト数の下限で、1分のリクエストがこれより少ない分は異常にしない（1件のエラーで 100% になるため）。
+    """
+    if not 1 <= min_periods <= window:
+        raise ValueError(f"min_periods は 1〜window で指定してください: {min_periods}")
+    return {
+        "alpha": alpha,
+        "window": window,
+        "threshold": threshold,
+        "min_periods": min_periods,
+        "min_std": {**DETECTOR_MIN_STD, **(min_std or {})},
+        "min_count": min_count,
+        "series": {},  # (dimension, key, metric) -> 統計量
+    }
+
+
+def observe_minute(detector: dict, series: tuple, value: float, count: int | None = None) -> dict | None:
+    """
+    系列の1分の値を判定してから統計量を更新する。異常なら z スコアなどの dict、そうでなければ None を返す
+
+    判定は上がる方向だけ。EWMA の平均・標準偏差による z スコアと、直近 window 分の平均・標準偏差による
+    z スコアの両方が threshold を超えたら異常とする（値が min_periods 分たまるまでは判定しない）。
+    count（その分のリクエスト数）が min_count より少なければ、統計量は更新するが異常にはしない。
+    """
+    stats = detector["series"].get(series)
+    if stats is None:
+        stats = detector["series"][series] = {
+            "n": 0, "mean": 0.0, "var": 0.0, "window": deque(), "sum": 0.0, "sumsq": 0.0,
+        }
+    result = None
+    if stats["n"] >= detector["min_periods"]:
+        min_std = detector["min_std"][series[-1]]
+        ewma_std = max(math.sqrt(stats["var"]), min_std)
+        ewma_z = (value - stats["mean"]) / ewma_std
+        n_window = len(stats["window"])
+        window_mean = stats["sum"] / n_window
+        window_std = math.sqrt(max(stats["sumsq"] / n_window - window_mean**2, 0.0))
+        rolling_z = (value - window_mean) / max(window_std, min_std)
+        enough = count is None or count >= detector["min_count"]
+        if enough and ewma_z > detector["threshold"] and rolling_z > detector["threshold"]:
+            result = {"ewma_mean": stats["mean"], "ewma_z": ewma_z, "rolling_z": rolling_z}
+        # 外れ値で基準が一気に動かないよう、更新に使う値は平均 + threshold × 標準偏差で頭打ちにする
+        # （障害が続く間は検知し続け、値が元に戻らなければ基準が少しずつ追いつく）
+        value = min(value, stats["mean"] + detector["threshold"] * ewma_std)
+
+    # EWMA の平均・分散（指数加重の Welford 法）
+    if stats["n"] == 0:
+        stats["mean"] = value
+    else:
+        diff = value - stats["mean"]
+        increment = detector["alpha"] * diff
+        stats["mean"] += increment
+        stats["var"] = (1 - detector["alpha"]) * (stats["var"] + diff * increment)
+    stats["n"] += 1
+    # 直近 window 分の合計・二乗和（入った値と出た値だけ足し引きする）
+    stats["window"].append(value)
+    stats["sum"] += value
+    stats["sumsq"] += value * value
+    if len(stats["window"]) > detector["window"]:
+        old = stats["window"].popleft()
+        stats["sum"] -= old
+        stats["sumsq"] -= old * old
+    return result
+
+
+def new_stream_state(
+    endpoint_matcher: dict | None = None,
+    detector: dict | None = None,
+    history_size: int = STREAM_HISTORY_SIZE,
+) -> dict:
+    """
+    ストリーミング集計の状態。保持するのはサーバー・エンドポイント別の合計と、まだ閉じていない分だけ
+
+    endpoint_matcher（compile_endpoint_templates）を渡すと、エンドポイントをテンプレートにまとめて集計する。
+    detector（new_detector）を渡すと、分が閉じるたびにサーバー別・エンドポイント別の値でも異常を判定する。
+    異常な分（anomalies）と検知結果（detections）は直近 history_size 件だけ残す。
+    すべて必要なら stream_parse_log が返す値を呼び出し側で保存する。
+    """
+    return {
+        "endpoint_matcher": endpoint_matcher,
+        "detector": detector,
+        "open_series": {},  # detector があるとき "YYYY-MM-DD HH:MM" -> {(dimension, key): [count, errors, response_time_sum]}
+        "detections": deque(maxlen=history_size),
+        "servers": {},  # server -> [count, errors, response_time_sum]
+        "endpoints": {},  # endpoint -> [count, errors, response_time_sum]
+        "open_minutes": {},  # "YYYY-MM-DD HH:MM" -> [count, errors]
+        "closed_until": "",  # この分より前の分は閉じている
+        "max_timestamp": "",
+        "anomalies": deque(maxlen=history_size),
+        "parsed": 0,
+        "skipped": 0,
+        "late": 0,  # 閉じた分に遅れて届いた行（サーバー・エンドポイントには加算し、分の集計には入れない）
+    }
+
+
+def _detect_series(state: dict, minute: str):
+    """閉じた分のサーバー別・エンドポイント別の値を detector で判定し、異常を返す"""
+    for (dimension, key), (count, errors, response_time_sum) in sorted(state["open_series"].pop(minute, {}).items()):
+        for metric, value in [("error_rate", errors / count * 100), ("avg_response_time", response_time_sum / count)]:
+            scores = observe_minute(state["detector"], (dimension, key, metric), value, count)
+            if scores is not None:
+                detection = {
+                    "minute": minute,
+                    "dimension": dimension,
+                    "key": key,
+                    "metric": metric,
+                    "value": round(value, 1),
+                    "ewma_mean": round(scores["ewma_mean"], 1),
+                    "ewma_z": round(scores["ewma_z"], 2),
+                    "rolling_z": round(scores["rolling_z"], 2),
+                }
+                state["detections"].append(detection)
+                yield detection
+
+
+def _close_minutes(state: dict, until: str):
+    """
+    until より前の分を閉じ、エラー率が ANOMALY_ERROR_RATE を超える分を返す
+
+    detector があれば、続けてその分のサーバー別・エンドポイント別の異常（"metric" を含む dict）も返す。
+    """
+    for minute in sorted(m for m in state["open_minutes"] if m < until):
+        count, errors = state["open_minutes"].pop(minute)
+        error_rate = round(errors / count * 100, 1)
+        if error_rate > ANOMALY_ERROR_RATE:
+            anomaly = {
+                "minute": minute[11:],
+                "request_count": count,
+                "error_count": errors,
+                "error_rate": error_rate,
+            }
+            state["anomalies"].append(anomaly)
+            yield anomaly
+        if state["detector"] is not None:
+            yield from _detect_series(state, minute)
+    state["closed_until"] = max(state["closed_until"], until)
+
+
+def stream_parse_log(lines, state: dict | None = None, lateness_sec: int = 0):
+    """
+    ログ行を1行ずつパースしてサーバー・エンドポイント・分ごとのカウンタを更新し、
+    分が閉じるたびに異常な分（anomaly_minutes の1行分の dict）を返すジェネレータ
+
+    分が閉じるのは、それまでの最大のタイムスタンプから lateness_sec 秒前が次の分に入ったとき。
+    state に detector があれば、閉じた分ごとにサーバー別・エンドポイント別の異常（"metric" を含む dict）も返す。
+    入力が終わったら残りの分もすべて閉じる（follow=True の read_lines では終わらない）。
+    """
+    state = new_stream_state() if state is None else state
     for line in lines:
         m = LOG_PATTERN.match(line)
-        if m:
-            records.append(m.groupdict())
-        else:
-            skip_count += 1
+        if not m:
+            state["skipped"] += 1
+            continue
+        state["parsed"] += 1
+        timestamp, server, endpoint, status, response_time = m.group(
+            "timestamp", "server", "endpoint", "status", "response_time"
+        )
+        if state["endpoint_matcher"] is not None:
+            endpoint = normalize_endpoint(state["endpoint_matcher"], endpoint)
+        is_error = int(status) >= 400
+        for key, counters in [(server, state["servers"]), (endpoint, state["endpoints"])]:
+            total = counters.setdefault(key, [0, 0, 0])
+            total[0] += 1
+            total[1] += is_error
+            total[2] += int(response_time)
 
-    print(f"スキップした不正行: {skip_count}件")
-    print(f"パース成功: {len(records)}件")
-    df = pd.DataFrame(records)
+        minute = timestamp[:16]
+        if minute < state["closed_until"]:
+            state["late"] += 1
+        else:
+            total = state["open_minutes"].setdefault(minute, [0, 0])
+            total[0] += 1
+            total[1] += is_error
+            if state["detector"] is not None:
+                series = state["open_series"].setdefault(minute, {})
+                for key in [("server", server), ("endpoint", endpoint)]:
+                    total = series.setdefault(key, [0, 0, 0])
+                    total[0] += 1
+                    total[1] += is_error
+                    total[2] += int(response_time)
 
-    # データ型調整
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df["status"] = df["status"].astype(int)
-    df["response_time"] = df["response_time"].astype(int)
-    df["minute"] = df["timestamp"].dt.strftime("%H:%M")
+        if timestamp > state["max_timestamp"]:
+            state["max_timestamp"] = timestamp
+            watermark = timestamp
+            if lateness_sec:
+                watermark = str(datetime.fromisoformat(timestamp) - timedelta(seconds=lateness_sec))
+            if watermark[:16] > state["closed_until"]:
+                yield from _close_minutes(state, watermark[:16])
+    # 入力の終わり: どのタイムスタンプより大きい文字列で残りの分をすべて閉じる
+    yield from _close_minutes(state, "9999")
 
-    df_server_metrics = server_metrics(df)
-    df_endpoint_report = endpoint_report(df)
-    df_anomaly_minutes = anomaly_minutes(df)
 
-    return df_server_metrics, df_endpoint_report, df_anomaly_minutes
+def stream_reports(state: dict) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """ストリーミング集計の状態から transform と同じ3つのレポートを作る（異常な分は直近 history_size 件）"""
+    anomalies = pd.DataFrame(
+        list(state["anomalies"]), columns=["minute", "request_count", "error_count", "error_rate"]
+    ).set_index("minute")
+    return (
+        server_metrics_from_totals(_totals_frame(state["servers"])),
+        endpoint_report_from_totals(_totals_frame(state["endpoints"])),
+        anomalies,
+    )
 
 
 def load(
@@ -98,9 +936,43 @@ def load(
     anomaly_minutes.to_csv(BASE_PATH / "anomaly_minutes.csv")
 
 
+def _configured_endpoint_matcher() -> dict | None:
+    """main 系で使う endpoint_matcher。ENDPOINT_TEMPLATES が空ならテンプレート化（ID の置き換えも）しない"""
+    if not ENDPOINT_TEMPLATES:
+        return None
+    return compile_endpoint_templates(ENDPOINT_TEMPLATES)
+
+
+def main_stream(file_path: Path = BASE_PATH / "data" / "app_server.log", follow: bool = False) -> None:
+    """
+    ストリーミング版の main。異常な分は閉じた時点で表示する
+
+    follow=True なら追記を待ち続ける（Ctrl+C で止めると、それまでの集計でレポートを出力する）。
+    """
+    state = new_stream_state(_configured_endpoint_matcher(), new_detector())
+    try:
+        for anomaly in stream_parse_log(read_lines(file_path, follow=follow), state):
+            print(f"異常検知: {anomaly}")
+    except KeyboardInterrupt:
+        pass
+    print(f"スキップした不正行: {state['skipped']}件")
+    print(f"パース成功: {state['parsed']}件")
+    load(*stream_reports(state))
+
+
+def main_parallel(file_path: Path = BASE_PATH / "data" / "app_server.log", workers: int | None = None) -> None:
+    """並列版の main。ファイルをバイト範囲に分けて workers 個のプロセスでパースする"""
+    load(*transform_parallel(file_path, workers, _configured_endpoint_matcher()))
+
+
+def main_log_set(source, workers: int = 1) -> None:
+    """ローテーション・圧縮されたログ（ディレクトリか glob パターン）をまとめて集計する main"""
+    load(*transform_log_set(source, workers, _configured_endpoint_matcher()))
+
+
 def main():
     lines = extract(BASE_PATH / "data" / "app_server.log")
-    server_metrics, endpoint_report, anomaly_minutes = transform(lines)
+    server_metrics, endpoint_report, anomaly_minutes = transform(lines, _configured_endpoint_matcher())
     load(server_metrics, endpoint_report, anomaly_minutes)
 
 
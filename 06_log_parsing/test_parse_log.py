@@ -0,0 +1,376 @@
+"""
+test_parse_log.py - parse_log.py のユニットテスト
+"""
+import bz2
+import gzip
+import random
+
+import pandas as pd
+import pytest
+import zstandard
+
+import parse_log
+from parse_log import (
+    BASE_PATH,
+    aggregate_log_set,
+    aggregate_parallel,
+    anomaly_minutes,
+    byte_ranges,
+    compile_endpoint_templates,
+    endpoint_report,
+    extract,
+    log_files,
+    new_detector,
+    new_stream_state,
+    normalize_endpoint,
+    observe_minute,
+    parse_block,
+    parse_records,
+    parse_records_fast,
+    pre_aggregate,
+    read_lines,
+    read_log_set,
+    read_range_lines,
+    reports_from_partial,
+    reports_from_pre_aggregate,
+    server_metrics,
+    stream_parse_log,
+    stream_reports,
+    transform,
+)
+
+LOG_PATH = BASE_PATH / "data" / "app_server.log"
+
+
+def line(timestamp: str, status: int, server: str = "web01", endpoint: str = "/api/users") -> str:
+    return (
+        f"{timestamp} [INFO] server={server} endpoint={endpoint} method=GET"
+        f" status={status} response_time=100ms"
+    )
+
+
+def test_stream_matches_transform():
+    """ストリーミング版の3つのレポートがバッチ版と一致する"""
+    expected = transform(extract(LOG_PATH))
+    state = new_stream_state()
+    list(stream_parse_log(read_lines(LOG_PATH), state))
+    for result, exp in zip(stream_reports(state), expected):
+        pd.testing.assert_frame_equal(result, exp)
+    assert (state["parsed"], state["skipped"]) == (18, 2)
+
+
+def test_stream_emits_anomaly_when_minute_closes():
+    """異常な分は、次の分の行が届いた時点で返り、閉じた分は状態から消える"""
+    state = new_stream_state()
+    lines = iter([
+        line("2026-02-10 09:00:01", 500),
+        line("2026-02-10 09:00:30", 200),
+        line("2026-02-10 09:00:50", 503),
+        line("2026-02-10 09:01:00", 200),
+        line("2026-02-10 09:01:10", 200),
+    ])
+    anomalies = stream_parse_log(lines, state)
+    assert next(anomalies) == {"minute": "09:00", "request_count": 3, "error_count": 2, "error_rate": 66.7}
+    assert list(state["open_minutes"]) == ["2026-02-10 09:01"]
+    assert list(anomalies) == []
+    assert state["open_minutes"] == {}
+
+
+def test_stream_history_is_bounded():
+    """follow=True で動かし続けても、状態に残す異常な分は直近 history_size 件だけ（返す値はすべて返す）"""
+    lines = [line(f"2026-02-10 09:{minute:02d}:00", 500) for minute in range(30)]
+    state = new_stream_state(history_size=3)
+    events = list(stream_parse_log(lines, state))
+    assert len(events) == 30
+    assert [a["minute"] for a in state["anomalies"]] == ["09:27", "09:28", "09:29"]
+    assert stream_reports(state)[2].index.tolist() == ["09:27", "09:28", "09:29"]
+
+
+def test_stream_lateness():
+    """lateness_sec 以内の順序の乱れは元の分に入り、それより遅れた行は late に数える"""
+    lines = [
+        line("2026-02-10 09:00:50", 500),
+        line("2026-02-10 09:01:05", 200),
+        line("2026-02-10 09:00:55", 500),  # 10秒遅れ: 09:00 はまだ開いている
+        line("2026-02-10 09:02:00", 200),
+        line("2026-02-10 09:00:59", 500),  # 09:00 はもう閉じている
+    ]
+    state = new_stream_state()
+    anomalies = list(stream_parse_log(lines, state, lateness_sec=30))
+    assert anomalies == [{"minute": "09:00", "request_count": 2, "error_count": 2, "error_rate": 100.0}]
+    assert state["late"] == 1
+    assert state["servers"]["web01"][:2] == [5, 3]
+
+
+def test_read_lines_follow_waits_for_complete_line(tmp_path):
+    """follow=True では書き込み途中の行を返さず、追記を待って続きを返す"""
+    path = tmp_path / "app.log"
+    path.write_text("line1\nline2", encoding="utf-8")
+    lines = read_lines(path, follow=True, poll_interval=0.01)
+    assert next(lines) == "line1"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(" continued\nline3\n")
+    assert next(lines) == "line2 continued"
+    assert next(lines) == "line3"
+    lines.close()
+
+
+def assert_same_parse(lines: list) -> None:
+    df_regex, skip_regex = parse_records(lines)
+    df_fast, skip_fast = parse_block(lines)
+    pd.testing.assert_frame_equal(df_fast, df_regex)
+    assert skip_fast == skip_regex
+
+
+@pytest.mark.parametrize("lines", [
+    [],
+    [""],
+    ["", ""],
+    ["a"],
+    # 形は違うが正規表現には合う行（ms の後ろに続きがある・非 ASCII・タブ）
+    [line("2026-02-10 09:00:01", 200) + "extra", line("2026-02-10 09:00:01", 200, endpoint="/api/ユーザー")],
+    [line("2026-02-10 09:00:01", 200, endpoint="/api/users\tx")],
+    # \s では空白扱いになる ASCII の制御文字（\x1c〜\x1f）
+    [line("2026-02-10 09:00:01", 200, endpoint="/api/x\x1fy")],
+    [line("2026-02-10 09:00:01", 200, endpoint="/api/x\x1cy"), line("2026-02-10 09:00:02", 200)],
+    # 正規表現に合わない行（桁数違い・空の値・先頭の空白・引用符）
+    [line("2026-2-10 09:00:01", 200), line("2026-02-10 09:00:01", 200, server=""), " " + line("2026-02-10 09:00:01", 200)],
+    ['"' + line("2026-02-10 09:00:01", 200), line("2026-02-10 09:00:01", 200) + '"'],
+])
+def test_parse_block_edge_cases(lines):
+    assert_same_parse(lines)
+
+
+def test_parse_block_matches_regex_on_mutated_lines():
+    """ログの行を1〜2文字ずつ壊しても、パース結果とスキップ数が正規表現版と一致する"""
+    base = extract(LOG_PATH)
+    rng = random.Random(0)
+    chars = list(" _-:[]=ms0123456789aZé\t\r\"#")
+    for _ in range(50):
+        lines = []
+        for text in rng.choices(base, k=40):
+            text = list(text)
+            for _ in range(rng.randint(0, 2)):
+                pos = rng.randrange(len(text))
+                text[pos] = rng.choice(chars)
+            lines.append("".join(text))
+        try:
+            parse_records(lines)
+        except ValueError:
+            continue  # 正規表現には合うが日時として不正（変更前と同じく例外になる）
+        assert_same_parse(lines)
+
+
+def test_parse_records_fast_across_blocks():
+    lines = extract(LOG_PATH) * 3
+    df_fast, skip_fast = parse_records_fast(lines, block_size=7)
+    df_regex, skip_regex = parse_records(lines)
+    pd.testing.assert_frame_equal(df_fast, df_regex)
+    assert skip_fast == skip_regex == 6
+
+
+@pytest.mark.parametrize("n_parts, chunk_bytes", [(1, 1 << 20), (3, 100), (50, 1)])
+def test_parallel_matches_transform(n_parts, chunk_bytes):
+    """バイト範囲・チャンクの分け方によらず、並列版のレポートがバッチ版と一致する"""
+    expected = transform(extract(LOG_PATH))
+    partial = aggregate_parallel(LOG_PATH, workers=2, n_parts=n_parts, chunk_bytes=chunk_bytes)
+    for result, exp in zip(reports_from_partial(partial), expected):
+        pd.testing.assert_frame_equal(result, exp)
+    assert (partial["parsed"], partial["skipped"]) == (18, 2)
+
+
+def test_byte_ranges_split_lines_like_extract(tmp_path):
+    """範囲の境界は行頭にそろい、CRLF・空行・末尾の改行なしの行も extract と同じ行に分かれる"""
+    path = tmp_path / "app_server.log"
+    lines = [line(f"2026-02-10 09:00:{i:02d}", 200) for i in range(30)]
+    path.write_bytes(("\r\n".join(lines[:10]) + "\n\n" + "\n".join(lines[10:])).encode())
+    ranges = byte_ranges(path, 7)
+    assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    read = [text for start, end in ranges for chunk in read_range_lines(path, start, end, 64) for text in chunk]
+    assert read == extract(path)
+
+
+def test_reports_from_pre_aggregate():
+    """事前集計から作ったレポートが各レポート関数と一致し、分は日付をまたいで HH:MM でまとまる"""
+    lines = [
+        line("2026-02-10 09:00:01", 500),
+        line("2026-02-10 09:00:30", 200, server="web02", endpoint="/api/orders"),
+        line("2026-02-11 09:00:05", 503, endpoint="/api/orders"),
+        line("2026-02-11 09:01:00", 404, server="web02"),
+    ]
+    df, _ = parse_records(lines)
+    pre = pre_aggregate(df)
+    assert pre["count"].sum() == 4 and len(pre) == 4
+    reports = reports_from_pre_aggregate(pre)
+    for result, expected in zip(reports, [server_metrics(df), endpoint_report(df), anomaly_minutes(df)]):
+        pd.testing.assert_frame_equal(result, expected)
+    assert reports[2].to_dict("index") == {
+        "09:00": {"request_count": 3, "error_count": 2, "error_rate": 66.7},
+        "09:01": {"request_count": 1, "error_count": 1, "error_rate": 100.0},
+    }
+
+
+def test_log_set_reads_rotated_compressed_files_in_order(tmp_path):
+    """ローテーション・圧縮されたログを古い順に読み、バッチ版と同じレポートになる"""
+    base = extract(LOG_PATH)
+    parts = [base[:5], base[5:10], base[10:15], base[15:]]
+    text = ["\n".join(part) + "\n" for part in parts]
+    (tmp_path / "app_server.log.10.zst").write_bytes(zstandard.ZstdCompressor().compress(text[0].encode()))
+    (tmp_path / "app_server.log.3.bz2").write_bytes(bz2.compress(text[1].encode()))
+    (tmp_path / "app_server.log.2.gz").write_bytes(gzip.compress(text[2].encode()))
+    (tmp_path / "app_server.log").write_text(text[3].rstrip("\n"), encoding="utf-8")
+
+    assert [path.name for path in log_files(tmp_path / "app_server.log*")] == [
+        "app_server.log.10.zst", "app_server.log.3.bz2", "app_server.log.2.gz", "app_server.log",
+    ]
+    assert list(read_log_set(tmp_path, chunk_bytes=64)) == base
+    expected = transform(base)
+    for workers in [1, 2]:
+        partial = aggregate_log_set(tmp_path, workers=workers, chunk_bytes=64)
+        for result, exp in zip(reports_from_partial(partial), expected):
+            pd.testing.assert_frame_equal(result, exp)
+        assert (partial["parsed"], partial["skipped"]) == (18, 2)
+
+
+TEMPLATES = ["/api/users/{id}", "/api/users/me", "/api/users/{id}/orders/{order_id}", "/api/{resource}/search"]
+
+
+@pytest.mark.parametrize("endpoint, expected", [
+    ("/api/users/123", "/api/users/{id}"),
+    ("/api/users/me", "/api/users/me"),  # 文字どおりのセグメントが {id} より優先
+    ("/api/users/me/orders/9", "/api/users/{id}/orders/{order_id}"),  # 文字どおりで合わなければ {id} に戻る
+    ("/api/products/search", "/api/{resource}/search"),
+    ("/api/users", "/api/users"),
+    # テンプレートに合わないパスは ID らしいセグメントだけ置き換える（クエリ文字列は除く）
+    ("/api/products/42?color=red", "/api/products/{id}"),
+    ("/api/items/550e8400-e29b-41d4-a716-446655440000/x", "/api/items/{id}/x"),
+])
+def test_normalize_endpoint(endpoint, expected):
+    assert normalize_endpoint(compile_endpoint_templates(TEMPLATES), endpoint) == expected
+
+
+def test_normalize_endpoint_cache_is_bounded():
+    matcher = compile_endpoint_templates(TEMPLATES, cache_size=3)
+    for i in range(10):
+        assert normalize_endpoint(matcher, f"/api/users/{i}") == "/api/users/{id}"
+    assert list(matcher["cache"]) == ["/api/users/7", "/api/users/8", "/api/users/9"]
+    assert normalize_endpoint(compile_endpoint_templates([], replace_ids=False), "/api/users/1?a=b") == "/api/users/1"
+
+
+def test_endpoint_templates_bound_report_cardinality(tmp_path):
+    """ID 付きのパスがテンプレートごとに1行にまとまり、バッチ版・並列版・ストリーミング版で同じ結果になる"""
+    lines = [
+        line(f"2026-02-10 09:00:{i % 60:02d}", 500 if i % 4 == 0 else 200, endpoint=f"/api/users/{i}")
+        for i in range(100)
+    ] + [line("2026-02-10 09:01:00", 200, endpoint="/api/users/me")]
+    path = tmp_path / "app_server.log"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    matcher = compile_endpoint_templates(TEMPLATES)
+
+    _, report, _ = transform(lines, matcher)
+    assert report.to_dict("records") == [
+        {"endpoint": "/api/users/{id}", "total_request": 100, "error_count": 25, "avg_response_time": 100.0},
+        {"endpoint": "/api/users/me", "total_request": 1, "error_count": 0, "avg_response_time": 100.0},
+    ]
+    expected = transform(lines, matcher)
+    parallel = reports_from_partial(aggregate_parallel(path, workers=2, chunk_bytes=500, endpoint_matcher=matcher))
+    state = new_stream_state(matcher)
+    list(stream_parse_log(lines, state))
+    for result, exp in zip(parallel, expected):
+        pd.testing.assert_frame_equal(result, exp)
+    # ストリーミング版は異常な分の判定単位が違うので、サーバー別・エンドポイント別だけ比べる
+    for result, exp in zip(stream_reports(state)[:2], expected[:2]):
+        pd.testing.assert_frame_equal(result, exp)
+
+
+@pytest.mark.parametrize("templates, expected", [
+    ([], ["/api/orders/12345"]),
+    (["/api/orders/{id}"], ["/api/orders/{id}"]),
+])
+def test_main_templates_are_opt_in(tmp_path, monkeypatch, templates, expected):
+    """main 系は ENDPOINT_TEMPLATES が空なら、ID を含むパスも元のまま集計する"""
+    path = tmp_path / "app_server.log"
+    path.write_text(line("2026-02-10 09:00:01", 200, endpoint="/api/orders/12345") + "\n", encoding="utf-8")
+    monkeypatch.setattr(parse_log, "BASE_PATH", tmp_path)
+    monkeypatch.setattr(parse_log, "ENDPOINT_TEMPLATES", templates)
+    parse_log.main_parallel(path, workers=1)
+    assert pd.read_csv(tmp_path / "endpoint_report.csv")["endpoint"].tolist() == expected
+
+
+def test_observe_minute_flags_only_clear_increases():
+    detector = new_detector(window=5, min_periods=3)
+    series = ("server", "web01", "avg_response_time")
+    for value in [100, 110, 90, 105, 95, 100]:
+        assert observe_minute(detector, series, value) is None
+    # 標準偏差の下限（10ms）より小さな揺れの範囲なら異常にしない。下がる方向も異常にしない
+    assert observe_minute(detector, series, 120) is None
+    assert observe_minute(detector, series, 0) is None
+    assert observe_minute(detector, series, 400) is not None
+    # 更新に使う値は頭打ちにするので、高い値が続く間は検知し続ける
+    assert observe_minute(detector, series, 400) is not None
+    assert len(detector["series"][series]["window"]) == 5
+    with pytest.raises(ValueError):
+        new_detector(window=5, min_periods=6)
+
+
+def test_new_detector_min_std_overrides_only_given_metrics():
+    """min_std は指定した指標だけ既定値を上書きし、残りの指標は既定値のまま判定できる"""
+    detector = new_detector(min_std={"error_rate": 2.0})
+    assert detector["min_std"] == {"error_rate": 2.0, "avg_response_time": 10.0}
+    assert observe_minute(detector, ("server", "web01", "avg_response_time"), 100) is None
+
+
+def test_observe_minute_skips_low_count_minutes():
+    """リクエスト数が min_count 未満の分は統計量を更新するが、異常にはしない"""
+    detector = new_detector(window=5, min_periods=3, min_count=10)
+    series = ("server", "web01", "error_rate")
+    for _ in range(5):
+        assert observe_minute(detector, series, 0.0, count=100) is None
+    assert observe_minute(detector, series, 100.0, count=1) is None
+    assert detector["series"][series]["n"] == 6
+    assert observe_minute(detector, series, 100.0, count=10) is not None
+
+
+def test_stream_detector_ignores_low_traffic_series():
+    """1分に数件しか来ない系列では、1件のエラーでエラー率が跳ねても検知しない"""
+    lines = []
+    for minute in range(60):
+        count = minute % 5 + 1
+        for second in range(count):
+            # 180件中2件（約1%）がエラー
+            status = 500 if second == 0 and minute in (20, 45) else 200
+            lines.append(line(f"2026-02-10 09:{minute:02d}:{second:02d}", status, endpoint="/api/rare"))
+    lines.append(line("2026-02-10 10:00:00", 200, endpoint="/api/rare"))
+
+    state = new_stream_state(detector=new_detector())
+    assert [e for e in stream_parse_log(lines, state) if "metric" in e] == []
+    # 同じ系列でも min_count を下げると、エラーのあった分を異常にする
+    state = new_stream_state(detector=new_detector(min_count=1))
+    assert [e for e in stream_parse_log(lines, state) if "metric" in e] != []
+
+
+def test_stream_detector_emits_when_minute_closes():
+    """web01 だけエラー率が急に上がった分を、その分が閉じた時点で検知する（全体のエラー率は50%以下）"""
+    lines = []
+    for minute in range(20):
+        for second in range(10):
+            status = 500 if second == 0 and minute % 2 == 0 else 200
+            lines.append(line(f"2026-02-10 09:{minute:02d}:{second:02d}", status))
+            lines.append(line(f"2026-02-10 09:{minute:02d}:{second:02d}", 200, server="web02"))
+    # 09:20 に web01 のエラー率だけ 80%
+    lines += [line(f"2026-02-10 09:20:{s:02d}", 500 if s < 8 else 200) for s in range(10)]
+    lines += [line(f"2026-02-10 09:20:{s:02d}", 200, server="web02") for s in range(10)]
+    lines += [line("2026-02-10 09:21:00", 200)]
+
+    state = new_stream_state(detector=new_detector())
+    events = stream_parse_log(iter(lines), state)
+    detected = [next(events), next(events)]
+    # 09:21 の行を読んだ時点（09:20 が閉じた時点）で返る
+    assert state["max_timestamp"] == "2026-02-10 09:21:00"
+    assert [(d["minute"], d["dimension"], d["key"], d["metric"], d["value"]) for d in detected] == [
+        ("2026-02-10 09:20", "endpoint", "/api/users", "error_rate", 40.0),
+        ("2026-02-10 09:20", "server", "web01", "error_rate", 80.0),
+    ]
+    assert all(d["ewma_z"] > 3 and d["rolling_z"] > 3 for d in detected)
+    assert list(events) == [] and list(state["anomalies"]) == [] and list(state["detections"]) == detected